@@ -1,24 +1,35 @@
 from fastapi import FastAPI, BackgroundTasks
-from app.flashcards import create_and_send_daily_flashcard, background_image_task
+from app.config import settings
 
 app = FastAPI()
 
 @app.get("/api/cron")
 async def cron_handler(background_tasks: BackgroundTasks):
+    # Imported per invocation so the function's cold start only pays for FastAPI
+    from app.flashcards import create_and_send_daily_flashcard_async
+    from app.jobs import drain_jobs_async, enqueue_flashcard_image_async
+    from app.leader import daily_run_key, run_once_async
+    from app.pregen import send_ready_flashcard_async
+
+    async def deliver() -> dict:
+        # Fast path: deliver a pre-generated card
+        if settings.pregen_enabled:
+            sent = await send_ready_flashcard_async()
+            if sent:
+                return {"status": "success", "message": "Pre-generated flashcard delivered.", "data": sent,
+                        "flashcard_id": sent["flashcard_id"]}
+
+        # Phase 1: Prepare data (image generation starts alongside the DB insert)
+        result = await create_and_send_daily_flashcard_async(prefetch_image=True)
+
+        # Phase 2: Finish the image and send (durable job, drained after the response)
+        await enqueue_flashcard_image_async(result)
+        background_tasks.add_task(drain_jobs_async, max_jobs=settings.jobs_concurrency)
+
+        return {"status": "success", "message": "Automation triggered successfully.", "flashcard_id": result["flashcard_id"]}
+
     try:
-        # Phase 1: Prepare data
-        result = create_and_send_daily_flashcard()
-        
-        # Phase 2: Schedule image generation
-        background_tasks.add_task(
-            background_image_task, 
-            term=result['italian_text'], 
-            flashcard_id=result['flashcard_id'],
-            phonetic=result.get('phonetic', ''),
-            translation=result.get('english_translation', ''),
-            example_sentence=result.get('example_sentence', '')
-        )
-        
-        return {"status": "success", "message": "Automation triggered successfully."}
+        # Same per-day key as the in-process scheduler, so a retried or doubled cron sends once
+        return await run_once_async(daily_run_key(), deliver)
     except Exception as e:
         return {"status": "error", "detail": str(e)}
@@ -0,0 +1,288 @@
+"""Process-wide registry of pooled outbound clients (Supabase, OpenAI, Telegram).
+
+Every module asks this registry for its client instead of building a new one,
+so warm requests reuse keep-alive connections rather than paying a fresh TCP +
+TLS handshake per call.
+
+Async clients are bound to the event loop that created them, so they are kept
+per loop. Sync callers run coroutines through `run_sync`, which uses one
+long-lived background loop and so keeps reusing the same async pools.
+
+httpx and the SDKs are imported when the first client is built, not at
+import time, to keep serverless cold starts short.
+"""
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+
+@dataclass
+class ClientStats:
+    clients_built: int = 0
+    requests: int = 0
+    connections_opened: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def count_connection(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "clients_built": self.clients_built,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": max(self.requests - self.connections_opened, 0),
+        }
+
+
+_lock = threading.Lock()
+_clients: dict[str, Any] = {}
+_stats: dict[str, ClientStats] = {}
+
+
+def _stats_for(service: str) -> ClientStats:
+    if service not in _stats:
+        _stats[service] = ClientStats()
+    return _stats[service]
+
+
+def _pool_limits() -> "httpx.Limits":
+    import httpx
+
+    return httpx.Limits(
+        max_connections=settings.http_pool_maxsize,
+        max_keepalive_connections=settings.http_pool_keepalive,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+def _request_hook(service: str):
+    """Attach an httpcore trace so new TCP connections are counted per service."""
+    stats = _stats_for(service)
+
+    def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            stats.count_connection()
+
+    def on_request(request: "httpx.Request") -> None:
+        stats.count_request()
+        request.extensions["trace"] = trace
+
+    return on_request
+
+
+def _async_request_hook(service: str):
+    stats = _stats_for(service)
+
+    async def trace(event_name: str, info: dict) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            stats.count_connection()
+
+    async def on_request(request: "httpx.Request") -> None:
+        stats.count_request()
+        request.extensions["trace"] = trace
+
+    return on_request
+
+
+def _build_http_client(service: str, timeout: float, **kwargs: Any) -> "httpx.Client":
+    import httpx
+
+    return httpx.Client(
+        timeout=timeout,
+        limits=_pool_limits(),
+        event_hooks={"request": [_request_hook(service)]},
+        **kwargs,
+    )
+
+
+def _get_or_build(service: str, builder) -> Any:
+    client = _clients.get(service)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(service)
+        if client is None:
+            client = builder()
+            _clients[service] = client
+            _stats_for(service).clients_built += 1
+    return client
+
+
+def _build_async_http_client(service: str, timeout: float, **kwargs: Any) -> "httpx.AsyncClient":
+    import httpx
+
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=_pool_limits(),
+        event_hooks={"request": [_async_request_hook(service)]},
+        **kwargs,
+    )
+
+
+def get_supabase():
+    if not settings.supabase_url or not settings.supabase_key:
+        raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
+
+    def build():
+        from supabase import ClientOptions, create_client
+
+        # Debug print for length to help identify truncated/malformed keys
+        print(f"Initializing Supabase client. URL length: {len(settings.supabase_url)}, Key length: {len(settings.supabase_key)}")
+        client = create_client(
+            settings.supabase_url,
+            settings.supabase_key,
+            options=ClientOptions(postgrest_client_timeout=settings.supabase_timeout),
+        )
+        # Swap PostgREST's private httpx session for one on the shared pool settings.
+        postgrest = client.postgrest
+        old_session = postgrest.session
+        postgrest.session = _build_http_client(
+            "supabase",
+            settings.supabase_timeout,
+            base_url=old_session.base_url,
+            headers=old_session.headers,
+        )
+        old_session.close()
+        return client
+
+    return _get_or_build("supabase", build)
+
+
+def get_openai():
+    """Shared OpenAI client. Use `.with_options(timeout=...)` for per-call deadlines."""
+    if not settings.openai_api_key:
+        raise ValueError("OPENAI_API_KEY must be set in environment variables")
+
+    def build():
+        from openai import OpenAI
+
+        return OpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            timeout=settings.openai_text_timeout,
+            max_retries=0,
+            http_client=_build_http_client("openai", settings.openai_image_timeout),
+        )
+
+    return _get_or_build("openai", build)
+
+
+def get_telegram_http() -> "httpx.Client":
+    """Shared HTTP client rooted at the Telegram Bot API for the configured token."""
+    def build():
+        return _build_http_client(
+            "telegram",
+            settings.telegram_timeout,
+            base_url=f"{settings.telegram_api_url}/bot{settings.telegram_bot_token}",
+        )
+
+    return _get_or_build("telegram", build)
+
+
+def get_http() -> "httpx.Client":
+    """General-purpose pooled client, e.g. for downloading generated image URLs."""
+    return _get_or_build("http", lambda: _build_http_client("http", 30.0, follow_redirects=True))
+
+
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def _get_or_build_async(service: str, builder) -> Any:
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(service)
+        if client is None:
+            client = builder()
+            clients[service] = client
+            _stats_for(service).clients_built += 1
+    return client
+
+
+def get_async_openai():
+    """AsyncOpenAI bound to the running loop (shares the "openai" stats)."""
+    if not settings.openai_api_key:
+        raise ValueError("OPENAI_API_KEY must be set in environment variables")
+
+    def build():
+        from openai import AsyncOpenAI
+
+        return AsyncOpenAI(
+            api_key=settings.openai_api_key,
+            base_url=settings.openai_base_url,
+            timeout=settings.openai_text_timeout,
+            max_retries=0,
+            http_client=_build_async_http_client("openai", settings.openai_image_timeout),
+        )
+
+    return _get_or_build_async("openai", build)
+
+
+def get_async_telegram_http() -> "httpx.AsyncClient":
+    return _get_or_build_async(
+        "telegram",
+        lambda: _build_async_http_client(
+            "telegram",
+            settings.telegram_timeout,
+            base_url=f"{settings.telegram_api_url}/bot{settings.telegram_bot_token}",
+        ),
+    )
+
+
+def get_async_http() -> "httpx.AsyncClient":
+    return _get_or_build_async("http", lambda: _build_async_http_client("http", 30.0, follow_redirects=True))
+
+
+_portal_loop: asyncio.AbstractEventLoop | None = None
+_portal_thread: threading.Thread | None = None
+
+
+def _get_portal_loop() -> asyncio.AbstractEventLoop:
+    global _portal_loop, _portal_thread
+    with _lock:
+        if _portal_loop is None or _portal_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="async-clients-loop", daemon=True)
+            thread.start()
+            _portal_loop, _portal_thread = loop, thread
+    return _portal_loop
+
+
+def run_sync(coro):
+    """Run a coroutine from synchronous code on the shared background loop and wait for it."""
+    loop = _get_portal_loop()
+    if threading.current_thread() is _portal_thread:
+        coro.close()
+        raise RuntimeError("run_sync() called from the async-clients loop itself; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def client_stats() -> dict[str, dict[str, int]]:
+    return {service: stats.as_dict() for service, stats in _stats.items()}
+
+
+def reset_clients() -> None:
+    """Close every pooled client (e.g. after fork or in tests). Stats are kept."""
+    with _lock:
+        for service, client in list(_clients.items()):
+            try:
+                if service == "supabase":
+                    client.postgrest.session.close()
+                else:
+                    client.close()
+            except Exception as e:
+                print(f"⚠️ Failed to close {service} client: {e}")
+        _clients.clear()
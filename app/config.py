@@ -11,26 +11,129 @@ class Settings:
     # On Vercel, we must write to /tmp
     is_vercel: bool = os.getenv("VERCEL") == "1"
     
+    # "supabase", "sqlite" or "auto" (Supabase when configured, otherwise the local SQLite file at db_path)
+    storage_backend: str = os.getenv("STORAGE_BACKEND", "auto")
     db_path: str = os.getenv("DB_PATH", "/tmp/data/flashcards.db" if os.getenv("VERCEL") == "1" else "flashcards.db")
     timezone: str = os.getenv("TIMEZONE", "Africa/Johannesburg")
     schedule_hour: int = int(os.getenv("SCHEDULE_HOUR", "8"))
     schedule_minute: int = int(os.getenv("SCHEDULE_MINUTE", "0"))
+    # In-process APScheduler; off on Vercel, where vercel.json crons trigger the sends
+    scheduler_enabled: bool = os.getenv("SCHEDULER_ENABLED", "0" if os.getenv("VERCEL") == "1" else "1") == "1"
+    # Only the worker holding the scheduler lease runs scheduled jobs; each daily slot runs once (see app.leader)
+    leader_election: bool = os.getenv("LEADER_ELECTION", "1") == "1"
+    leader_lease_seconds: float = float(os.getenv("LEADER_LEASE_SECONDS", "60"))
+    run_once_per_slot: bool = os.getenv("RUN_ONCE_PER_SLOT", "1") == "1"
+    scheduled_run_stale_seconds: float = float(os.getenv("SCHEDULED_RUN_STALE_SECONDS", "900"))
+    # Ahead-of-time generation (see app.pregen): keep N ready cards, filled daily at pregen_hour:pregen_minute
+    pregen_enabled: bool = os.getenv("PREGEN_ENABLED", "0") == "1"
+    pregen_buffer_size: int = int(os.getenv("PREGEN_BUFFER_SIZE", "3"))
+    pregen_workers: int = int(os.getenv("PREGEN_WORKERS", "2"))
+    pregen_hour: int = int(os.getenv("PREGEN_HOUR", "3"))
+    pregen_minute: int = int(os.getenv("PREGEN_MINUTE", "0"))
+    # Durable job queue for Phase 2 image work (see app.jobs)
+    jobs_max_attempts: int = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+    jobs_lease_seconds: int = int(os.getenv("JOBS_LEASE_SECONDS", "300"))
+    jobs_backoff_seconds: float = float(os.getenv("JOBS_BACKOFF_SECONDS", "30"))
+    jobs_concurrency: int = int(os.getenv("JOBS_CONCURRENCY", "2"))
+    jobs_poll_seconds: float = float(os.getenv("JOBS_POLL_SECONDS", "15"))
     beginner_terms_file: str = os.getenv("BEGINNER_TERMS_FILE", "data/beginner_terms.json")
+    # Bulk vocabulary import (see app.importer): rows per upsert and upserts in flight
+    import_chunk_size: int = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+    import_concurrency: int = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+    # Term selection (see app.term_selector): "weighted" draws from an in-memory index, "sequential" takes the lowest unused id
+    term_selection: str = os.getenv("TERM_SELECTION", "weighted").lower()
+    term_no_repeat_days: float = float(os.getenv("TERM_NO_REPEAT_DAYS", "30"))
+    # "category=multiplier,..." per-term weight and "category=max share,..." of the picks within the no-repeat window
+    term_category_weights: str = os.getenv("TERM_CATEGORY_WEIGHTS", "")
+    term_category_quotas: str = os.getenv("TERM_CATEGORY_QUOTAS", "")
+    term_index_refresh_seconds: float = float(os.getenv("TERM_INDEX_REFRESH_SECONDS", "300"))
+    term_index_max_age_seconds: float = float(os.getenv("TERM_INDEX_MAX_AGE_SECONDS", "3600"))
 
     # We take splitlines()[0] to handle accidental multi-line pastes in Vercel
     openai_api_key: str | None = os.getenv("OPENAI_API_KEY").splitlines()[0].strip() if os.getenv("OPENAI_API_KEY") else None
+    # Point at a compatible server instead of api.openai.com (e.g. benchmarks/fakes.py)
+    openai_base_url: str | None = os.getenv("OPENAI_BASE_URL") or None
     google_api_key: str | None = os.getenv("GOOGLE_API_KEY").splitlines()[0].strip() if os.getenv("GOOGLE_API_KEY") else None
     image_model: str = os.getenv("IMAGE_MODEL", "gpt-image-1").splitlines()[0].strip()
     image_size: str = os.getenv("IMAGE_SIZE", "1024x1024").splitlines()[0].strip()
+    image_fallback_model: str = os.getenv("IMAGE_FALLBACK_MODEL", "dall-e-3").strip()
+    # Per-model circuit breakers and hedging for image generation (see app.image_router)
+    image_breaker_window: int = int(os.getenv("IMAGE_BREAKER_WINDOW", "20"))
+    image_breaker_min_calls: int = int(os.getenv("IMAGE_BREAKER_MIN_CALLS", "3"))
+    image_breaker_failure_rate: float = float(os.getenv("IMAGE_BREAKER_FAILURE_RATE", "0.5"))
+    image_breaker_cooldown_seconds: float = float(os.getenv("IMAGE_BREAKER_COOLDOWN_SECONDS", "300"))
+    image_hedge_after_seconds: float = float(os.getenv("IMAGE_HEDGE_AFTER_SECONDS", "0"))
     image_prompt_file: str = os.getenv("IMAGE_PROMPT_FILE", "imagePrompt.txt")
+    # Byte budget for the content-addressed image store in images_dir (LRU eviction beyond it)
+    # Persist generated images to the store at all (pre-generated cards always are)
+    image_store_enabled: bool = os.getenv("IMAGE_STORE_ENABLED", "0" if os.getenv("VERCEL") == "1" else "1") == "1"
+    image_store_max_mb: int = int(os.getenv("IMAGE_STORE_MAX_MB", "100" if os.getenv("VERCEL") == "1" else "1024"))
+    # Re-encoding before upload (see app.image_pipeline; needs Pillow, otherwise the original PNG is sent)
+    image_upload_format: str = os.getenv("IMAGE_UPLOAD_FORMAT", "jpeg").lower()
+    image_max_side: int = int(os.getenv("IMAGE_MAX_SIDE", "1280"))
+    image_max_kb: int = int(os.getenv("IMAGE_MAX_KB", "400"))
+    image_quality: int = int(os.getenv("IMAGE_QUALITY", "85"))
+
+    # Persistent cache for build_linguistic_content (see app.content_cache)
+    content_cache_enabled: bool = os.getenv("CONTENT_CACHE_ENABLED", "1") == "1"
+    content_cache_ttl_days: int = int(os.getenv("CONTENT_CACHE_TTL_DAYS", "90"))
+    content_cache_max_entries: int = int(os.getenv("CONTENT_CACHE_MAX_ENTRIES", "5000"))
+    content_cache_evict_seconds: float = float(os.getenv("CONTENT_CACHE_EVICT_SECONDS", "300"))
+
+    # Batched content generation: many terms per chat completion (see app.content_batch)
+    content_batch_size: int = int(os.getenv("CONTENT_BATCH_SIZE", "20"))
+    content_batch_concurrency: int = int(os.getenv("CONTENT_BATCH_CONCURRENCY", "4"))
+    content_batch_max_attempts: int = int(os.getenv("CONTENT_BATCH_MAX_ATTEMPTS", "3"))
+    openai_rpm: float = float(os.getenv("OPENAI_RPM", "500"))
+    openai_tpm: float = float(os.getenv("OPENAI_TPM", "200000"))
+
+    # Spaced repetition: new cards one user may start in any 24 hours (POST /reviews/{chat_id})
+    reviews_new_per_day: int = int(os.getenv("REVIEWS_NEW_PER_DAY", "20"))
 
     telegram_bot_token: str | None = os.getenv("TELEGRAM_BOT_TOKEN").splitlines()[0].strip() if os.getenv("TELEGRAM_BOT_TOKEN") else None
     telegram_chat_id: str | None = os.getenv("TELEGRAM_CHAT_ID").splitlines()[0].strip() if os.getenv("TELEGRAM_CHAT_ID") else None
+    telegram_api_url: str = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+
+    # Inbound updates at /telegram/webhook (see app.quiz); required, and checked against Telegram's header
+    telegram_webhook_secret: str | None = os.getenv("TELEGRAM_WEBHOOK_SECRET") or None
+    quiz_options: int = int(os.getenv("QUIZ_OPTIONS", "4"))
+    quiz_flush_seconds: float = float(os.getenv("QUIZ_FLUSH_SECONDS", "0.5"))
+    quiz_flush_rows: int = int(os.getenv("QUIZ_FLUSH_ROWS", "1000"))
+    quiz_dedup_window: int = int(os.getenv("QUIZ_DEDUP_WINDOW", "100000"))
+
+    # Fan-out to every active subscriber instead of only TELEGRAM_CHAT_ID (see app.fanout)
+    fanout_enabled: bool = os.getenv("FANOUT_ENABLED", "0") == "1"
+    fanout_concurrency: int = int(os.getenv("FANOUT_CONCURRENCY", "50"))
+    fanout_max_attempts: int = int(os.getenv("FANOUT_MAX_ATTEMPTS", "5"))
+    # Per-subscriber timezone and delivery time from a timing wheel instead of one daily cron (see app.dispatcher)
+    per_subscriber_schedule: bool = os.getenv("PER_SUBSCRIBER_SCHEDULE", "0") == "1"
+    schedule_reload_seconds: int = int(os.getenv("SCHEDULE_RELOAD_SECONDS", "300"))
+    dispatch_retry_minutes: int = int(os.getenv("DISPATCH_RETRY_MINUTES", "5"))
+    daily_card_max_age_hours: float = float(os.getenv("DAILY_CARD_MAX_AGE_HOURS", "20"))
+    telegram_global_rate: float = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+    telegram_per_chat_rate: float = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))
 
     # Aggressive stripping for URLs and Keys to handle common copy-paste errors
     supabase_url: str | None = os.getenv("SUPABASE_URL").splitlines()[0].strip().strip('"').strip("'") if os.getenv("SUPABASE_URL") else None
     supabase_key: str | None = os.getenv("SUPABASE_KEY").splitlines()[0].strip().strip('"').strip("'") if os.getenv("SUPABASE_KEY") else None
 
+    # Append every finished tracing span to this file as JSON lines (off when empty; see app.tracing)
+    trace_log_path: str | None = os.getenv("TRACE_LOG_PATH") or None
+
+    # Shared outbound HTTP pools (see app.clients)
+    http_pool_maxsize: int = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+    http_pool_keepalive: int = int(os.getenv("HTTP_POOL_KEEPALIVE", "10"))
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+    supabase_timeout: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    openai_text_timeout: float = float(os.getenv("OPENAI_TEXT_TIMEOUT", "8"))
+    openai_image_timeout: float = float(os.getenv("OPENAI_IMAGE_TIMEOUT", "120"))
+    telegram_timeout: float = float(os.getenv("TELEGRAM_TIMEOUT", "20"))
+    telegram_upload_timeout: float = float(os.getenv("TELEGRAM_UPLOAD_TIMEOUT", "30"))
+
+    # /diagnostics: per-probe deadline (deep image renders use OPENAI_IMAGE_TIMEOUT) and report cache lifetime
+    diagnostics_timeout: float = float(os.getenv("DIAGNOSTICS_TIMEOUT", "5"))
+    diagnostics_cache_seconds: float = float(os.getenv("DIAGNOSTICS_CACHE_SECONDS", "30"))
+
     @property
     def images_dir(self) -> str:
         return "/tmp/generated_images" if self.is_vercel else "generated_images"
@@ -0,0 +1,189 @@
+"""Linguistic content for many terms per chat completion.
+
+`build_linguistic_content_batch_async` sends CONTENT_BATCH_SIZE terms in one
+structured-output request and gets a JSON array back. Each item is validated
+on its own. Only missing or malformed entries are retried, in smaller batches.
+Batches run CONTENT_BATCH_CONCURRENCY at a time within OPENAI_RPM and
+OPENAI_TPM. Results are stored in the content cache under the single-term
+model and prompt version, so `build_linguistic_content_async` hits them later.
+"""
+import asyncio
+import json
+from typing import Any
+
+from app.clients import run_sync
+from app.config import settings
+from app.content_cache import get_cached_contents, put_cached_contents
+from app.flashcards import (
+    CONTENT_MODEL, CONTENT_OUTPUT_TOKENS, CONTENT_PROMPT_VERSION, CONTENT_SYSTEM_PROMPT, acquire_openai_capacity,
+    get_openai_buckets, peek_next_terms,
+)
+from app.storage.base import normalize_term
+from app.tracing import annotate, count, span
+
+CONTENT_FIELDS = ("italian_text", "phonetic", "english_translation", "example_sentence")
+BATCH_PROMPT_TEMPLATE = (
+    "You are helping beginners learn Italian. "
+    "For each Italian word/phrase below, one per line, return an item with keys: "
+    "term (the word/phrase exactly as given), italian_text, phonetic, english_translation, example_sentence. "
+    "Each example_sentence should be a simple beginner-friendly sentence using the term.\n\n{terms}"
+)
+BATCH_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "flashcard_batch",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "items": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {field: {"type": "string"} for field in ("term", *CONTENT_FIELDS)},
+                        "required": ["term", *CONTENT_FIELDS],
+                        "additionalProperties": False,
+                    },
+                },
+            },
+            "required": ["items"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+def build_linguistic_content_batch(terms: list[str], **kwargs: Any) -> dict[str, dict[str, str]]:
+    return run_sync(build_linguistic_content_batch_async(terms, **kwargs))
+
+
+async def build_linguistic_content_batch_async(
+    terms: list[str],
+    batch_size: int | None = None,
+    concurrency: int | None = None,
+    max_attempts: int | None = None,
+) -> dict[str, dict[str, str]]:
+    """Content for each of `terms`, keyed by term, in the shape build_linguistic_content_async returns.
+
+    Terms that still fail after `max_attempts` are left out of the result.
+    """
+    terms = list(dict.fromkeys(term for term in terms if term.strip()))
+    if not settings.openai_api_key:
+        return {
+            term: {
+                "italian_text": term,
+                "phonetic": "Pronunciation unavailable.",
+                "english_translation": "Translation unavailable.",
+                "example_sentence": "Example sentence unavailable.",
+            }
+            for term in terms
+        }
+
+    results = await asyncio.to_thread(get_cached_contents, terms, CONTENT_MODEL, CONTENT_PROMPT_VERSION)
+    count("flashcard_content_cache_total", len(results), result="hit")
+    count("flashcard_content_cache_total", len(terms) - len(results), result="miss")
+    pending = [term for term in terms if term not in results]
+
+    batch_size = max(1, batch_size or settings.content_batch_size)
+    max_attempts = max(1, max_attempts or settings.content_batch_max_attempts)
+    slots = asyncio.Semaphore(max(1, concurrency or settings.content_batch_concurrency))
+
+    async def run(batch: list[str], attempt: int) -> dict[str, dict[str, str]]:
+        async with slots:
+            return await _generate_batch(batch, attempt)
+
+    with span("content_batch", terms=len(terms), cached=len(results)):
+        for attempt in range(1, max_attempts + 1):
+            if not pending:
+                break
+            batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+            generated: dict[str, dict[str, str]] = {}
+            for outcome in await asyncio.gather(*(run(batch, attempt) for batch in batches)):
+                generated.update(outcome)
+            await asyncio.to_thread(put_cached_contents, CONTENT_MODEL, CONTENT_PROMPT_VERSION, generated)
+            results.update(generated)
+            pending = [term for term in pending if term not in generated]
+            if pending and attempt < max_attempts:
+                print(f"⚠️ Content batch attempt {attempt}: retrying {len(pending)} of {len(terms)} terms.")
+            # Smaller retry batches keep one bad term from sinking many good ones
+            batch_size = max(1, batch_size // 2)
+        annotate(generated=len(results), failed=len(pending))
+
+    if pending:
+        count("flashcard_content_batch_items_total", len(pending), result="failed")
+        print(f"❌ No valid content after {max_attempts} attempts for {len(pending)} terms: {pending[:10]}")
+    return results
+
+
+async def _generate_batch(batch: list[str], attempt: int) -> dict[str, dict[str, str]]:
+    """One request for `batch`; returns the items that validated, or {} when the call itself failed."""
+    import openai
+
+    from app.clients import get_async_openai
+
+    prompt = BATCH_PROMPT_TEMPLATE.format(terms="\n".join(batch))
+    max_tokens = 50 + CONTENT_OUTPUT_TOKENS * len(batch)
+    await acquire_openai_capacity(len(prompt) / 4 + max_tokens)
+
+    client = get_async_openai().with_options(timeout=settings.openai_text_timeout + 2 * len(batch))
+    with span("llm_batch", model=CONTENT_MODEL, terms=len(batch), attempt=attempt):
+        try:
+            response = await client.chat.completions.create(
+                model=CONTENT_MODEL,
+                messages=[
+                    {"role": "system", "content": CONTENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                response_format=BATCH_RESPONSE_FORMAT,
+                max_tokens=max_tokens,
+                temperature=0.3,
+            )
+        except openai.RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after")
+            get_openai_buckets()[0].pause(float(retry_after) if retry_after else 2.0 ** attempt)
+            count("flashcard_content_batch_items_total", len(batch), result="rate_limited")
+            print(f"⚠️ Content batch of {len(batch)} rate limited: {e}")
+            return {}
+        except openai.OpenAIError as e:
+            count("flashcard_content_batch_items_total", len(batch), result="error")
+            print(f"⚠️ Content batch of {len(batch)} failed: {e}")
+            return {}
+
+        try:
+            items = json.loads(response.choices[0].message.content or "{}").get("items")
+        except (ValueError, AttributeError):
+            items = None
+        valid = _validate_items(items, batch)
+        annotate(valid=len(valid))
+    count("flashcard_content_batch_items_total", len(valid), result="ok")
+    count("flashcard_content_batch_items_total", len(batch) - len(valid), result="invalid")
+    return valid
+
+
+def _validate_items(items: Any, batch: list[str]) -> dict[str, dict[str, str]]:
+    """Match items back to the requested terms; drop unknown, repeated or incomplete ones."""
+    if not isinstance(items, list):
+        return {}
+    wanted = {normalize_term(term): term for term in batch}
+    valid: dict[str, dict[str, str]] = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        term = wanted.get(normalize_term(str(item.get("term") or "")))
+        if term is None or term in valid:
+            continue
+        values = [item.get(field) for field in CONTENT_FIELDS]
+        if all(isinstance(value, str) and value.strip() for value in values):
+            valid[term] = {field: value.strip() for field, value in zip(CONTENT_FIELDS, values)}
+    return valid
+
+
+def prefill_content_cache(difficulty: str = "beginner", limit: int = 200) -> dict[str, Any]:
+    return run_sync(prefill_content_cache_async(difficulty, limit))
+
+
+async def prefill_content_cache_async(difficulty: str = "beginner", limit: int = 200) -> dict[str, Any]:
+    """Generate content ahead of time for the next `limit` terms the active TERM_SELECTION would claim."""
+    terms = await asyncio.to_thread(peek_next_terms, limit, difficulty)
+    contents = await build_linguistic_content_batch_async(terms)
+    return {"difficulty": difficulty, "requested": len(terms), "ready": len(contents), "failed": len(terms) - len(contents)}
@@ -0,0 +1,156 @@
+"""Persistent cache for LLM-generated linguistic content.
+
+Entries are keyed by the normalized term, the chat model and a hash of the
+prompt text, so changing either the model or the prompt naturally misses.
+Entries expire after CONTENT_CACHE_TTL_DAYS and the table is trimmed to
+CONTENT_CACHE_MAX_ENTRIES, least recently used first. Trimming runs at most
+once every CONTENT_CACHE_EVICT_SECONDS rather than on every write.
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from app.config import settings
+from app.storage import get_storage
+from app.storage.base import normalize_term
+
+_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+_counters_lock = threading.Lock()
+_last_evicted = 0.0
+
+
+def _count(name: str, amount: int = 1) -> None:
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def _maybe_evict(storage: Any, now: datetime) -> None:
+    """Trim the table unless that already happened in the last CONTENT_CACHE_EVICT_SECONDS."""
+    global _last_evicted
+    with _counters_lock:
+        if time.monotonic() - _last_evicted < settings.content_cache_evict_seconds:
+            return
+        _last_evicted = time.monotonic()
+    _count("evictions", storage.evict_cached_content(settings.content_cache_max_entries, now.isoformat()))
+
+
+def prompt_version(*prompt_parts: str) -> str:
+    return hashlib.sha256("\x1f".join(prompt_parts).encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(term: str, model: str, version: str) -> str:
+    return hashlib.sha256(f"{normalize_term(term)}\x1f{model}\x1f{version}".encode("utf-8")).hexdigest()
+
+
+def get_cached_content(term: str, model: str, version: str) -> dict[str, str] | None:
+    if not settings.content_cache_enabled:
+        return None
+    try:
+        content = get_storage().get_cached_content(cache_key(term, model, version), _utc_now_iso())
+    except Exception as e:
+        _count("errors")
+        print(f"⚠️ Content cache lookup failed for '{term}': {e}")
+        return None
+    _count("hits" if content is not None else "misses")
+    return content
+
+
+def put_cached_content(term: str, model: str, version: str, content: dict[str, str]) -> None:
+    if not settings.content_cache_enabled:
+        return
+    now = datetime.now(timezone.utc)
+    try:
+        storage = get_storage()
+        storage.put_cached_content({
+            "cache_key": cache_key(term, model, version),
+            "term": normalize_term(term),
+            "model": model,
+            "prompt_version": version,
+            "content": content,
+            "created_at": now.isoformat(),
+            "last_used_at": now.isoformat(),
+            "expires_at": (now + timedelta(days=settings.content_cache_ttl_days)).isoformat(),
+        })
+        _count("stores")
+        _maybe_evict(storage, now)
+    except Exception as e:
+        _count("errors")
+        print(f"⚠️ Content cache store failed for '{term}': {e}")
+
+
+def put_cached_contents(model: str, version: str, contents: dict[str, dict[str, str]]) -> None:
+    """Store many terms' content in one write."""
+    if not settings.content_cache_enabled or not contents:
+        return
+    now = datetime.now(timezone.utc)
+    try:
+        storage = get_storage()
+        storage.put_cached_contents([
+            {
+                "cache_key": cache_key(term, model, version),
+                "term": normalize_term(term),
+                "model": model,
+                "prompt_version": version,
+                "content": content,
+                "created_at": now.isoformat(),
+                "last_used_at": now.isoformat(),
+                "expires_at": (now + timedelta(days=settings.content_cache_ttl_days)).isoformat(),
+            }
+            for term, content in contents.items()
+        ])
+        _count("stores", len(contents))
+        _maybe_evict(storage, now)
+    except Exception as e:
+        _count("errors")
+        print(f"⚠️ Content cache store failed for {len(contents)} terms: {e}")
+
+
+def get_cached_contents(terms: list[str], model: str, version: str) -> dict[str, dict[str, str]]:
+    """Bulk form of get_cached_content: the cached terms of `terms`, in one lookup."""
+    if not settings.content_cache_enabled or not terms:
+        return {}
+    keys = {term: cache_key(term, model, version) for term in terms}
+    try:
+        found = get_storage().get_cached_contents(list(set(keys.values())), _utc_now_iso())
+    except Exception as e:
+        _count("errors")
+        print(f"⚠️ Content cache lookup failed for {len(terms)} terms: {e}")
+        return {}
+    contents = {term: found[key] for term, key in keys.items() if key in found}
+    _count("hits", len(contents))
+    _count("misses", len(keys) - len(contents))
+    return contents
+
+
+def warm_content_cache(model: str, version: str, limit: int = 1000) -> int:
+    """Seed the cache from already-generated flashcards so recycled terms skip the LLM."""
+    contents = {}
+    for row in get_storage().list_flashcards(limit=limit):
+        content = {
+            "italian_text": row.get("italian_text") or "",
+            "phonetic": row.get("phonetic") or "",
+            "english_translation": row.get("english_translation") or "",
+            "example_sentence": row.get("example_sentence") or "",
+        }
+        if content["italian_text"] and "unavailable" not in content["english_translation"].lower():
+            # Newest first, so the latest rendering of a term wins; one entry per cache key
+            contents.setdefault(normalize_term(content["italian_text"]), content)
+    cached = get_cached_contents(list(contents), model, version)
+    missing = {term: content for term, content in contents.items() if term not in cached}
+    put_cached_contents(model, version, missing)
+    return len(missing)
+
+
+def content_cache_stats() -> dict[str, Any]:
+    with _counters_lock:
+        stats: dict[str, Any] = dict(_counters)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else None
+    stats["enabled"] = settings.content_cache_enabled
+    return stats
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -1,100 +1,147 @@
-"""Diagnostic endpoints to test each component individually."""
+"""Diagnostic endpoints to test each component individually.
+
+Probes run concurrently, each under its own deadline. By default they are
+cheap: a storage count, model lookups instead of a completion or an image
+render, and Telegram `getMe` instead of a message. `deep=True` runs the real
+(slow, billable) calls. Reports are cached for DIAGNOSTICS_CACHE_SECONDS per
+mode, so repeated health checks return immediately.
+"""
+import asyncio
+import time
 import traceback
-from openai import OpenAI
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable
+
+from app.clients import run_sync
 from app.config import settings
-from app.db import get_supabase
-from app.telegram_client import send_telegram_message
+from app.storage import get_async_storage, resolve_backend_name
 
+Probe = Callable[[bool, float], Awaitable[dict]]
 
-def test_database() -> dict:
-    """Test Supabase connection and connectivity."""
-    try:
-        if not settings.supabase_url or not settings.supabase_key:
-            return {"status": "⚠️ SKIPPED", "reason": "Supabase URL or Key not configured"}
-            
-        supabase = get_supabase()
-        # Simple query to test connection
-        response = supabase.table("source_terms").select("id").limit(1).execute()
-        return {"status": "✅ SUCCESS", "data_received": len(response.data) if response.data else 0}
-    except Exception as e:
-        return {"status": "❌ FAILED", "error": str(e), "traceback": traceback.format_exc()}
+_cache: dict[bool, tuple[float, dict[str, Any]]] = {}
 
 
-def test_openai_text() -> dict:
-    """Test OpenAI text generation."""
-    try:
-        if not settings.openai_api_key:
-            return {"status": "⚠️ SKIPPED", "reason": "No API key configured"}
-        
-        client = OpenAI(api_key=settings.openai_api_key)
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": "Say 'test successful' in Italian"}],
-            max_tokens=20
-        )
-        result = response.choices[0].message.content
-        return {"status": "✅ SUCCESS", "response": result}
-    except Exception as e:
-        return {"status": "❌ FAILED", "error": str(e), "traceback": traceback.format_exc()}
+async def test_database_async(deep: bool, timeout: float) -> dict:
+    """Test the configured storage backend (Supabase or local SQLite)."""
+    storage = get_async_storage()
+    return {"status": "✅ SUCCESS", "backend": storage.name, "source_terms": await storage.count_source_terms()}
 
 
-def test_telegram() -> dict:
-    """Test Telegram message sending."""
-    try:
-        if not settings.telegram_bot_token or not settings.telegram_chat_id:
-            return {"status": "⚠️ SKIPPED", "reason": "Telegram not configured"}
-        
-        send_telegram_message("🧪 Test message from Italian Flashcard Service")
+async def test_openai_text_async(deep: bool, timeout: float) -> dict:
+    """Test OpenAI text generation (deep), or that the key can see the content model."""
+    from app.clients import get_async_openai
+    from app.flashcards import CONTENT_MODEL
+
+    if not settings.openai_api_key:
+        return {"status": "⚠️ SKIPPED", "reason": "No API key configured"}
+    client = get_async_openai().with_options(timeout=timeout)
+    if not deep:
+        model = await client.models.retrieve(CONTENT_MODEL)
+        return {"status": "✅ SUCCESS", "model": model.id}
+    response = await client.chat.completions.create(
+        model=CONTENT_MODEL,
+        messages=[{"role": "user", "content": "Say 'test successful' in Italian"}],
+        max_tokens=20,
+    )
+    return {"status": "✅ SUCCESS", "response": response.choices[0].message.content}
+
+
+async def test_telegram_async(deep: bool, timeout: float) -> dict:
+    """Test Telegram message sending (deep), or that the bot token is valid."""
+    from app.clients import get_async_telegram_http
+    from app.telegram_client import send_telegram_message_async
+
+    if not settings.telegram_bot_token or not settings.telegram_chat_id:
+        return {"status": "⚠️ SKIPPED", "reason": "Telegram not configured"}
+    if deep:
+        await send_telegram_message_async("🧪 Test message from Italian Flashcard Service")
         return {"status": "✅ SUCCESS", "message": "Check your Telegram!"}
-    except Exception as e:
-        return {"status": "❌ FAILED", "error": str(e), "traceback": traceback.format_exc()}
+    response = await get_async_telegram_http().post("/getMe", timeout=timeout)
+    response.raise_for_status()
+    bot = response.json().get("result") or {}
+    return {"status": "✅ SUCCESS", "bot": bot.get("username")}
+
 
+async def test_image_generation_async(deep: bool, timeout: float) -> dict:
+    """Test OpenAI image generation with the configured model (deep), or that the model is available."""
+    from app.clients import get_async_openai
 
-def test_image_generation() -> dict:
-    """Test OpenAI image generation with configured model."""
+    if not settings.openai_api_key:
+        return {"status": "⚠️ SKIPPED", "reason": "No API key configured"}
+    client = get_async_openai().with_options(timeout=timeout)
+    if not deep:
+        model = await client.models.retrieve(settings.image_model)
+        return {"status": "✅ SUCCESS", "model": model.id}
+    print(f"Testing image model: {settings.image_model}")
+    response = await client.images.generate(
+        model=settings.image_model,
+        prompt="A small red apple on a white background, minimalist flat 2D style.",
+        size=settings.image_size,
+        n=1,
+    )
+    return {
+        "status": "✅ SUCCESS",
+        "model_used": settings.image_model,
+        "image_url": response.data[0].url if response.data and response.data[0].url else "No URL",
+    }
+
+
+PROBES: dict[str, Probe] = {
+    "1_database": test_database_async,
+    "2_openai_text": test_openai_text_async,
+    "3_telegram": test_telegram_async,
+    "4_image_gen": test_image_generation_async,
+}
+
+
+def _deadline(name: str, deep: bool) -> float:
+    if deep and name == "4_image_gen":
+        return settings.openai_image_timeout
+    return settings.diagnostics_timeout
+
+
+async def _run_probe(name: str, probe: Probe, deep: bool) -> dict:
+    timeout = _deadline(name, deep)
+    started = time.perf_counter()
     try:
-        if not settings.openai_api_key:
-            return {"status": "⚠️ SKIPPED", "reason": "No API key configured"}
-        
-        client = OpenAI(api_key=settings.openai_api_key, timeout=30.0)
-        print(f"Testing image model: {settings.image_model}")
-        
-        # Small test prompt
-        response = client.images.generate(
-            model=settings.image_model,
-            prompt="A small red apple on a white background, minimalist flat 2D style.",
-            size=settings.image_size,
-            n=1
-        )
-        return {
-            "status": "✅ SUCCESS",
-            "model_used": settings.image_model,
-            "image_url": response.data[0].url if response.data else "No URL"
-        }
+        result = await asyncio.wait_for(probe(deep, timeout), timeout=timeout)
+    except asyncio.TimeoutError:
+        result = {"status": "❌ FAILED", "error": f"No answer within {timeout:g}s"}
     except Exception as e:
-        return {
-            "status": "❌ FAILED",
-            "model_tried": settings.image_model,
-            "error": str(e),
-            "traceback": traceback.format_exc()
-        }
+        result = {"status": "❌ FAILED", "error": str(e), "traceback": traceback.format_exc()}
+    if name == "4_image_gen" and result["status"] == "❌ FAILED":
+        result["model_tried"] = settings.image_model
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
 
 
-def run_all_diagnostics() -> dict:
-    """Run all diagnostic tests."""
-    return {
+def run_all_diagnostics(deep: bool = False, refresh: bool = False) -> dict:
+    return run_sync(run_all_diagnostics_async(deep, refresh))
+
+
+async def run_all_diagnostics_async(deep: bool = False, refresh: bool = False) -> dict:
+    """Run all diagnostic tests at once, or return the cached report when it is fresh."""
+    cached = _cache.get(deep)
+    if cached is not None and not refresh and time.monotonic() < cached[0]:
+        return {**cached[1], "cached": True}
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(_run_probe(name, probe, deep) for name, probe in PROBES.items()))
+    report = {
         "environment": {
             "is_vercel": settings.is_vercel,
+            "storage_backend": resolve_backend_name(),
             "has_supabase_url": bool(settings.supabase_url),
             "has_openai_key": bool(settings.openai_api_key),
             "image_model": settings.image_model,
             "has_telegram_token": bool(settings.telegram_bot_token),
             "has_telegram_chat_id": bool(settings.telegram_chat_id),
         },
-        "tests": {
-            "1_database": test_database(),
-            "2_openai_text": test_openai_text(),
-            "3_telegram": test_telegram(),
-            "4_image_gen": test_image_generation(),
-        }
+        "deep": deep,
+        "healthy": all(result["status"] != "❌ FAILED" for result in results),
+        "checked_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "tests": dict(zip(PROBES, results)),
     }
+    _cache[deep] = (time.monotonic() + settings.diagnostics_cache_seconds, report)
+    return {**report, "cached": False}
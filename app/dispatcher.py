@@ -0,0 +1,363 @@
+"""Per-subscriber delivery times, dispatched from a timing wheel.
+
+Every subscriber may set an IANA timezone and a local "HH:MM" delivery time
+(NULL falls back to TIMEZONE and SCHEDULE_HOUR:SCHEDULE_MINUTE). Their next
+delivery, as a UTC minute, sits in one of 1440 per-minute slots. A single job
+ticks once a minute. It empties the current slot and sends the day's card to
+everyone in it with one fan-out run, then files each of them under their next
+delivery. A tick costs the size of its batch whatever the number of
+subscribers, and there is no per-subscriber job.
+
+The card of the day is popped from the ready buffer once and reused for every
+batch for DAILY_CARD_MAX_AGE_HOURS. Schedules are reloaded every
+SCHEDULE_RELOAD_SECONDS. In between, each tick rereads the subscribers whose
+updated_at moved since the last one, so a change made through the API on any
+instance (not only the leader) applies by the next minute. A batch whose
+delivery fails is retried DISPATCH_RETRY_MINUTES later.
+Deliveries are logged per chat, so a retried or caught-up batch skips chats
+that already have the card.
+"""
+import asyncio
+import functools
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.clients import run_sync
+from app.config import settings
+from app.storage import get_async_storage, get_storage
+from app.tracing import annotate, count, span
+
+MINUTES_PER_DAY = 1440
+_PAGE_SIZE = 1000
+# On startup, deliveries missed by up to this many minutes (e.g. a restart) still go out
+_CATCHUP_MINUTES = 60
+# Changed rows are reread with this much overlap, for clock skew between instances
+_CHANGE_OVERLAP_SECONDS = 60
+
+
+class TimingWheel:
+    """One slot per minute of the day; keys are filed under the UTC minute they are due.
+
+    A key due more than a day ahead waits in its slot for the later rotation.
+    """
+
+    def __init__(self, cursor: int, size: int = MINUTES_PER_DAY) -> None:
+        self.size = size
+        self.cursor = cursor  # next epoch minute to expire
+        self._slots: list[dict[str, int]] = [{} for _ in range(size)]
+        self._where: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._where
+
+    def schedule(self, key: str, due: int) -> None:
+        """File `key` under epoch minute `due` (minutes already expired count as the next one)."""
+        self.cancel(key)
+        due = max(due, self.cursor)
+        slot = due % self.size
+        self._slots[slot][key] = due
+        self._where[key] = slot
+
+    def cancel(self, key: str) -> None:
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            self._slots[slot].pop(key, None)
+
+    def advance(self, now: int) -> list[str]:
+        """Expire every key due at or before epoch minute `now`, in due order."""
+        expired: list[str] = []
+        # Past one rotation every slot has been looked at once already
+        end = min(now, self.cursor + self.size - 1)
+        while self.cursor <= end:
+            slot = self._slots[self.cursor % self.size]
+            if slot:
+                due = [key for key, minute in slot.items() if minute <= now]
+                for key in due:
+                    del slot[key]
+                    del self._where[key]
+                expired += due
+            self.cursor += 1
+        self.cursor = max(self.cursor, now + 1)
+        return expired
+
+    def upcoming(self, limit: int = 5) -> list[tuple[int, int]]:
+        """(epoch minute, keys due) for the next non-empty minutes within a day."""
+        batches = []
+        for minute in range(self.cursor, self.cursor + self.size):
+            slot = self._slots[minute % self.size]
+            due = sum(1 for due in slot.values() if due == minute)
+            if due:
+                batches.append((minute, due))
+                if len(batches) >= limit:
+                    break
+        return batches
+
+
+@functools.lru_cache(maxsize=512)
+def _zone(name: str) -> ZoneInfo:
+    return ZoneInfo(name)
+
+
+def parse_timezone(name: str) -> str:
+    name = name.strip()
+    try:
+        _zone(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone '{name}'. Use an IANA name such as Europe/Rome.") from None
+    return name
+
+
+def parse_delivery_time(text: str) -> str:
+    """`"7:30"` -> `"07:30"`; raises ValueError for anything that is not a 24-hour HH:MM."""
+    try:
+        parsed = datetime.strptime(text.strip(), "%H:%M")
+    except ValueError:
+        raise ValueError(f"Invalid delivery time '{text}'. Use 24-hour HH:MM, e.g. 07:30.") from None
+    return parsed.strftime("%H:%M")
+
+
+def next_due(tz_name: str, delivery_time: str, after: int) -> int:
+    """First epoch minute at or after `after` that is `delivery_time` local time in `tz_name`."""
+    zone = _zone(tz_name)
+    hour, minute = map(int, delivery_time.split(":"))
+    day = datetime.fromtimestamp(after * 60, zone).date()
+    while True:
+        candidate = int(datetime(day.year, day.month, day.day, hour, minute, tzinfo=zone).timestamp() // 60)
+        if candidate >= after:
+            return candidate
+        day += timedelta(days=1)
+
+
+def _default_schedule() -> tuple[str, str]:
+    return settings.timezone, f"{settings.schedule_hour:02d}:{settings.schedule_minute:02d}"
+
+
+class DeliveryDispatcher:
+    """Timing wheel of active subscribers plus the card they get today."""
+
+    def __init__(self) -> None:
+        self.wheel: TimingWheel | None = None
+        self._schedules: dict[str, tuple[str, str]] = {}
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._changes_since = ""
+        self._card: dict[str, Any] | None = None
+        self._card_at = 0.0
+        self.last_run: dict[str, Any] | None = None
+
+    # --- schedules ---
+
+    def _effective(self, row: dict[str, Any]) -> tuple[str, str]:
+        default_tz, default_time = _default_schedule()
+        tz_name = row.get("timezone") or default_tz
+        try:
+            _zone(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            print(f"⚠️ Subscriber {row['chat_id']} has unknown timezone '{tz_name}'; using {default_tz}.")
+            tz_name = default_tz
+        return tz_name, row.get("delivery_time") or default_time
+
+    def _load(self, now: float) -> None:
+        """Sync the wheel with storage; only new, changed or removed subscribers are touched."""
+        storage = get_storage()
+        changes_since = _changes_cutoff()
+        seen: dict[str, tuple[str, str]] = {}
+        after = None
+        while True:
+            page = storage.list_subscriber_schedules(after=after, limit=_PAGE_SIZE)
+            for row in page:
+                seen[str(row["chat_id"])] = self._effective(row)
+            if len(page) < _PAGE_SIZE:
+                break
+            after = page[-1]["chat_id"]
+        with self._lock:
+            if self.wheel is None:
+                self.wheel = TimingWheel(int(now // 60) - _CATCHUP_MINUTES)
+            for chat_id in self._schedules.keys() - seen.keys():
+                self.wheel.cancel(chat_id)
+            for chat_id, schedule in seen.items():
+                if self._schedules.get(chat_id) != schedule or chat_id not in self.wheel:
+                    self.wheel.schedule(chat_id, next_due(*schedule, self.wheel.cursor))
+            self._schedules = seen
+            self._loaded_at = time.monotonic()
+            self._changes_since = changes_since
+
+    def _load_changes(self, now: float) -> None:
+        """Apply subscribers changed since the last sync, wherever the change was made."""
+        changes_since = _changes_cutoff()
+        rows = get_storage().list_subscriber_changes(self._changes_since, limit=_PAGE_SIZE)
+        if len(rows) >= _PAGE_SIZE:
+            self._load(now)
+            return
+        for row in rows:
+            self.update(str(row["chat_id"]), row if row["active"] else None)
+        self._changes_since = changes_since
+
+    def update(self, chat_id: str, row: dict[str, Any] | None) -> None:
+        """Apply one subscriber's change to the wheel, if loaded; `row` None means they unsubscribed."""
+        with self._lock:
+            if self.wheel is None:
+                return
+            if row is None:
+                self._schedules.pop(chat_id, None)
+                self.wheel.cancel(chat_id)
+                return
+            schedule = self._effective(row)
+            if self._schedules.get(chat_id) != schedule or chat_id not in self.wheel:
+                self._schedules[chat_id] = schedule
+                self.wheel.schedule(chat_id, next_due(*schedule, self.wheel.cursor))
+
+    # --- ticking ---
+
+    async def tick_async(self, now: float | None = None) -> dict[str, Any]:
+        """Deliver to every subscriber due by `now` in one batch and reschedule them for tomorrow."""
+        now = time.time() if now is None else now
+        minute = int(now // 60)
+        if self.wheel is None or time.monotonic() - self._loaded_at >= settings.schedule_reload_seconds:
+            await asyncio.to_thread(self._load, now)
+        else:
+            await asyncio.to_thread(self._load_changes, now)
+        with self._lock:
+            due = self.wheel.advance(minute)
+            for chat_id in due:
+                schedule = self._schedules.get(chat_id)
+                if schedule is not None:
+                    self.wheel.schedule(chat_id, next_due(*schedule, minute + 1))
+        if not due:
+            return {"due": 0}
+
+        with span("dispatch_batch", due=len(due)):
+            try:
+                card = await self._card_of_the_day(now)
+                report = await self._deliver(card, due)
+            except Exception as e:
+                retry_at = minute + settings.dispatch_retry_minutes
+                with self._lock:
+                    for chat_id in due:
+                        if chat_id in self._schedules:
+                            self.wheel.schedule(chat_id, retry_at)
+                count("dispatch_batches_total", outcome="error")
+                print(f"❌ Scheduled delivery to {len(due)} subscribers failed, retrying in "
+                      f"{settings.dispatch_retry_minutes} min: {e}")
+                self.last_run = {"at": _iso_minute(minute), "due": len(due), "error": str(e)}
+                return self.last_run
+            annotate(flashcard_id=card["id"], sent=report["sent"])
+        count("dispatch_batches_total", outcome="ok")
+        count("dispatch_recipients_total", len(due))
+        self.last_run = {
+            "at": _iso_minute(minute),
+            "due": len(due),
+            "flashcard_id": card["id"],
+            **{key: report[key] for key in ("sent", "failed", "blocked", "skipped_already_delivered")},
+        }
+        return self.last_run
+
+    async def _card_of_the_day(self, now: float) -> dict[str, Any]:
+        max_age = settings.daily_card_max_age_hours * 3600
+        if self._card is not None and now - self._card_at < max_age:
+            return self._card
+
+        storage = get_async_storage()
+        card, card_at = None, now
+        if self._card is None:
+            # After a restart keep going with the card already out today
+            latest = await storage.list_flashcards(limit=1)
+            sent_at = _timestamp(latest[0].get("sent_at")) if latest else None
+            if sent_at is not None and now - sent_at < max_age and str(latest[0].get("status")).startswith("sent"):
+                card, card_at = latest[0], sent_at
+        if card is None:
+            card = await storage.pop_ready_flashcard()
+        if card is None:
+            from app.pregen import fill_ready_buffer_async
+
+            print("Ready buffer empty. Generating today's card for scheduled delivery.")
+            await fill_ready_buffer_async(target=1)
+            card = await storage.pop_ready_flashcard()
+        if card is None:
+            raise RuntimeError("No flashcard available for scheduled delivery")
+        print(f"Card of the day: flashcard {card['id']} ('{card['italian_text']}').")
+        self._card, self._card_at = card, card_at
+        return card
+
+    async def _deliver(self, card: dict[str, Any], chat_ids: list[str]) -> dict[str, Any]:
+        from app.fanout import fan_out_flashcard_async
+        from app.flashcards import build_caption
+        from app.pregen import card_image_async
+
+        caption = card.get("caption") or build_caption(
+            card["italian_text"], card.get("phonetic") or "", card.get("english_translation") or "",
+            card.get("example_sentence") or "",
+        )
+        image_path = await card_image_async(card)
+        return await fan_out_flashcard_async(card["id"], caption, image_path=image_path, chat_ids=chat_ids)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            if self.wheel is None:
+                return {"loaded": False}
+            return {
+                "loaded": True,
+                "scheduled": len(self.wheel),
+                "next_batches": [
+                    {"at": _iso_minute(minute), "subscribers": due} for minute, due in self.wheel.upcoming()
+                ],
+                "card_of_the_day": self._card["id"] if self._card else None,
+                "last_run": self.last_run,
+            }
+
+
+_dispatcher: DeliveryDispatcher | None = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> DeliveryDispatcher:
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = DeliveryDispatcher()
+        return _dispatcher
+
+
+def dispatch_due_flashcards() -> dict[str, Any]:
+    return run_sync(get_dispatcher().tick_async())
+
+
+def set_subscriber_schedule(chat_id: str, timezone: str | None, delivery_time: str | None) -> dict[str, Any]:
+    """Subscribe `chat_id` with its own timezone and delivery time (None keeps the default)."""
+    from app.fanout import add_subscriber
+
+    row = {
+        "chat_id": str(chat_id),
+        "timezone": parse_timezone(timezone) if timezone else None,
+        "delivery_time": parse_delivery_time(delivery_time) if delivery_time else None,
+    }
+    add_subscriber(row["chat_id"])
+    get_storage().set_subscriber_schedule(row["chat_id"], row["timezone"], row["delivery_time"])
+    dispatcher = get_dispatcher()
+    dispatcher.update(row["chat_id"], row)
+    tz_name, local_time = dispatcher._effective(row)
+    return {**row, "next_delivery": _iso_minute(next_due(tz_name, local_time, int(time.time() // 60) + 1))}
+
+
+def _changes_cutoff() -> str:
+    return datetime.fromtimestamp(time.time() - _CHANGE_OVERLAP_SECONDS, timezone.utc).isoformat()
+
+
+def _iso_minute(minute: int) -> str:
+    return datetime.fromtimestamp(minute * 60, timezone.utc).isoformat(timespec="minutes")
+
+
+def _timestamp(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
@@ -0,0 +1,413 @@
+"""Streaming deck exports: an Anki package, CSV, or a ZIP of images plus metadata.
+
+Cards are read oldest first, a page at a time, by (created_at, id). Images are
+copied from disk in small chunks. Archives go through a zip writer that never
+seeks, with sizes in data descriptors, so bytes leave as soon as each card is
+written. Memory stays flat however long the history is. What must come after
+the images (the ZIP's cards.csv, the package's collection and media map) is
+spooled to temporary files and copied in at the end.
+
+`since` exports cards created at or after a timestamp. `cursor` continues after
+a given card; it is the same token GET /flashcards uses. Each export reports the
+cursor to continue from next time (export.json in the ZIP, printed by the CLI).
+The Anki notes have stable guids, so importing an overlapping export updates
+cards instead of duplicating them.
+
+    python -m app.export deck.apkg
+    python -m app.export new-cards.zip --state .export-cursor   # only cards added since the last run
+    curl -o deck.apkg 'localhost:8000/flashcards/export?format=apkg&since=2026-10-01'
+"""
+import argparse
+import contextlib
+import csv
+import hashlib
+import html
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+from app.flashcards import FLASHCARD_FIELDS, decode_cursor, encode_cursor
+from app.storage import get_storage
+
+FORMATS = ("apkg", "csv", "zip")
+MEDIA_TYPES = {"apkg": "application/octet-stream", "csv": "text/csv; charset=utf-8", "zip": "application/zip"}
+DEFAULT_DECK = "Italian Flashcards"
+_PAGE_SIZE = 500
+_CHUNK_SIZE = 64 * 1024
+# Stable, so re-importing updates the same note type instead of adding a copy
+_MODEL_ID = 1729000000001
+# Before every stored card: valid for Postgres and sorts first as SQLite text
+_START = ("0001-01-01T00:00:00+00:00", 0)
+
+
+def parse_since(value: str) -> str:
+    """ISO date or datetime (UTC when no offset is given), normalized like stored created_at values."""
+    try:
+        when = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError as e:
+        raise ValueError(f"Invalid since timestamp: {value!r}") from e
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.astimezone(timezone.utc).isoformat()
+
+
+def start_position(since: str | None = None, cursor: str | None = None) -> tuple[str, int] | None:
+    """The (created_at, id) to export after; `cursor` wins over `since`."""
+    if cursor:
+        return decode_cursor(cursor)
+    if since:
+        # (since, 0) also keeps cards created exactly at `since`
+        return parse_since(since), 0
+    return None
+
+
+class _Sink:
+    """Write-only file for ZipFile; the generator hands out what was written after each step."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class DeckExport:
+    """One export; iterate it for the output bytes, then read `report`."""
+
+    def __init__(self, fmt: str, after: tuple[str, int] | None = None, deck_name: str = DEFAULT_DECK) -> None:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.after = after
+        self.deck_name = deck_name
+        self.report: dict[str, Any] = {
+            "format": fmt, "cards": 0, "images": 0, "missing_images": 0,
+            "cursor": encode_cursor({"created_at": after[0], "id": after[1]}) if after else None,
+        }
+
+    def __iter__(self) -> Iterator[bytes]:
+        return {"apkg": self._apkg, "csv": self._csv, "zip": self._zip}[self.fmt]()
+
+    def _cards(self) -> Iterator[dict[str, Any]]:
+        storage = get_storage()
+        after = self.after or _START
+        while True:
+            page = storage.list_flashcards(limit=_PAGE_SIZE, after=after)
+            for row in page:
+                self.report["cards"] += 1
+                self.report["cursor"] = encode_cursor(row)
+                yield row
+            if len(page) < _PAGE_SIZE:
+                return
+            after = (page[-1]["created_at"], page[-1]["id"])
+
+    def _image(self, card: dict[str, Any]) -> Path | None:
+        from app.pregen import resolve_card_image
+
+        path = resolve_card_image(card)
+        if path:
+            self.report["images"] += 1
+            return Path(path)
+        if card.get("image_url") or card.get("image_key"):
+            # Remote URLs expire and evicted files are gone; the row is still exported
+            self.report["missing_images"] += 1
+        return None
+
+    # --- CSV ---
+
+    def _csv(self) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(FLASHCARD_FIELDS)
+        for card in self._cards():
+            writer.writerow([card.get(field) for field in FLASHCARD_FIELDS])
+            if buffer.tell() >= _CHUNK_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+    # --- ZIP of images plus metadata ---
+
+    def _zip(self) -> Iterator[bytes]:
+        sink = _Sink()
+        with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as metadata, \
+                zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+            writer = csv.writer(metadata)
+            writer.writerow([*FLASHCARD_FIELDS, "image_file"])
+            for card in self._cards():
+                image = self._image(card)
+                name = f"images/{card['id']}{image.suffix}" if image else None
+                if image:
+                    yield from _copy_into(archive, sink, name, image, zipfile.ZIP_STORED)
+                writer.writerow([*(card.get(field) for field in FLASHCARD_FIELDS), name])
+            metadata.seek(0)
+            yield from _copy_into(archive, sink, "cards.csv", metadata, zipfile.ZIP_DEFLATED)
+            summary = {**self.report, "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+            archive.writestr("export.json", json.dumps(summary, indent=2))
+        yield sink.drain()
+
+    # --- Anki package ---
+
+    def _apkg(self) -> Iterator[bytes]:
+        sink = _Sink()
+        with tempfile.TemporaryDirectory() as workdir:
+            collection = _AnkiCollection(Path(workdir) / "collection.anki2", self.deck_name)
+            with open(Path(workdir) / "media", "w+", encoding="utf-8") as media, \
+                    zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as archive:
+                media.write("{")
+                media_count = 0
+                for card in self._cards():
+                    image = self._image(card)
+                    filename = None
+                    if image:
+                        # Package members are numbered; the media map gives their real names
+                        filename = f"italian-flashcard-{card['id']}{image.suffix}"
+                        yield from _copy_into(archive, sink, str(media_count), image, zipfile.ZIP_STORED)
+                        media.write(f"{',' if media_count else ''}{json.dumps(str(media_count))}:{json.dumps(filename)}")
+                        media_count += 1
+                    collection.add(card, filename)
+                collection.close()
+                with open(collection.path, "rb") as db:
+                    yield from _copy_into(archive, sink, "collection.anki2", db, zipfile.ZIP_DEFLATED)
+                media.write("}")
+                media.seek(0)
+                yield from _copy_into(archive, sink, "media", media, zipfile.ZIP_DEFLATED)
+            yield sink.drain()
+
+
+def _copy_into(
+    archive: zipfile.ZipFile, sink: _Sink, name: str, source: Path | IO, compress_type: int
+) -> Iterator[bytes]:
+    """Add `source` (a path or an open file) as `name`, handing out output as each chunk is compressed."""
+    info = zipfile.ZipInfo(name, date_time=time.gmtime()[:6])
+    info.compress_type = compress_type
+    with (open(source, "rb") if isinstance(source, Path) else contextlib.nullcontext(source)) as src, \
+            archive.open(info, "w") as dest:
+        while chunk := src.read(_CHUNK_SIZE):
+            dest.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            if data := sink.drain():
+                yield data
+    if data := sink.drain():
+        yield data
+
+
+_ANKI_SCHEMA = """
+CREATE TABLE col (
+    id integer primary key, crt integer not null, mod integer not null, scm integer not null,
+    ver integer not null, dty integer not null, usn integer not null, ls integer not null,
+    conf text not null, models text not null, decks text not null, dconf text not null, tags text not null
+);
+CREATE TABLE notes (
+    id integer primary key, guid text not null, mid integer not null, mod integer not null,
+    usn integer not null, tags text not null, flds text not null, sfld integer not null,
+    csum integer not null, flags integer not null, data text not null
+);
+CREATE TABLE cards (
+    id integer primary key, nid integer not null, did integer not null, ord integer not null,
+    mod integer not null, usn integer not null, type integer not null, queue integer not null,
+    due integer not null, ivl integer not null, factor integer not null, reps integer not null,
+    lapses integer not null, left integer not null, odue integer not null, odid integer not null,
+    flags integer not null, data text not null
+);
+CREATE TABLE revlog (
+    id integer primary key, cid integer not null, usn integer not null, ease integer not null,
+    ivl integer not null, lastIvl integer not null, factor integer not null, time integer not null,
+    type integer not null
+);
+CREATE TABLE graves (usn integer not null, oid integer not null, type integer not null);
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+_ANKI_FIELDS = ("Italian", "Pronunciation", "English", "Example", "Image")
+_ANKI_CSS = """.card { font-family: arial; font-size: 22px; text-align: center; color: black; background-color: white; }
+.italian { font-size: 32px; font-weight: bold; }
+.pronunciation { color: #666; }
+.example { font-style: italic; margin-top: 12px; }
+img { max-width: 90%; margin-top: 12px; }"""
+_ANKI_FRONT = '<div class="italian">{{Italian}}</div>'
+_ANKI_BACK = (
+    '{{FrontSide}}<hr id="answer"><div class="pronunciation">{{Pronunciation}}</div>'
+    '<div class="english">{{English}}</div><div class="example">{{Example}}</div>{{Image}}'
+)
+
+
+class _AnkiCollection:
+    """A legacy (schema 11) Anki collection file, filled one card at a time."""
+
+    def __init__(self, path: Path, deck_name: str) -> None:
+        self.path = path
+        self.deck_id = int(hashlib.sha1(deck_name.encode("utf-8")).hexdigest()[:12], 16)
+        self._now = int(time.time())
+        self._last_id = 0
+        self._position = 0
+        # A streamed response resumes its generator on whichever worker thread is free
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.executescript(_ANKI_SCHEMA)
+        self._conn.execute(
+            "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, ?, ?, ?, '{}')",
+            (self._now, self._now * 1000, self._now * 1000, json.dumps(self._conf()), json.dumps(self._models()),
+             json.dumps(self._decks(deck_name)), json.dumps(self._dconf())),
+        )
+
+    def add(self, card: dict[str, Any], image_filename: str | None) -> None:
+        # Ids are creation times in ms (Anki shows them as "Created"), bumped to stay unique
+        created = _epoch_ms(card.get("created_at"))
+        note_id = self._last_id = max(created, self._last_id + 1)
+        self._position += 1
+        italian = card.get("italian_text") or ""
+        fields = [
+            _field(italian),
+            _field(card.get("phonetic")),
+            _field(card.get("english_translation")),
+            _field(card.get("example_sentence")),
+            f'<img src="{html.escape(image_filename)}">' if image_filename else "",
+        ]
+        tags = " ".join(tag for tag in ("italian-flashcard", card.get("difficulty")) if tag)
+        self._conn.execute(
+            "INSERT INTO notes VALUES (?, ?, ?, ?, -1, ?, ?, ?, ?, 0, '')",
+            (note_id, f"italian-flashcard-{card['id']}", _MODEL_ID, self._now, f" {tags} ", "\x1f".join(fields),
+             italian, int(hashlib.sha1(italian.encode("utf-8")).hexdigest()[:8], 16)),
+        )
+        # A new card: type and queue 0, due is its position in the new queue
+        self._conn.execute(
+            "INSERT INTO cards VALUES (?, ?, ?, 0, ?, -1, 0, 0, ?, 0, 0, 0, 0, 0, 0, 0, 0, '')",
+            (note_id, note_id, self.deck_id, self._now, self._position),
+        )
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+
+    def _conf(self) -> dict[str, Any]:
+        return {
+            "activeDecks": [1], "curDeck": 1, "newSpread": 0, "collapseTime": 1200, "timeLim": 0,
+            "estTimes": True, "dueCounts": True, "curModel": str(_MODEL_ID), "nextPos": self._position + 1,
+            "sortType": "noteFld", "sortBackwards": False, "addToCur": True,
+        }
+
+    def _models(self) -> dict[str, Any]:
+        return {str(_MODEL_ID): {
+            "id": _MODEL_ID, "name": "Italian Flashcard", "type": 0, "mod": self._now, "usn": -1, "sortf": 0,
+            "did": self.deck_id, "tags": [], "vers": [], "css": _ANKI_CSS, "latexsvg": False,
+            "latexPre": "\\documentclass[12pt]{article}\n\\special{papersize=3in,5in}\n\\usepackage{amssymb,amsmath}\n"
+                        "\\pagestyle{empty}\n\\setlength{\\parindent}{0in}\n\\begin{document}\n",
+            "latexPost": "\\end{document}",
+            "flds": [
+                {"name": name, "ord": index, "font": "Arial", "size": 20, "media": [], "rtl": False, "sticky": False}
+                for index, name in enumerate(_ANKI_FIELDS)
+            ],
+            "tmpls": [{
+                "name": "Italian → English", "ord": 0, "qfmt": _ANKI_FRONT, "afmt": _ANKI_BACK,
+                "bqfmt": "", "bafmt": "", "bfont": "", "bsize": 0, "did": None,
+            }],
+            "req": [[0, "any", [0]]],
+        }}
+
+    def _decks(self, deck_name: str) -> dict[str, Any]:
+        def deck(deck_id: int, name: str) -> dict[str, Any]:
+            return {
+                "id": deck_id, "name": name, "desc": "", "conf": 1, "dyn": 0, "collapsed": False, "usn": -1,
+                "mod": self._now, "extendNew": 10, "extendRev": 50, "newToday": [0, 0], "revToday": [0, 0],
+                "lrnToday": [0, 0], "timeToday": [0, 0],
+            }
+
+        return {"1": deck(1, "Default"), str(self.deck_id): deck(self.deck_id, deck_name)}
+
+    def _dconf(self) -> dict[str, Any]:
+        return {"1": {
+            "id": 1, "name": "Default", "mod": 0, "usn": 0, "maxTaken": 60, "autoplay": True, "timer": 0,
+            "replayq": True, "dyn": False,
+            "new": {"delays": [1, 10], "ints": [1, 4, 7], "initialFactor": 2500, "order": 1, "perDay": 20,
+                    "bury": True, "separate": True},
+            "rev": {"perDay": 100, "ease4": 1.3, "fuzz": 0.05, "ivlFct": 1, "maxIvl": 36500, "minSpace": 1,
+                    "bury": True},
+            "lapse": {"delays": [10], "mult": 0, "minInt": 1, "leechFails": 8, "leechAction": 0},
+        }}
+
+
+def _field(value: str | None) -> str:
+    return html.escape(value or "").replace("\n", "<br>")
+
+
+def _epoch_ms(created_at: str | None) -> int:
+    try:
+        return int(datetime.fromisoformat(str(created_at).replace("Z", "+00:00")).timestamp() * 1000)
+    except ValueError:
+        return int(time.time() * 1000)
+
+
+def export_to_file(
+    path: str, fmt: str | None = None, since: str | None = None, cursor: str | None = None,
+    deck_name: str = DEFAULT_DECK,
+) -> dict[str, Any]:
+    """Write an export to `path` ("-" for stdout); the format defaults to the file extension."""
+    fmt = fmt or Path(path).suffix.lstrip(".").lower()
+    export = DeckExport(fmt, start_position(since, cursor), deck_name)
+    started = time.perf_counter()
+    if path == "-":
+        for chunk in export:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        # Written next to the target and renamed, so an interrupted export never leaves a truncated file
+        tmp_path = f"{path}.partial"
+        with open(tmp_path, "wb") as out:
+            for chunk in export:
+                out.write(chunk)
+        os.replace(tmp_path, path)
+    return {**export.report, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def main() -> None:
+    from app.db import init_db
+
+    parser = argparse.ArgumentParser(description="Export the flashcard history as an Anki package, CSV or ZIP.")
+    parser.add_argument("path", help='output file, or "-" for stdout (then --format is required)')
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    parser.add_argument("--since", help="only cards created at or after this ISO date/time")
+    parser.add_argument("--cursor", help="continue after this card (the cursor a previous export reported)")
+    parser.add_argument("--state", help="file holding the cursor: read before exporting, updated after success")
+    parser.add_argument("--deck", default=DEFAULT_DECK, help="Anki deck name")
+    args = parser.parse_args()
+    if args.path == "-" and not args.format:
+        parser.error("--format is required when writing to stdout")
+    if (args.format or Path(args.path).suffix.lstrip(".").lower()) not in FORMATS:
+        parser.error(f"cannot tell the format from {args.path!r}; pass --format")
+
+    cursor = args.cursor
+    if cursor is None and args.state and Path(args.state).is_file():
+        cursor = Path(args.state).read_text().strip() or None
+    init_db()
+    report = export_to_file(args.path, args.format, since=args.since, cursor=cursor, deck_name=args.deck)
+    if args.state and report["cursor"]:
+        Path(args.state).write_text(report["cursor"] + "\n")
+    print(json.dumps(report, indent=2), file=sys.stderr if args.path == "-" else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Concurrent, rate-limited delivery of one flashcard to every subscriber.
+
+Sends respect Telegram's bot-wide limit (TELEGRAM_GLOBAL_RATE msg/s) and a
+per-chat limit through token buckets shared by every fan-out in the process
+(one set per bot token). A 429 pauses the whole bot for `retry_after`
+seconds. Every recipient's outcome goes to the deliveries table in small
+batches, so a rerun after a crash skips chats that were already sent (at most
+one unflushed batch may be repeated).
+"""
+import asyncio
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from app.config import settings
+from app.image_pipeline import ImageBytes, load_image
+from app.ratelimit import KeyedTokenBuckets, TokenBucket
+from app.storage import get_async_storage, get_storage
+from app.telegram_client import TelegramDeliveryError, send_telegram_message_async
+from app.tracing import annotate, traced
+
+_LOG_FLUSH_ROWS = 100
+_PAGE_SIZE = 1000
+
+_telegram_buckets: dict[str, tuple[TokenBucket, KeyedTokenBuckets]] = {}
+_telegram_buckets_lock = threading.Lock()
+
+
+def get_telegram_buckets() -> tuple[TokenBucket, KeyedTokenBuckets]:
+    """The bot-wide and per-chat buckets for the configured bot token."""
+    with _telegram_buckets_lock:
+        buckets = _telegram_buckets.get(settings.telegram_bot_token)
+        if buckets is None:
+            buckets = _telegram_buckets[settings.telegram_bot_token] = (
+                TokenBucket(settings.telegram_global_rate), KeyedTokenBuckets(settings.telegram_per_chat_rate)
+            )
+        return buckets
+
+
+def add_subscriber(chat_id: str) -> None:
+    get_storage().upsert_subscriber(str(chat_id), active=True)
+
+
+def remove_subscriber(chat_id: str) -> None:
+    get_storage().upsert_subscriber(str(chat_id), active=False)
+
+
+def ensure_default_subscriber() -> None:
+    """TELEGRAM_CHAT_ID is always part of the audience when fan-out is on."""
+    if settings.telegram_chat_id:
+        add_subscriber(settings.telegram_chat_id)
+
+
+@traced("fan_out")
+async def fan_out_flashcard_async(
+    flashcard_id: int,
+    text: str,
+    image_path: str | Path | None = None,
+    concurrency: int | None = None,
+    sent_status: str | None = None,
+    image: ImageBytes | None = None,
+    chat_ids: list[str] | None = None,
+) -> dict[str, Any]:
+    """Send to every active subscriber, or only to `chat_ids` (e.g. one scheduled batch)."""
+    storage = get_async_storage()
+    if image is None and image_path:
+        # Read and hash once, not once per recipient
+        image = await asyncio.to_thread(load_image, image_path)
+    concurrency = concurrency or settings.fanout_concurrency
+    global_bucket, chat_buckets = get_telegram_buckets()
+    sent_status = sent_status or ("sent" if image else "sent_text_only")
+
+    already_sent = await storage.delivered_chat_ids(flashcard_id)
+    counts = {"sent": 0, "failed": 0, "blocked": 0, "retries_429": 0}
+    latencies: list[float] = []
+    log_rows: list[dict[str, Any]] = []
+
+    async def flush_log() -> None:
+        if log_rows:
+            batch = log_rows[:]
+            log_rows.clear()
+            await storage.record_deliveries(batch)
+
+    async def deliver(chat_id: str) -> None:
+        status, message_id, error = await _send_with_retries(
+            chat_id, text, image, flashcard_id, global_bucket, chat_buckets, counts, latencies
+        )
+        counts[status] += 1
+        log_rows.append({
+            "flashcard_id": flashcard_id,
+            "channel": "telegram",
+            "chat_id": chat_id,
+            "status": sent_status if status == "sent" else status,
+            "message_id": message_id,
+            "error": error,
+        })
+        if status == "blocked":
+            await storage.upsert_subscriber(chat_id, active=False)
+        if len(log_rows) >= _LOG_FLUSH_ROWS:
+            await flush_log()
+
+    started = time.perf_counter()
+    pending = _pending_chats(already_sent, chat_ids)
+
+    # Upload the image once; every later send reuses Telegram's file_id
+    first = await anext(pending, None)
+    if first is not None:
+        await deliver(first)
+
+        queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=concurrency * 4)
+
+        async def worker() -> None:
+            while (chat_id := await queue.get()) is not None:
+                await deliver(chat_id)
+
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            async for chat_id in pending:
+                await queue.put(chat_id)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await flush_log()
+
+    duration = time.perf_counter() - started
+    attempted = counts["sent"] + counts["failed"] + counts["blocked"]
+    report = {
+        "flashcard_id": flashcard_id,
+        "recipients": attempted,
+        "skipped_already_delivered": len(already_sent),
+        **counts,
+        "duration_s": round(duration, 3),
+        "throughput_per_s": round(attempted / duration, 2) if duration > 0 else None,
+        "latency_ms": {
+            f"p{p}": round(_percentile(latencies, p) * 1000, 1) if latencies else None for p in (50, 95, 99)
+        },
+    }
+    annotate(recipients=attempted, sent=counts["sent"], failed=counts["failed"])
+    print(f"Fan-out for flashcard {flashcard_id}: {report}")
+    return report
+
+
+async def _pending_chats(skip: set[str], chat_ids: list[str] | None = None) -> AsyncIterator[str]:
+    if chat_ids is not None:
+        for chat_id in chat_ids:
+            if chat_id not in skip:
+                yield chat_id
+        return
+    storage = get_async_storage()
+    after = None
+    while True:
+        page = await storage.list_subscribers(after=after, limit=_PAGE_SIZE)
+        for chat_id in page:
+            if chat_id not in skip:
+                yield chat_id
+        if len(page) < _PAGE_SIZE:
+            return
+        after = page[-1]
+
+
+async def _send_with_retries(
+    chat_id: str,
+    text: str,
+    image: ImageBytes | None,
+    flashcard_id: int,
+    global_bucket: TokenBucket,
+    chat_buckets: KeyedTokenBuckets,
+    counts: dict[str, int],
+    latencies: list[float],
+) -> tuple[str, str | None, str | None]:
+    """Returns (status, message_id, error) where status is sent, failed or blocked."""
+    import httpx
+
+    error = None
+    for attempt in range(settings.fanout_max_attempts):
+        await chat_buckets.acquire(chat_id)
+        await global_bucket.acquire()
+        started = time.perf_counter()
+        try:
+            response = await send_telegram_message_async(
+                text, image=image, flashcard_id=flashcard_id, chat_id=chat_id
+            )
+            latencies.append(time.perf_counter() - started)
+            message_id = (response.get("result") or {}).get("message_id")
+            return "sent", str(message_id) if message_id is not None else None, None
+        except TelegramDeliveryError as e:
+            error = str(e)
+            if e.status_code == 429:
+                # Flood control is bot-wide: hold every sender, then retry this chat
+                counts["retries_429"] += 1
+                global_bucket.pause(e.retry_after or 1.0)
+                continue
+            if e.status_code == 403:
+                return "blocked", None, error
+            if e.status_code is not None and 400 <= e.status_code < 500:
+                return "failed", None, error
+        except httpx.HTTPError as e:
+            error = str(e)
+        await asyncio.sleep(min(2 ** attempt, 30))
+    return "failed", None, error
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
@@ -1,14 +1,23 @@
+import asyncio
 import base64
 import json
+import threading
+import time
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any
-
-from openai import OpenAI
+from typing import Any, Iterator
 
+from app.clients import get_async_http, get_async_openai, run_sync
 from app.config import settings
-from app.db import get_supabase
-from app.telegram_client import send_telegram_message
+from app.content_cache import get_cached_content, prompt_version, put_cached_content, warm_content_cache
+from app.image_pipeline import ImageBytes, load_image, process_image
+from app.image_router import route
+from app.image_store import get_image_store, image_key
+from app.ratelimit import TokenBucket
+from app.storage import get_async_storage, get_storage
+from app.fanout import fan_out_flashcard_async
+from app.telegram_client import TelegramDeliveryError, send_telegram_message_async
+from app.tracing import count, span, traced
 
 
 def seed_beginner_terms_if_empty() -> None:
@@ -16,88 +25,128 @@ def seed_beginner_terms_if_empty() -> None:
     if not terms_path.exists():
         return
 
-    if not settings.supabase_url or not settings.supabase_key:
-        print("⚠️ Supabase credentials not found. Skipping seeding.")
-        return
-
+    storage = get_storage()
     try:
-        supabase = get_supabase()
         # Check if any source_terms exist
-        response = supabase.table("source_terms").select("id", count="exact").limit(1).execute()
-        if response.count is not None and response.count > 0:
+        if storage.count_source_terms() > 0:
             return
     except Exception as e:
-        print(f"⚠️ Supabase check failed (maybe table doesn't exist yet?): {e}")
+        print(f"⚠️ Storage check failed (maybe table doesn't exist yet?): {e}")
         # If it's a real connection error, we stop here
         if "apikey" in str(e).lower() or "url" in str(e).lower():
              return
 
-    terms = json.loads(terms_path.read_text(encoding="utf-8"))
-    data_to_insert = [
-        {
-            "italian_text": term["italian_text"],
-            "category": term.get("category", "general"),
-            "difficulty": "beginner",
-            "used": False
-        }
-        for term in terms
-    ]
-    if data_to_insert:
-        try:
-            supabase.table("source_terms").insert(data_to_insert).execute()
-            print(f"Seeded {len(data_to_insert)} terms to Supabase.")
-        except Exception as e:
-            print(f"Error seeding terms: {e}")
+    from app.importer import import_terms
+
+    try:
+        report = import_terms(terms_path, difficulty="beginner")
+        print(f"Seeded {report['new']} terms to {storage.name}.")
+    except Exception as e:
+        print(f"Error seeding terms: {e}")
+
+
+def claim_next_terms(count: int = 1, difficulty: str = "beginner") -> list[str]:
+    """Atomically claim `count` terms.
+
+    TERM_SELECTION=weighted (default) draws from the in-memory index in
+    app.term_selector and records the picks with one conditional UPDATE.
+    TERM_SELECTION=sequential claims the lowest unused ids, recycling the deck
+    when it runs out, in one round trip: the `claim_next_terms` Postgres
+    function on Supabase (supabase/migrations/0001_claim_next_terms.sql) or
+    UPDATE ... RETURNING on SQLite.
+    """
+    storage = get_storage()
+    if settings.term_selection == "weighted":
+        from app.term_selector import pick_terms as claim
+    else:
+        claim = storage.claim_terms
+    with span("term_claim", backend=storage.name, selection=settings.term_selection):
+        rows = claim(difficulty, count)
+        if not rows:
+            # Serverless cold starts skip seeding; do it the first time the deck is needed
+            seed_beginner_terms_if_empty()
+            rows = claim(difficulty, count)
+    if not rows:
+        raise ValueError(f"No {difficulty} terms found in source_terms table.")
+    return [row["italian_text"] for row in rows]
+
+
+def peek_next_terms(count: int = 1, difficulty: str = "beginner") -> list[str]:
+    """Terms `claim_next_terms` would hand out next, without claiming them.
+
+    Weighted selection returns a sample drawn from the index. Sequential
+    selection returns the lowest unused ids, then the start of the recycled deck.
+    """
+    if settings.term_selection == "weighted":
+        from app.term_selector import peek_terms
+
+        return peek_terms(difficulty, count)
+    storage = get_storage()
+    unused: list[str] = []
+    recycled: list[str] = []
+    after = None
+    while len(unused) < count:
+        page = storage.list_source_terms(difficulty, after, 500)
+        for row in page:
+            if not row.get("used"):
+                unused.append(row["italian_text"])
+            elif len(recycled) < count:
+                recycled.append(row["italian_text"])
+        if len(page) < 500:
+            break
+        after = page[-1]["id"]
+    return (unused + recycled)[:count]
+
+
+async def claim_next_terms_async(count: int = 1, difficulty: str = "beginner") -> list[str]:
+    return await asyncio.to_thread(claim_next_terms, count, difficulty)
 
 
 def get_next_beginner_term() -> str:
-    supabase = get_supabase()
-    
-    # Find one unused term
-    response = supabase.table("source_terms") \
-        .select("id, italian_text") \
-        .eq("difficulty", "beginner") \
-        .eq("used", False) \
-        .order("id") \
-        .limit(1) \
-        .execute()
-    
-    row = response.data[0] if response.data else None
-
-    if row:
-        supabase.table("source_terms") \
-            .update({"used": True, "used_at": _utc_now_iso()}) \
-            .eq("id", row["id"]) \
-            .execute()
-        return row["italian_text"]
-
-    # Recycle if none left
-    print("No unused beginner terms left. Recycling...")
-    supabase.table("source_terms") \
-        .update({"used": False, "used_at": None}) \
-        .eq("difficulty", "beginner") \
-        .execute()
-        
-    response = supabase.table("source_terms") \
-        .select("id, italian_text") \
-        .eq("difficulty", "beginner") \
-        .order("id") \
-        .limit(1) \
-        .execute()
-    
-    recycled = response.data[0] if response.data else None
-
-    if not recycled:
-        raise ValueError("No beginner terms found in source_terms table.")
-
-    supabase.table("source_terms") \
-        .update({"used": True, "used_at": _utc_now_iso()}) \
-        .eq("id", recycled["id"]) \
-        .execute()
-    return recycled["italian_text"]
+    return claim_next_terms(1, "beginner")[0]
+
+
+CONTENT_MODEL = "gpt-4o-mini"
+CONTENT_SYSTEM_PROMPT = "Return only valid JSON."
+CONTENT_PROMPT_TEMPLATE = (
+    "You are helping beginners learn Italian. "
+    "Return strict JSON with keys: italian_text, phonetic, english_translation, example_sentence. "
+    "The example_sentence should be a simple beginner-friendly sentence using the term. "
+    "Use this Italian word/phrase: {term}."
+)
+CONTENT_PROMPT_VERSION = prompt_version(CONTENT_SYSTEM_PROMPT, CONTENT_PROMPT_TEMPLATE)
+# Rough token budget: ~4 characters per prompt token, ~120 output tokens per term
+CONTENT_OUTPUT_TOKENS = 120
+
+# (requests, tokens) buckets for OPENAI_RPM / OPENAI_TPM, shared by every content call in the process
+_openai_buckets: tuple[TokenBucket, TokenBucket] | None = None
+_openai_buckets_lock = threading.Lock()
+
+
+def get_openai_buckets() -> tuple[TokenBucket, TokenBucket]:
+    global _openai_buckets
+    with _openai_buckets_lock:
+        if _openai_buckets is None:
+            _openai_buckets = (
+                TokenBucket(settings.openai_rpm / 60),
+                TokenBucket(settings.openai_tpm / 60, capacity=settings.openai_tpm / 6),
+            )
+        return _openai_buckets
+
+
+async def acquire_openai_capacity(tokens: float) -> None:
+    """Wait until one request of about `tokens` tokens fits within OPENAI_RPM and OPENAI_TPM."""
+    request_bucket, token_bucket = get_openai_buckets()
+    # A request larger than the bucket would wait forever; charge at most a full bucket
+    await token_bucket.acquire(min(token_bucket.capacity, tokens))
+    await request_bucket.acquire()
 
 
 def build_linguistic_content(term: str) -> dict[str, str]:
+    return run_sync(build_linguistic_content_async(term))
+
+
+async def build_linguistic_content_async(term: str) -> dict[str, str]:
     if not settings.openai_api_key:
         return {
             "italian_text": term,
@@ -106,38 +155,52 @@ def build_linguistic_content(term: str) -> dict[str, str]:
             "example_sentence": "Example sentence unavailable."
         }
 
-    prompt = (
-        "You are helping beginners learn Italian. "
-        "Return strict JSON with keys: italian_text, phonetic, english_translation, example_sentence. "
-        "The example_sentence should be a simple beginner-friendly sentence using the term. "
-        f"Use this Italian word/phrase: {term}."
-    )
-    client = OpenAI(
-        api_key=settings.openai_api_key,
-        timeout=8.0,
-        max_retries=0
-    )
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "Return only valid JSON."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.3,
-    )
+    cached = await asyncio.to_thread(get_cached_content, term, CONTENT_MODEL, CONTENT_PROMPT_VERSION)
+    if cached is not None:
+        print(f"Content cache hit for '{term}'.")
+        count("flashcard_content_cache_total", result="hit")
+        return cached
+    count("flashcard_content_cache_total", result="miss")
+
+    import openai
+
+    prompt = CONTENT_PROMPT_TEMPLATE.format(term=term)
+    await acquire_openai_capacity(len(prompt) / 4 + CONTENT_OUTPUT_TOKENS)
+    client = get_async_openai().with_options(timeout=settings.openai_text_timeout)
+    with span("llm_call", model=CONTENT_MODEL):
+        try:
+            response = await client.chat.completions.create(
+                model=CONTENT_MODEL,
+                messages=[
+                    {"role": "system", "content": CONTENT_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=0.3,
+            )
+        except openai.RateLimitError as e:
+            retry_after = e.response.headers.get("retry-after")
+            get_openai_buckets()[0].pause(float(retry_after) if retry_after else 2.0)
+            raise
     content = response.choices[0].message.content or "{}"
     parsed: dict[str, Any] = json.loads(content)
 
-    return {
+    result = {
         "italian_text": parsed.get("italian_text", term),
         "phonetic": parsed.get("phonetic", "N/A"),
         "english_translation": parsed.get("english_translation", "N/A"),
         "example_sentence": parsed.get("example_sentence", "N/A"),
     }
+    await asyncio.to_thread(put_cached_content, term, CONTENT_MODEL, CONTENT_PROMPT_VERSION, result)
+    return result
+
+
+def warm_linguistic_content_cache(limit: int = 1000) -> int:
+    """Populate the content cache from the flashcards table for the current model and prompt."""
+    return warm_content_cache(CONTENT_MODEL, CONTENT_PROMPT_VERSION, limit=limit)
 
 
-def generate_image_for_term(term: str, phonetic: str = "", translation: str = "") -> tuple[str | None, str | None, str, str]:
-    """Generate image using guided prompt from imagePrompt.txt combined with term details."""
+def build_image_prompt(term: str, phonetic: str = "", translation: str = "") -> str:
+    """Guided prompt from imagePrompt.txt combined with term details."""
     prompt_path = Path(settings.image_prompt_file)
     if prompt_path.exists():
         base_prompt = prompt_path.read_text(encoding="utf-8").strip()
@@ -146,8 +209,8 @@ def generate_image_for_term(term: str, phonetic: str = "", translation: str = ""
             "Create a clean, friendly educational illustration suitable for a language flashcard. "
             "No text in image."
         )
-    
-    prompt = (
+
+    return (
         f"### DESIGN SYSTEM & LAYOUT INSTRUCTIONS:\n{base_prompt}\n\n"
         f"### TEXT CONTENT TO RENDER IN THE GRAPHIC (CRITICAL):\n"
         f"- Italian Phrase: {term}\n"
@@ -159,83 +222,178 @@ def generate_image_for_term(term: str, phonetic: str = "", translation: str = ""
         f"- Render all text elements clearly as specified in the layout instructions."
     )
 
+
+def generate_image_for_term(term: str, phonetic: str = "", translation: str = "") -> tuple[str | None, ImageBytes | None, str, str]:
+    return run_sync(generate_image_for_term_async(term, phonetic, translation))
+
+
+async def generate_image_for_term_async(
+    term: str, phonetic: str = "", translation: str = "", persist: bool | None = None
+) -> tuple[str | None, ImageBytes | None, str, str]:
+    """Generate image using guided prompt from imagePrompt.txt combined with term details.
+
+    The image stays in memory, re-encoded for upload (see app.image_pipeline).
+    It is written to the image store only with `persist` (default IMAGE_STORE_ENABLED).
+    """
+    persist = settings.image_store_enabled if persist is None else persist
+    prompt = await asyncio.to_thread(build_image_prompt, term, phonetic, translation)
+
+    models = [settings.image_model, settings.image_fallback_model]
+    if persist:
+        for candidate in dict.fromkeys(models):
+            cached_path = await asyncio.to_thread(_lookup_stored_image, prompt, candidate)
+            if cached_path:
+                print(f"Image store hit for '{term}' ({candidate}).")
+                count("flashcard_image_store_total", result="hit")
+                return None, await asyncio.to_thread(load_image, cached_path), prompt, candidate
+        count("flashcard_image_store_total", result="miss")
+
     if not settings.openai_api_key:
         return None, None, prompt, "none"
 
-    client = OpenAI(
-        api_key=settings.openai_api_key,
-        timeout=120.0,
-        max_retries=0
-    )
-    
-    model_used = settings.image_model
-    try:
-        print(f"Attempting image generation with model: {model_used}")
-        result = client.images.generate(
-            model=model_used,
-            prompt=prompt,
-            size=settings.image_size
-        )
-    except Exception as e:
-        error_msg = f"Error with model {model_used}: {e}. Falling back to dall-e-3."
-        print(error_msg)
+    client = get_async_openai().with_options(timeout=settings.openai_image_timeout)
+
+    async def request(model: str) -> bytes:
+        print(f"Attempting image generation with model: {model}")
+        with span("image_request", model=model):
+            result = await client.images.generate(
+                model=model,
+                prompt=prompt,
+                size=settings.image_size,
+                # gpt-image models always return base64 and reject response_format
+                **({"response_format": "b64_json"} if model.startswith("dall-e") else {}),
+            )
+            if result.data and result.data[0].b64_json:
+                return base64.b64decode(result.data[0].b64_json)
+            if result.data and result.data[0].url:
+                img_response = await get_async_http().get(result.data[0].url)
+                img_response.raise_for_status()
+                return img_response.content
+        raise ValueError(f"{model} returned no image data")
+
+    async def alert(model: str, error: Exception) -> None:
+        # Once per breaker opening, not once per card
         try:
-            send_telegram_message(f"⚠️ Image generation fallback:\n`{error_msg}`")
-        except:
+            await send_telegram_message_async(
+                f"⚠️ Image model {model} is failing, routing around it for "
+                f"{settings.image_breaker_cooldown_seconds:g}s:\n`{error}`"
+            )
+        except Exception:
             pass
-            
-        model_used = "dall-e-3"
-        result = client.images.generate(
-            model=model_used,
-            prompt=prompt,
-            size=settings.image_size,
-            response_format="b64_json"
+
+    with span("image_generation", model=settings.image_model, fallback=False) as image_span:
+        model_used, img_data = await route(
+            models, request, hedge_after=settings.image_hedge_after_seconds or None, on_open=alert, term=term
+        )
+        image_span.set(model=model_used, fallback=model_used != settings.image_model)
+
+    with span("image_processing", bytes_in=len(img_data)) as processing_span:
+        image = await asyncio.to_thread(process_image, img_data)
+        processing_span.set(bytes_out=len(image.data), mime=image.mime)
+    if persist:
+        file_path = await asyncio.to_thread(
+            get_image_store().put, image_key(prompt, model_used, settings.image_size), image.data
         )
+        image = ImageBytes(image.data, image.mime, path=str(file_path))
+
+    return None, image, prompt, model_used
+
 
-    img_data = None
-    if result.data:
-        if hasattr(result.data[0], 'b64_json') and result.data[0].b64_json:
-            img_data = base64.b64decode(result.data[0].b64_json)
-        elif hasattr(result.data[0], 'url') and result.data[0].url:
-            import requests
-            img_response = requests.get(result.data[0].url, timeout=30)
-            if img_response.status_code == 200:
-                img_data = img_response.content
+def _lookup_stored_image(prompt: str, model: str) -> str | None:
+    """Disk hit first, then an image recorded on an earlier flashcard with the same key."""
+    key = image_key(prompt, model, settings.image_size)
+    store = get_image_store()
+    path = store.get(key)
+    if path:
+        return str(path)
+    try:
+        image_url = get_storage().find_image_url(key)
+        if image_url:
+            path = store.reload(key, image_url)
+    except Exception as e:
+        print(f"⚠️ Could not reload stored image {key[:12]}: {e}")
+    return str(path) if path else None
+
+
+# flashcard_id -> (image generation started during Phase 1, when); see prefetch_image
+_prefetched_images: dict[int, tuple[asyncio.Task, float]] = {}
+# Phase 2 normally follows within seconds; an older prefetch was taken over by
+# another process (app.worker) or never will be
+_PREFETCH_TTL_SECONDS = 600
+
+
+def _remember_prefetched_image(flashcard_id: int, task: asyncio.Task) -> None:
+    now = time.monotonic()
+    for stale_id, (stale, started) in list(_prefetched_images.items()):
+        if now - started > _PREFETCH_TTL_SECONDS:
+            _prefetched_images.pop(stale_id, None)
+            _cancel_task(stale)
+    _prefetched_images[flashcard_id] = (task, now)
 
-    if not img_data:
-        return None, None, prompt, model_used
 
-    output_dir = Path(settings.images_dir)
-    output_dir.mkdir(exist_ok=True, parents=True)
-    filename = f"{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}_{_slugify(term)}.png"
-    file_path = output_dir / filename
-    file_path.write_bytes(img_data)
+def _take_prefetched_image(flashcard_id: int) -> asyncio.Task | None:
+    """The Phase 1 image task for this card, if it can be awaited on the running loop."""
+    task, _ = _prefetched_images.pop(flashcard_id, (None, 0.0))
+    if task is None or task.get_loop() is asyncio.get_running_loop():
+        return task
+    # Started on another event loop (e.g. Phase 1 ran through run_sync): render here instead
+    _cancel_task(task)
+    return None
 
-    return None, str(file_path), prompt, model_used
+
+def _cancel_task(task: asyncio.Task) -> None:
+    """Cancel `task` from any thread (a no-op once it is done)."""
+    loop = task.get_loop()
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(task.cancel)
 
 
 def create_and_send_daily_flashcard() -> dict[str, Any]:
     """Generates linguistic content and saves to DB."""
+    return run_sync(create_and_send_daily_flashcard_async())
+
+
+@traced("phase1_text")
+async def create_and_send_daily_flashcard_async(prefetch_image: bool = False) -> dict[str, Any]:
+    """Phase 1: claim a term, build its content and save it.
+
+    With `prefetch_image`, image generation starts alongside the DB insert and
+    is picked up by `background_image_task_async` for the same flashcard, so
+    Phase 2 does not start from zero. Only pass it when Phase 2 will follow.
+    """
     print("--- Phase 1: Text Generation (Fast) ---")
-    term = get_next_beginner_term()
-    content = build_linguistic_content(term)
-    
+    term = (await claim_next_terms_async(1, "beginner"))[0]
+    content = await build_linguistic_content_async(term)
+
     print(f"Linguistic content for '{term}' prepared.")
 
-    # Supabase insert
-    supabase = get_supabase()
-    response = supabase.table("flashcards").insert({
-        "italian_text": content["italian_text"],
-        "phonetic": content["phonetic"],
-        "english_translation": content["english_translation"],
-        "example_sentence": content["example_sentence"],
-        "difficulty": "beginner",
-        "sent_channel": "telegram",
-        "sent_at": _utc_now_iso(),
-        "created_at": _utc_now_iso(),
-    }).execute()
-    
-    flashcard_id = response.data[0]["id"] if response.data else 0
+    image_task = None
+    if prefetch_image:
+        image_task = asyncio.create_task(generate_image_for_term_async(
+            content["italian_text"], content["phonetic"], content["english_translation"]
+        ))
+
+    try:
+        storage = get_async_storage()
+        with span("db_insert", backend=storage.name):
+            stored = await storage.insert_flashcard({
+                "italian_text": content["italian_text"],
+                "phonetic": content["phonetic"],
+                "english_translation": content["english_translation"],
+                "example_sentence": content["example_sentence"],
+                "difficulty": "beginner",
+                "sent_channel": "telegram",
+                "sent_at": _utc_now_iso(),
+                "created_at": _utc_now_iso(),
+            })
+    except BaseException:
+        if image_task:
+            image_task.cancel()
+        raise
+
+    flashcard_id = stored.get("id", 0)
+    if image_task:
+        _remember_prefetched_image(flashcard_id, image_task)
 
     print("Phase 1 Complete.")
     return {
@@ -248,59 +406,180 @@ def create_and_send_daily_flashcard() -> dict[str, Any]:
     }
 
 
+def build_caption(term: str, phonetic: str, translation: str, example_sentence: str) -> str:
+    return (
+        f"🇮🇹 Daily Italian Flashcard\n\n"
+        f"🟩 Italian: {term}\n"
+        f"🔊 Pronunciation: {phonetic}\n"
+        f"🇬🇧 English: {translation}\n\n"
+        f"📝 Example:\n_{example_sentence}_"
+    )
+
+
 def background_image_task(term: str, flashcard_id: int, phonetic: str = "", translation: str = "", example_sentence: str = ""):
     """Heavy lifting for image generation. Sends ONE consolidated message with the image + text."""
+    return run_sync(background_image_task_async(term, flashcard_id, phonetic, translation, example_sentence))
+
+
+@traced("phase2_image")
+async def background_image_task_async(
+    term: str,
+    flashcard_id: int,
+    phonetic: str = "",
+    translation: str = "",
+    example_sentence: str = "",
+    fallback: bool = True,
+):
+    """Phase 2: finish the image and deliver the card.
+
+    With `fallback=False` (a job attempt that will be retried) failures raise
+    instead of degrading to a text-only message.
+    """
     print(f"--- Phase 2: Image Generation Task for '{term}' ---")
+    storage = get_async_storage()
+    image_task = _take_prefetched_image(flashcard_id)
     try:
-        image_url, image_path, image_prompt, model_used = generate_image_for_term(term, phonetic, translation)
-        
-        caption = (
-            f"🇮🇹 Daily Italian Flashcard\n\n"
-            f"🟩 Italian: {term}\n"
-            f"🔊 Pronunciation: {phonetic}\n"
-            f"🇬🇧 English: {translation}\n\n"
-            f"📝 Example:\n_{example_sentence}_"
-        )
+        if image_task is None:
+            image_task = generate_image_for_term_async(term, phonetic, translation)
+        image_url, image, image_prompt, model_used = await image_task
+
+        caption = build_caption(term, phonetic, translation, example_sentence)
 
-        if image_path:
+        if image:
             print(f"Sending consolidated message to Telegram (Model: {model_used})")
-            send_telegram_message(
-                caption,
-                image_path=image_path
+            fields = {
+                "image_key": image_key(image_prompt, model_used, settings.image_size),
+                "prompt_used": f"[{model_used}] {image_prompt}",
+            }
+            if image.path:
+                fields["image_url"] = image.path
+            # Independent work: delivery (and its log) and the flashcard's image fields
+            await asyncio.gather(
+                deliver_flashcard_async(flashcard_id, caption, image=image),
+                storage.update_flashcard(flashcard_id, fields),
             )
-            
-            # Update Supabase
-            supabase = get_supabase()
-            supabase.table("flashcards") \
-                .update({"image_url": image_path, "prompt_used": f"[{model_used}] {image_prompt}"}) \
-                .eq("id", flashcard_id) \
-                .execute()
             print("Phase 2 Complete.")
         else:
+            if not fallback:
+                raise RuntimeError(f"Image generation failed for '{term}'")
             print("Image generation failed. Sending text-only fallback.")
-            send_telegram_message(caption)
+            await deliver_flashcard_async(flashcard_id, caption, status="sent_text_only")
     except Exception as e:
         print(f"Background image task failed: {e}")
+        if not fallback:
+            raise
         try:
             fallback_text = f"🇮🇹 Daily Italian Flashcard\n\nItalian: {term}\nEnglish: {translation}"
-            send_telegram_message(fallback_text)
+            await deliver_flashcard_async(flashcard_id, fallback_text, status="sent_fallback", error=str(e))
         except:
-            pass
+            await record_delivery_async(flashcard_id, "failed", None, error=str(e))
+            # Nothing reached the user; let the job queue dead-letter it
+            raise
+
+
+async def deliver_flashcard_async(
+    flashcard_id: int,
+    text: str,
+    image_path: str | None = None,
+    status: str = "sent",
+    error: str | None = None,
+    image: ImageBytes | None = None,
+) -> dict[str, Any]:
+    """Send to TELEGRAM_CHAT_ID, or to every subscriber when FANOUT_ENABLED=1, and log it."""
+    if settings.fanout_enabled:
+        report = await fan_out_flashcard_async(
+            flashcard_id, text, image_path=image_path, sent_status=status, image=image
+        )
+        if report["recipients"] and not report["sent"]:
+            raise TelegramDeliveryError(f"Fan-out reached none of {report['recipients']} subscribers")
+        return report
+    sent = await send_telegram_message_async(text, image_path=image_path, flashcard_id=flashcard_id, image=image)
+    await record_delivery_async(flashcard_id, status, sent, error=error)
+    return sent
 
 
 def list_flashcards(limit: int = 100) -> list[dict[str, Any]]:
-    supabase = get_supabase()
-    response = supabase.table("flashcards") \
-        .select("*") \
-        .order("created_at", descending=True) \
-        .limit(limit) \
-        .execute()
-    return response.data if response.data else []
+    return get_storage().list_flashcards(limit=limit)
 
 
-def _utc_now_iso() -> str:
-    return datetime.now(timezone.utc).isoformat()
+# Columns a client may ask for with ?fields=; prompt_used and caption are the heavy ones
+FLASHCARD_FIELDS = (
+    "id", "italian_text", "phonetic", "english_translation", "example_sentence", "difficulty", "status",
+    "image_url", "image_key", "prompt_used", "caption", "sent_channel", "sent_at", "created_at",
+)
+DEFAULT_LIST_FIELDS = (
+    "id", "italian_text", "phonetic", "english_translation", "example_sentence", "status", "sent_at", "created_at",
+)
+
+
+def parse_fields(fields: str | None) -> list[str] | None:
+    """`?fields=` value to a column list; None (every column) for "*", the light default when omitted."""
+    if fields is None:
+        return list(DEFAULT_LIST_FIELDS)
+    if fields.strip() == "*":
+        return None
+    columns = [column.strip() for column in fields.split(",") if column.strip()]
+    unknown = [column for column in columns if column not in FLASHCARD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(FLASHCARD_FIELDS)}")
+    return columns
 
 
-def _slugify(value: str) -> str:
-    return "".join(ch.lower() if ch.isalnum() else "_" for ch in value).strip("_")[:40]
+def encode_cursor(row: dict[str, Any]) -> str:
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        created_at, flashcard_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), int(flashcard_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def list_flashcards_page(
+    limit: int = 100, before: tuple[str, int] | None = None, columns: list[str] | None = None
+) -> dict[str, Any]:
+    """One page, newest first, plus the cursor for the next one (None on the last page)."""
+    rows = get_storage().list_flashcards(limit=limit, before=before, columns=columns)
+    return {"items": rows, "next_cursor": encode_cursor(rows[-1]) if len(rows) == limit else None}
+
+
+def iter_flashcards(
+    limit: int | None = None, before: tuple[str, int] | None = None, columns: list[str] | None = None,
+    page_size: int = 500,
+) -> Iterator[dict[str, Any]]:
+    """Every (or the first `limit`) flashcard, newest first, read page by page."""
+    storage = get_storage()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = page_size if remaining is None else min(page_size, remaining)
+        page = storage.list_flashcards(limit=size, before=before, columns=columns)
+        yield from page
+        if len(page) < size:
+            return
+        before = (page[-1]["created_at"], page[-1]["id"])
+        if remaining is not None:
+            remaining -= len(page)
+
+
+def record_delivery(flashcard_id: int, status: str, response: dict | None, error: str | None = None) -> None:
+    """Best-effort delivery log; a storage hiccup must never fail a send that already happened."""
+    message_id = None
+    if response and isinstance(response.get("result"), dict):
+        message_id = str(response["result"].get("message_id", "")) or None
+    try:
+        get_storage().record_delivery(
+            flashcard_id, "telegram", settings.telegram_chat_id, status, message_id=message_id, error=error
+        )
+    except Exception as e:
+        print(f"⚠️ Could not record delivery for flashcard {flashcard_id}: {e}")
+
+
+async def record_delivery_async(flashcard_id: int, status: str, response: dict | None, error: str | None = None) -> None:
+    await asyncio.to_thread(record_delivery, flashcard_id, status, response, error)
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,119 @@
+"""In-memory image processing between generation and upload.
+
+A generated image stays in one bytes buffer from base64 decode to the
+multipart upload; disk is only touched when the image store is enabled.
+With Pillow installed, images are downscaled to IMAGE_MAX_SIDE and re-encoded
+as IMAGE_UPLOAD_FORMAT (jpeg or webp), stepping quality down until they fit
+IMAGE_MAX_KB. Without Pillow, or with IMAGE_UPLOAD_FORMAT=png, the original
+bytes are sent unchanged.
+"""
+import hashlib
+import io
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from app.config import settings
+
+MIME_TYPES = {"png": "image/png", "jpeg": "image/jpeg", "webp": "image/webp"}
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp"}
+_MIN_QUALITY = 40
+
+_stats = {"processed": 0, "passthrough": 0, "bytes_in": 0, "bytes_out": 0}
+_warned_no_pillow = False
+
+
+@dataclass(frozen=True)
+class ImageBytes:
+    """Encoded image plus what the uploader needs; `path` is set once it is on disk."""
+
+    data: bytes
+    mime: str = "image/png"
+    path: str | None = None
+    sha256: str = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # Computed once: fan-out reuses it for every recipient's file_id lookup
+        object.__setattr__(self, "sha256", hashlib.sha256(self.data).hexdigest())
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS.get(self.mime, "bin")
+
+    @property
+    def filename(self) -> str:
+        return f"flashcard.{self.extension}"
+
+
+def sniff_mime(data: bytes) -> str:
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+def load_image(path: str | Path) -> ImageBytes:
+    data = Path(path).read_bytes()
+    return ImageBytes(data, sniff_mime(data), path=str(path))
+
+
+def process_image(data: bytes) -> ImageBytes:
+    """Downscale and re-encode for upload. Returns the original if that is already smaller."""
+    global _warned_no_pillow
+    original = ImageBytes(data, sniff_mime(data))
+    target = settings.image_upload_format
+    _stats["bytes_in"] += len(data)
+    if target not in MIME_TYPES or (target == "png" and original.mime == "image/png" and not settings.image_max_side):
+        return _passthrough(original)
+
+    try:
+        from PIL import Image
+    except ImportError:
+        if not _warned_no_pillow:
+            print("⚠️ Pillow is not installed; uploading images without re-encoding.")
+            _warned_no_pillow = True
+        return _passthrough(original)
+
+    try:
+        buffer = _encode(Image, data, target)
+    except Exception as e:
+        # A decoder problem must not cost us the image; send what the model returned
+        print(f"⚠️ Image re-encoding failed ({e}); uploading the original.")
+        return _passthrough(original)
+
+    if buffer.tell() >= len(data):
+        return _passthrough(original)
+    _stats["processed"] += 1
+    _stats["bytes_out"] += buffer.tell()
+    return ImageBytes(buffer.getvalue(), MIME_TYPES[target])
+
+
+def _encode(Image, data: bytes, target: str) -> io.BytesIO:
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        if settings.image_max_side and max(img.size) > settings.image_max_side:
+            img.thumbnail((settings.image_max_side, settings.image_max_side), Image.Resampling.LANCZOS)
+        if target == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        quality = settings.image_quality
+        budget = settings.image_max_kb * 1024
+        while True:
+            buffer.seek(0)
+            buffer.truncate()
+            img.save(buffer, format=target.upper(), quality=quality, optimize=True)
+            if not budget or buffer.tell() <= budget or quality <= _MIN_QUALITY or target == "png":
+                return buffer
+            quality = max(_MIN_QUALITY, quality - 10)
+
+
+def _passthrough(image: ImageBytes) -> ImageBytes:
+    _stats["passthrough"] += 1
+    _stats["bytes_out"] += len(image.data)
+    return image
+
+
+def image_pipeline_stats() -> dict[str, int]:
+    return dict(_stats)
@@ -0,0 +1,238 @@
+"""Circuit breakers and hedged requests across image models.
+
+Every image model has a breaker over its last IMAGE_BREAKER_WINDOW calls. Once
+IMAGE_BREAKER_MIN_CALLS have run and IMAGE_BREAKER_FAILURE_RATE of them failed,
+the breaker opens and the model is skipped for IMAGE_BREAKER_COOLDOWN_SECONDS.
+Then a single trial call is let through (half-open): success closes the
+breaker, failure opens it again. Only outages count as failures (transport
+errors, timeouts, 429 and 5xx); a rejected request (other 4xx, e.g. a content
+policy refusal) is raised at once without touching the breaker.
+
+`route` tries the models in order, skipping open ones. With
+IMAGE_HEDGE_AFTER_SECONDS set, a call that has not finished by then gets a
+second request to the next model, and the first image back wins. Breaker
+states, latency percentiles and the last routing decisions are served at
+/images/routing.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, TypeVar
+
+from app.config import settings
+from app.tracing import count
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+T = TypeVar("T")
+
+
+class CircuitBreaker:
+    """Rolling failure and latency stats for one model, with closed/open/half-open states."""
+
+    def __init__(self, name: str, window: int, failure_rate: float, min_calls: int, cooldown: float) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.times_opened = 0
+        self._calls: deque[tuple[bool, float]] = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to this model now; in half-open state only one trial at a time."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a trial slot for a call that was cancelled before it finished."""
+        with self._lock:
+            self._trial_running = False
+
+    def record(self, ok: bool, latency: float) -> bool:
+        """Record one call's outcome; returns True when it opened the breaker."""
+        with self._lock:
+            self._trial_running = False
+            if ok and self.state != CLOSED:
+                self.state = CLOSED
+                self._calls.clear()
+            self._calls.append((ok, latency))
+            if ok or self.state == OPEN:
+                return False
+            failures = sum(1 for success, _ in self._calls if not success)
+            if self.state == HALF_OPEN or (
+                len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_rate
+            ):
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.times_opened += 1
+                return True
+            return False
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+            retry_in = self._opened_at + self.cooldown - time.monotonic() if self.state == OPEN else 0.0
+            state = self.state
+        latencies = sorted(latency for ok, latency in calls if ok)
+        failures = sum(1 for ok, _ in calls if not ok)
+        return {
+            "state": state,
+            "calls": len(calls),
+            "failures": failures,
+            "failure_rate": round(failures / len(calls), 3) if calls else 0.0,
+            "latency_ms": {
+                f"p{pct}": round(_percentile(latencies, pct) * 1000, 1) if latencies else None for pct in (50, 95)
+            },
+            "times_opened": self.times_opened,
+            "retry_in_s": round(max(0.0, retry_in), 1),
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+_decisions: deque[dict[str, Any]] = deque(maxlen=50)
+
+
+def is_outage(error: Exception) -> bool:
+    """Whether `error` says the model is unhealthy rather than that the request was rejected."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(model)
+        if breaker is None:
+            breaker = _breakers[model] = CircuitBreaker(
+                model,
+                window=settings.image_breaker_window,
+                failure_rate=settings.image_breaker_failure_rate,
+                min_calls=settings.image_breaker_min_calls,
+                cooldown=settings.image_breaker_cooldown_seconds,
+            )
+        return breaker
+
+
+async def route(
+    models: list[str],
+    call: Callable[[str], Awaitable[T]],
+    hedge_after: float | None = None,
+    on_open: Callable[[str, Exception], Awaitable[None]] | None = None,
+    **context: Any,
+) -> tuple[str, T]:
+    """Run `call(model)` on the first model whose breaker allows it, falling back in order.
+
+    With `hedge_after` (seconds), a call still running by then races a call to
+    the next allowed model. Raises the last error when every model failed.
+    """
+    candidates = list(dict.fromkeys(models))
+    remaining = iter(candidates)
+    decision: dict[str, Any] = {
+        "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **context,
+        "skipped": [],
+        "attempts": [],
+        "hedged": False,
+        "model": None,
+    }
+    running: dict[asyncio.Task, tuple[str, float]] = {}
+
+    def next_model() -> str | None:
+        for model in remaining:
+            if get_breaker(model).allow():
+                return model
+            decision["skipped"].append(model)
+            count("image_route_total", model=model, outcome="skipped")
+        return None
+
+    def start(model: str) -> None:
+        running[asyncio.create_task(call(model))] = (model, time.monotonic())
+
+    first = next_model()
+    if first is None:
+        # Every breaker is open: try the preferred model anyway rather than not at all
+        first = candidates[0]
+        decision["forced"] = True
+    start(first)
+    last_error: Exception | None = None
+    hedge_pending = bool(hedge_after)
+    try:
+        while running:
+            wait = hedge_after if hedge_pending and len(running) == 1 else None
+            done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedge_pending = False
+                hedge = next_model()
+                if hedge is not None:
+                    start(hedge)
+                    decision["hedged"] = True
+                    count("image_route_total", model=hedge, outcome="hedged")
+                continue
+            for task in done:
+                model, started = running.pop(task)
+                latency = time.monotonic() - started
+                attempt = {"model": model, "ms": round(latency * 1000, 1)}
+                decision["attempts"].append(attempt)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    last_error = e
+                    attempt["error"] = f"{type(e).__name__}: {e}"[:200]
+                    if not is_outage(e):
+                        # Another model would refuse the same prompt; the model itself is fine
+                        get_breaker(model).release()
+                        count("image_route_total", model=model, outcome="rejected")
+                        raise
+                    count("image_route_total", model=model, outcome="error")
+                    if get_breaker(model).record(False, latency):
+                        print(f"⚠️ Circuit for image model {model} opened: {e}")
+                        decision.setdefault("opened", []).append(model)
+                        if on_open is not None:
+                            await on_open(model, e)
+                    continue
+                get_breaker(model).record(True, latency)
+                count("image_route_total", model=model, outcome="ok")
+                decision["model"] = model
+                return model, result
+            if not running:
+                fallback = next_model()
+                if fallback is not None:
+                    start(fallback)
+        raise last_error
+    finally:
+        for task, (model, _) in running.items():
+            task.cancel()
+            get_breaker(model).release()
+            decision["attempts"].append({"model": model, "cancelled": True})
+            count("image_route_total", model=model, outcome="cancelled")
+        _decisions.append(decision)
+
+
+def routing_stats() -> dict[str, Any]:
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {
+        "hedge_after_s": settings.image_hedge_after_seconds or None,
+        "models": {name: breaker.stats() for name, breaker in breakers.items()},
+        "decisions": list(reversed(_decisions)),
+    }
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    return values[max(1, math.ceil(pct / 100 * len(values))) - 1]
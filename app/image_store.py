@@ -0,0 +1,127 @@
+"""Content-addressed on-disk store for generated flashcard images.
+
+Images are filed under sha256(model, size, final prompt), so rendering the
+same term/translation/prompt twice is a disk hit instead of a 20-120 s image
+call. Files keep the encoding they were uploaded with (png, jpg or webp).
+Total size is capped at IMAGE_STORE_MAX_MB; the least recently used
+files (by mtime, refreshed on every hit) are evicted first.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from app.clients import get_http
+from app.config import settings
+from app.image_pipeline import EXTENSIONS, sniff_mime
+
+_SUFFIXES = tuple(f".{extension}" for extension in EXTENSIONS.values())
+
+
+def image_key(prompt: str, model: str, size: str) -> str:
+    return hashlib.sha256(f"{model}\x1f{size}\x1f{prompt}".encode("utf-8")).hexdigest()
+
+
+class ImageStore:
+    def __init__(self, root: str | Path, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "reloads": 0, "evictions": 0}
+
+    def path_for(self, key: str, extension: str = "png") -> Path:
+        return self.root / f"{key}.{extension}"
+
+    def get(self, key: str) -> Path | None:
+        for suffix in _SUFFIXES:
+            path = self.root / f"{key}{suffix}"
+            try:
+                os.utime(path)  # mark as recently used
+            except FileNotFoundError:
+                continue
+            self.stats["hits"] += 1
+            return path
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, data: bytes) -> Path:
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(key, EXTENSIONS.get(sniff_mime(data), "png"))
+        # Write-then-rename so a concurrent reader never sees a partial file
+        fd, tmp_name = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_name, path)
+        self.stats["stores"] += 1
+        self._evict(keep=path)
+        return path
+
+    def reload(self, key: str, image_url: str) -> Path | None:
+        """Bring a previously recorded `flashcards.image_url` (local path or http URL) back into the store."""
+        if image_url.startswith(("http://", "https://")):
+            response = get_http().get(image_url)
+            if response.status_code != 200:
+                return None
+            data = response.content
+        else:
+            source = Path(image_url)
+            if not source.is_file():
+                return None
+            if source.parent.resolve() == self.root.resolve() and source.stem == key:
+                return self.get(key)
+            data = source.read_bytes()
+        self.stats["reloads"] += 1
+        return self.put(key, data)
+
+    def usage(self) -> dict[str, int]:
+        files = self._files()
+        return {"files": len(files), "bytes": sum(_size(path) for path in files), "max_bytes": self.max_bytes}
+
+    def _evict(self, keep: Path) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self._files():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                path.unlink(missing_ok=True)
+                total -= size
+                self.stats["evictions"] += 1
+
+    def _files(self) -> list[Path]:
+        if not self.root.exists():
+            return []
+        return [path for path in self.root.iterdir() if path.suffix in _SUFFIXES]
+
+
+def _size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+_store: ImageStore | None = None
+
+
+def get_image_store() -> ImageStore:
+    global _store
+    if _store is None:
+        _store = ImageStore(settings.images_dir, settings.image_store_max_mb * 1024 * 1024)
+    return _store
+
+
+def image_store_stats() -> dict[str, int]:
+    store = get_image_store()
+    return {**store.stats, **store.usage()}
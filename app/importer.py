@@ -0,0 +1,254 @@
+"""Streaming import of vocabulary lists into source_terms.
+
+Reads JSON arrays, JSON Lines or CSV incrementally, so a 500k-entry frequency
+list never sits in memory. Each entry is a string or an object with the term
+under italian_text (or term/word/text/lemma), plus optional category and
+difficulty. Terms are deduplicated on `normalize_term` (case-insensitive,
+accent-sensitive). Each row carries a content_hash. A re-import writes only
+terms that are new or whose text, category or difficulty changed. Used/unused
+state is never touched.
+
+    python -m app.importer frequency_list.csv --difficulty intermediate
+    curl -X POST --data-binary @words.jsonl 'localhost:8000/terms/import?format=jsonl'
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import IO, Any, Iterator
+
+from app.clients import run_sync
+from app.config import settings
+from app.storage import get_async_storage
+from app.storage.base import clean_term, normalize_term
+
+FORMATS = ("json", "jsonl", "csv")
+TEXT_FIELDS = ("italian_text", "term", "word", "text", "lemma")
+_READ_SIZE = 64 * 1024
+_PROGRESS_SECONDS = 5.0
+
+
+def detect_format(stream: IO[str], name: str | None = None) -> str:
+    """By file extension, else by the first non-blank character ([ json, { jsonl, anything else csv)."""
+    suffix = Path(name).suffix.lower() if name else ""
+    if suffix in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if suffix in (".json", ".csv"):
+        return suffix[1:]
+    position = stream.tell()
+    head = stream.read(256).lstrip()
+    stream.seek(position)
+    return {"[": "json", "{": "jsonl"}.get(head[:1], "csv")
+
+
+def read_entries(stream: IO[str], fmt: str) -> Iterator[Any]:
+    if fmt == "jsonl":
+        for number, line in enumerate(stream, start=1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"Line {number}: {e}") from e
+    elif fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "json":
+        yield from _iter_json_array(stream)
+    else:
+        raise ValueError(f"Unknown format '{fmt}'. Use one of: {', '.join(FORMATS)}")
+
+
+def _iter_json_array(stream: IO[str]) -> Iterator[Any]:
+    """Items of a top-level JSON array, decoded one at a time from 64 KiB reads."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        chunk = stream.read(_READ_SIZE)
+        buffer, position, eof = buffer[position:] + chunk, 0, not chunk
+        return bool(chunk)
+
+    def skip(chars: str) -> None:
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in chars:
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    skip(" \t\r\n")
+    if buffer[position:position + 1] != "[":
+        raise ValueError("Expected a JSON array")
+    position += 1
+    while True:
+        skip(" \t\r\n,")
+        if position >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        if end == len(buffer) and not eof:
+            # A number may continue in the next read
+            fill()
+            continue
+        position = end
+        yield item
+
+
+def prepare_row(entry: Any, difficulty: str, category: str) -> dict[str, Any] | None:
+    """A source_terms row for one entry, or None when it has no usable term."""
+    if isinstance(entry, str):
+        text, fields = entry, {}
+    elif isinstance(entry, dict):
+        fields = entry
+        text = next((entry[field] for field in TEXT_FIELDS if entry.get(field)), "")
+    else:
+        return None
+    text = clean_term(str(text))
+    if not text:
+        return None
+    row = {
+        "term_key": normalize_term(text),
+        "italian_text": text,
+        "category": clean_term(str(fields.get("category") or "")) or category,
+        "difficulty": clean_term(str(fields.get("difficulty") or "")).lower() or difficulty,
+    }
+    digest = hashlib.sha256("\x1f".join((row["italian_text"], row["category"], row["difficulty"])).encode())
+    row["content_hash"] = digest.hexdigest()[:16]
+    return row
+
+
+def import_terms(source: str | Path | IO[str], **kwargs: Any) -> dict[str, Any]:
+    return run_sync(import_terms_async(source, **kwargs))
+
+
+async def import_terms_async(
+    source: str | Path | IO[str],
+    fmt: str | None = None,
+    difficulty: str = "beginner",
+    category: str = "general",
+    chunk_size: int | None = None,
+    concurrency: int | None = None,
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    """Stream `source` (a path or text stream) into source_terms and return counts and throughput."""
+    if isinstance(source, (str, Path)):
+        with open(source, encoding="utf-8-sig", newline="") as stream:
+            return await import_terms_async(
+                stream, fmt or detect_format(stream, str(source)), difficulty, category, chunk_size, concurrency, dry_run
+            )
+
+    fmt = fmt or detect_format(source)
+    chunk_size = max(1, chunk_size or settings.import_chunk_size)
+    storage = get_async_storage()
+    report = {"read": 0, "new": 0, "changed": 0, "unchanged": 0, "duplicates": 0, "invalid": 0, "chunks": 0}
+    seen: set[str] = set()
+    started = last_progress = time.perf_counter()
+
+    def next_chunk() -> list[dict[str, Any]]:
+        chunk = []
+        for entry in entries:
+            report["read"] += 1
+            row = prepare_row(entry, difficulty, category)
+            if row is None:
+                report["invalid"] += 1
+            elif row["term_key"] in seen:
+                report["duplicates"] += 1
+            else:
+                seen.add(row["term_key"])
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    break
+        return chunk
+
+    async def write(chunk: list[dict[str, Any]]) -> None:
+        try:
+            stored = await storage.source_term_hashes([row["term_key"] for row in chunk])
+            pending = [row for row in chunk if row["term_key"] not in stored or stored[row["term_key"]] != row["content_hash"]]
+            if pending and not dry_run:
+                await storage.upsert_source_terms(pending)
+            changed = sum(1 for row in pending if row["term_key"] in stored)
+            report["new"] += len(pending) - changed
+            report["changed"] += changed
+            report["unchanged"] += len(chunk) - len(pending)
+            report["chunks"] += 1
+        finally:
+            slots.release()
+
+    entries = read_entries(source, fmt)
+    slots = asyncio.Semaphore(max(1, concurrency or settings.import_concurrency))
+    tasks: set[asyncio.Task] = set()
+    try:
+        while True:
+            # At most `concurrency` chunks are parsed ahead or being written
+            await slots.acquire()
+            chunk = await asyncio.to_thread(next_chunk)
+            if not chunk:
+                slots.release()
+                break
+            tasks.add(asyncio.create_task(write(chunk)))
+            # Surface a failed chunk now rather than after the whole file
+            for done in [task for task in tasks if task.done()]:
+                tasks.discard(done)
+                done.result()
+            if time.perf_counter() - last_progress >= _PROGRESS_SECONDS:
+                last_progress = time.perf_counter()
+                print(f"Import progress: {_summary(report, last_progress - started)}")
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    duration = time.perf_counter() - started
+    report.update({
+        "format": fmt,
+        "dry_run": dry_run,
+        "duration_s": round(duration, 3),
+        "rows_per_second": round(report["read"] / duration, 1) if duration > 0 else None,
+    })
+    print(f"{'Dry run' if dry_run else 'Import'} finished: {_summary(report, duration)}")
+    return report
+
+
+def _summary(report: dict[str, Any], elapsed: float) -> str:
+    rate = report["read"] / elapsed if elapsed > 0 else 0
+    return (
+        f"{report['read']:,} read, {report['new']:,} new, {report['changed']:,} changed, "
+        f"{report['unchanged']:,} unchanged, {report['duplicates']:,} duplicates, "
+        f"{report['invalid']:,} invalid ({rate:,.0f} rows/s)"
+    )
+
+
+def main() -> None:
+    from app.db import init_db
+
+    parser = argparse.ArgumentParser(description="Import a vocabulary list into source_terms.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the extension or the content")
+    parser.add_argument("--difficulty", default="beginner", help="for entries without one")
+    parser.add_argument("--category", default="general", help="for entries without one")
+    parser.add_argument("--chunk-size", type=int, default=settings.import_chunk_size)
+    parser.add_argument("--concurrency", type=int, default=settings.import_concurrency)
+    parser.add_argument("--dry-run", action="store_true", help="count new and changed terms without writing")
+    args = parser.parse_args()
+
+    init_db()
+    report = import_terms(
+        args.path, fmt=args.format, difficulty=args.difficulty, category=args.category,
+        chunk_size=args.chunk_size, concurrency=args.concurrency, dry_run=args.dry_run,
+    )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Durable job queue on top of the storage layer.
+
+Jobs are rows in the `jobs` table. A worker leases a batch (status='running'
+until `lease_until`), runs each handler and then marks the job done, schedules
+a retry with exponential backoff, or dead-letters it after `max_attempts`.
+If a worker dies mid-job its lease expires and another worker picks the job up,
+so work is never dropped silently. A `job_key` makes enqueueing idempotent.
+
+Workers: `drain_jobs_async()` after a request or from the scheduler (in-process),
+or `python -m app.worker` as a separate long-running process.
+"""
+import asyncio
+import os
+import random
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from app.clients import run_sync
+from app.config import settings
+from app.storage import get_async_storage
+from app.tracing import span
+
+FLASHCARD_IMAGE = "flashcard_image"
+
+JobHandler = Callable[[dict[str, Any], dict[str, Any]], Awaitable[None]]
+HANDLERS: dict[str, JobHandler] = {}
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    def register(func: JobHandler) -> JobHandler:
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind: str, payload: dict[str, Any], job_key: str | None = None, delay: float = 0) -> dict[str, Any]:
+    return run_sync(enqueue_async(kind, payload, job_key=job_key, delay=delay))
+
+
+async def enqueue_async(kind: str, payload: dict[str, Any], job_key: str | None = None, delay: float = 0) -> dict[str, Any]:
+    return await get_async_storage().enqueue_job({
+        "kind": kind,
+        "job_key": job_key,
+        "payload": payload,
+        "max_attempts": settings.jobs_max_attempts,
+        "run_at": _iso(_now() + timedelta(seconds=delay)),
+    })
+
+
+async def enqueue_flashcard_image_async(result: dict[str, Any]) -> dict[str, Any]:
+    """Queue Phase 2 (image + delivery) for a card returned by create_and_send_daily_flashcard_async."""
+    return await enqueue_async(
+        FLASHCARD_IMAGE,
+        {
+            "term": result["italian_text"],
+            "flashcard_id": result["flashcard_id"],
+            "phonetic": result.get("phonetic", ""),
+            "translation": result.get("english_translation", ""),
+            "example_sentence": result.get("example_sentence", ""),
+        },
+        job_key=f"{FLASHCARD_IMAGE}:{result['flashcard_id']}",
+    )
+
+
+def drain_jobs(max_jobs: int | None = None, concurrency: int | None = None) -> dict[str, int]:
+    return run_sync(drain_jobs_async(max_jobs, concurrency))
+
+
+async def drain_jobs_async(
+    max_jobs: int | None = None, concurrency: int | None = None, worker_id: str = WORKER_ID
+) -> dict[str, int]:
+    """Run due jobs, up to `concurrency` at a time, until the queue is empty or `max_jobs` ran."""
+    concurrency = max(1, concurrency or settings.jobs_concurrency)
+    storage = get_async_storage()
+    outcome = {"done": 0, "retried": 0, "dead": 0, "lost": 0}
+    ran = 0
+    while max_jobs is None or ran < max_jobs:
+        now = _now()
+        batch = await storage.lease_jobs(
+            worker_id,
+            _iso(now),
+            _iso(now + timedelta(seconds=settings.jobs_lease_seconds)),
+            concurrency if max_jobs is None else min(concurrency, max_jobs - ran),
+        )
+        if not batch:
+            break
+        ran += len(batch)
+        for status in await asyncio.gather(*(_run_job(job, worker_id) for job in batch)):
+            outcome[status] += 1
+    return outcome
+
+
+async def run_worker_async(
+    concurrency: int | None = None, poll_seconds: float | None = None, stop: asyncio.Event | None = None
+) -> None:
+    """Drain the queue forever, sleeping `poll_seconds` whenever it is empty."""
+    poll_seconds = settings.jobs_poll_seconds if poll_seconds is None else poll_seconds
+    stop = stop or asyncio.Event()
+    print(f"Job worker {WORKER_ID} started.")
+    while not stop.is_set():
+        try:
+            outcome = await drain_jobs_async(concurrency=concurrency)
+            if any(outcome.values()):
+                print(f"Job worker drained: {outcome}")
+        except Exception as e:
+            print(f"⚠️ Job worker poll failed: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def requeue_job(job_id: int) -> bool:
+    from app.storage import get_storage
+    return get_storage().requeue_job(job_id, _iso(_now()))
+
+
+def job_stats() -> dict[str, int]:
+    from app.storage import get_storage
+    return get_storage().count_jobs()
+
+
+async def _run_job(job: dict[str, Any], worker_id: str) -> str:
+    storage = get_async_storage()
+    handler = HANDLERS.get(job["kind"])
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job kind '{job['kind']}'")
+        if job["attempts"] > job["max_attempts"]:
+            # Leased again after the worker of its last attempt died
+            raise RuntimeError("Attempts exhausted (lease expired on the final attempt)")
+        with span("job", kind=job["kind"], job_id=job["id"], attempt=job["attempts"]):
+            await handler(job["payload"], job)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if handler is None or job["attempts"] >= job["max_attempts"]:
+            print(f"❌ Job {job['id']} ({job['kind']}) dead-lettered after {job['attempts']} attempts: {error}")
+            finished = await storage.finish_job(job["id"], worker_id, "dead", error=error)
+            return "dead" if finished else "lost"
+        retry_at = _now() + timedelta(seconds=_backoff(job["attempts"]))
+        print(f"⚠️ Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed, retrying at {retry_at:%H:%M:%S}: {error}")
+        finished = await storage.finish_job(job["id"], worker_id, "queued", error=error, run_at=_iso(retry_at))
+        return "retried" if finished else "lost"
+    finished = await storage.finish_job(job["id"], worker_id, "done")
+    return "done" if finished else "lost"
+
+
+def _backoff(attempts: int) -> float:
+    # Jitter so many failed jobs do not retry in lockstep
+    ceiling = min(settings.jobs_backoff_seconds * 2 ** (attempts - 1), 3600)
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(moment: datetime) -> str:
+    # Fixed-width timestamps so text comparison in SQLite matches time order
+    return moment.isoformat(timespec="microseconds")
+
+
+@job_handler(FLASHCARD_IMAGE)
+async def _flashcard_image(payload: dict[str, Any], job: dict[str, Any]) -> None:
+    from app.flashcards import background_image_task_async
+
+    if not settings.fanout_enabled and await get_async_storage().delivered_chat_ids(payload["flashcard_id"]):
+        # An earlier attempt already delivered it; do not send twice
+        return
+    # Retry image generation and delivery; only the last attempt falls back to text
+    await background_image_task_async(**payload, fallback=job["attempts"] >= job["max_attempts"])
@@ -0,0 +1,124 @@
+"""One scheduler leader across workers, and scheduled runs that happen once per slot.
+
+Every worker or replica that starts the scheduler renews a lease row named
+"scheduler" every LEADER_LEASE_SECONDS / 3. Only the holder runs scheduled
+jobs. The others keep trying, so one of them takes over within
+LEADER_LEASE_SECONDS after the leader dies. The lease lives in the configured
+storage (the same SQLite file for local workers, a row in Supabase otherwise).
+
+A lease handover or an extra trigger (the Vercel cron, a manual /api/cron)
+can still fire the same slot twice. So the daily delivery also claims a run
+key such as `daily:2026-10-17` (the date in TIMEZONE). Only the first claim
+of a key runs. A key whose run failed, or whose worker went quiet for
+SCHEDULED_RUN_STALE_SECONDS, may be claimed again.
+"""
+import functools
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, TypeVar
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+from app.storage import get_async_storage, get_storage
+from app.tracing import count
+
+SCHEDULER_LEASE = "scheduler"
+# Unique per process, also across containers that reuse hostnames and pids
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+T = TypeVar("T")
+
+
+class Lease:
+    """A named, expiring lease in storage, renewed by whoever holds it."""
+
+    def __init__(self, name: str, ttl: float) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.held = False
+        self._lock = threading.Lock()
+
+    def renew(self) -> bool:
+        """Take or extend the lease; False when another holder has it or storage is unreachable."""
+        with self._lock:
+            now = datetime.now(timezone.utc)
+            try:
+                held = get_storage().acquire_lease(self.name, HOLDER_ID, _iso(now), _iso(now + timedelta(seconds=self.ttl)))
+            except Exception as e:
+                # Without storage we cannot tell who leads; standing down is the safe side
+                print(f"⚠️ Could not renew lease '{self.name}': {e}")
+                held = False
+            if held != self.held:
+                print(f"{'👑 Now leading' if held else '⏸️ No longer leading'} '{self.name}' ({HOLDER_ID}).")
+                count("leader_changes_total", lease=self.name, leading=str(held).lower())
+            self.held = held
+            return held
+
+    def release(self) -> None:
+        with self._lock:
+            if self.held:
+                get_storage().release_lease(self.name, HOLDER_ID)
+                self.held = False
+
+
+_scheduler_lease: Lease | None = None
+
+
+def get_scheduler_lease() -> Lease:
+    global _scheduler_lease
+    if _scheduler_lease is None:
+        _scheduler_lease = Lease(SCHEDULER_LEASE, settings.leader_lease_seconds)
+    return _scheduler_lease
+
+
+def leader_only(func: Callable[[], T]) -> Callable[[], T | None]:
+    """Wrap a scheduled job so it runs only on the current leader (always, with LEADER_ELECTION=0)."""
+    if not settings.leader_election:
+        return func
+
+    @functools.wraps(func)
+    def wrapper() -> T | None:
+        # Renewing right before the job keeps a stale leader from running it
+        if not get_scheduler_lease().renew():
+            return None
+        return func()
+
+    return wrapper
+
+
+def daily_run_key(kind: str = "daily", when: datetime | None = None) -> str:
+    """`daily:2026-10-17`: one key per calendar day in TIMEZONE."""
+    when = when or datetime.now(timezone.utc)
+    return f"{kind}:{when.astimezone(ZoneInfo(settings.timezone)).date().isoformat()}"
+
+
+async def run_once_async(run_key: str, func: Callable[[], Awaitable[dict[str, Any]]]) -> dict[str, Any]:
+    """Run `func` unless `run_key` already ran (or is running elsewhere); then return that run instead."""
+    if not settings.run_once_per_slot:
+        return await func()
+    storage = get_async_storage()
+    now = datetime.now(timezone.utc)
+    stale_before = now - timedelta(seconds=settings.scheduled_run_stale_seconds)
+    if not await storage.claim_run(run_key, HOLDER_ID, _iso(now), _iso(stale_before)):
+        run = await storage.get_run(run_key)
+        count("scheduled_runs_total", outcome="duplicate")
+        print(f"⏭️ Scheduled run '{run_key}' already {run['status'] if run else 'claimed'}; skipping.")
+        return {"status": "already_ran", "run_key": run_key, "run": run}
+    try:
+        result = await func()
+    except Exception as e:
+        await storage.finish_run(run_key, HOLDER_ID, "failed", None, str(e)[:500])
+        count("scheduled_runs_total", outcome="failed")
+        raise
+    summary = {key: result[key] for key in ("status", "flashcard_id", "italian_text") if key in result}
+    await storage.finish_run(run_key, HOLDER_ID, "done", summary, None)
+    count("scheduled_runs_total", outcome="done")
+    return result
+
+
+def _iso(when: datetime) -> str:
+    # Fixed-width timestamps so text comparison in SQLite matches time order
+    return when.isoformat(timespec="microseconds")
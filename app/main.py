@@ -1,37 +1,108 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import csv
+import hashlib
+import json
+
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 
 from app.config import settings
 from app.db import init_db
-from app.flashcards import create_and_send_daily_flashcard, list_flashcards, seed_beginner_terms_if_empty
+from app.storage import resolve_backend_name
 
 app = FastAPI(title="Italian Flashcard Service")
-scheduler = BackgroundScheduler(timezone=settings.timezone)
+# Built on startup only where it can run (not on Vercel, where vercel.json crons call /api/cron)
+scheduler = None
 
 
 @app.on_event("startup")
 def startup() -> None:
     try:
         init_db()
-        seed_beginner_terms_if_empty()
+        if not settings.is_vercel:
+            # On serverless this waits until a term is first claimed (see claim_next_terms)
+            from app.flashcards import seed_beginner_terms_if_empty
+            seed_beginner_terms_if_empty()
+        if settings.fanout_enabled or settings.per_subscriber_schedule:
+            from app.fanout import ensure_default_subscriber
+            ensure_default_subscriber()
     except Exception as e:
         print(f"❌ Critical error during startup: {e}")
         # We don't re-raise, so the app stays alive for diagnostics
 
+    if settings.scheduler_enabled:
+        _start_scheduler()
+
+
+def _start_scheduler() -> None:
+    global scheduler
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from apscheduler.triggers.cron import CronTrigger
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    from app.jobs import drain_jobs
+    from app.leader import get_scheduler_lease, leader_only
+    from app.pregen import deliver_daily_flashcard, fill_ready_buffer
+
+    scheduler = BackgroundScheduler(timezone=settings.timezone)
+    if settings.leader_election:
+        # Every worker schedules the jobs, but only the lease holder runs them (see app.leader)
+        get_scheduler_lease().renew()
+        scheduler.add_job(
+            get_scheduler_lease().renew,
+            IntervalTrigger(seconds=max(1.0, settings.leader_lease_seconds / 3)),
+            id="renew_scheduler_lease",
+            replace_existing=True,
+            coalesce=True,
+        )
+    if settings.per_subscriber_schedule:
+        from app.dispatcher import dispatch_due_flashcards
+
+        # One tick a minute sends to everyone due in it (see app.dispatcher)
+        scheduler.add_job(
+            leader_only(dispatch_due_flashcards),
+            CronTrigger(second=0, timezone=settings.timezone),
+            id="dispatch_flashcards",
+            replace_existing=True,
+            coalesce=True,
+        )
+    else:
+        scheduler.add_job(
+            leader_only(deliver_daily_flashcard),
+            CronTrigger(hour=settings.schedule_hour, minute=settings.schedule_minute, timezone=settings.timezone),
+            id="daily_italian_flashcard",
+            replace_existing=True,
+        )
+    if settings.pregen_enabled:
+        scheduler.add_job(
+            leader_only(fill_ready_buffer),
+            CronTrigger(hour=settings.pregen_hour, minute=settings.pregen_minute, timezone=settings.timezone),
+            id="pregenerate_flashcards",
+            replace_existing=True,
+        )
     scheduler.add_job(
-        create_and_send_daily_flashcard,
-        CronTrigger(hour=settings.schedule_hour, minute=settings.schedule_minute, timezone=settings.timezone),
-        id="daily_italian_flashcard",
+        drain_jobs,
+        IntervalTrigger(seconds=settings.jobs_poll_seconds),
+        id="drain_jobs",
         replace_existing=True,
+        coalesce=True,
     )
     scheduler.start()
 
 
 @app.on_event("shutdown")
 def shutdown() -> None:
-    if scheduler.running:
+    if scheduler is not None and scheduler.running:
         scheduler.shutdown(wait=False)
+        if settings.leader_election:
+            from app.leader import get_scheduler_lease
+            # Let another worker take over now rather than after the lease expires
+            get_scheduler_lease().release()
+
+
+@app.on_event("shutdown")
+async def flush_quiz_answers() -> None:
+    from app.quiz import close_quiz_ingest_async
+    await close_quiz_ingest_async()
 
 
 @app.get("/")
@@ -40,12 +111,26 @@ def read_root():
         "message": "Italian Flashcard Service is running!",
         "endpoints": {
             "health": "/health",
-            "diagnostics": "/diagnostics (Test each component)",
+            "diagnostics": "/diagnostics (Test each component; ?deep=true for billable checks)",
             "generate_now_get": "/flashcards/generate-now (GET)",
-            "list_flashcards": "/flashcards"
+            "pregenerate": "/flashcards/pregenerate",
+            "list_flashcards": "/flashcards",
+            "subscribers": "/subscribers",
+            "fan_out": "/flashcards/{id}/fan-out (POST)",
+            "reviews": "/reviews/{chat_id}",
+            "quizzes": "/quizzes/{chat_id}",
+            "telegram_webhook": "/telegram/webhook (POST)",
+            "jobs": "/jobs",
+            "export": "/flashcards/export?format=apkg|csv|zip",
+            "import_terms": "/terms/import (POST)",
+            "prefill_content": "/content-cache/prefill (POST)",
+            "image_routing": "/images/routing",
+            "metrics": "/metrics",
+            "stats": "/stats"
         },
         "config_debug": {
             "is_vercel": settings.is_vercel,
+            "storage_backend": resolve_backend_name(),
             "db_path": settings.db_path,
             "has_openai": bool(settings.openai_api_key),
             "has_supabase": bool(settings.supabase_url and settings.supabase_key),
@@ -62,28 +147,24 @@ def health() -> dict[str, str]:
 
 @app.get("/flashcards/generate-now")
 @app.post("/flashcards/generate-now")
-def generate_now(background_tasks: BackgroundTasks) -> dict:
+async def generate_now(background_tasks: BackgroundTasks) -> dict:
     """Trigger a flashcard generation. Text is sent immediately, image in background."""
-    from app.flashcards import create_and_send_daily_flashcard, background_image_task
-    
+    from app.flashcards import create_and_send_daily_flashcard_async
+    from app.jobs import drain_jobs_async, enqueue_flashcard_image_async
+
     print("Manual trigger: Starting Generation...")
     try:
-        # Phase 1: Text generation and sending (This is fast)
-        result = create_and_send_daily_flashcard()
-        
-        # Phase 2: Schedule image generation (This is slow, runs after request returns)
-        background_tasks.add_task(
-            background_image_task, 
-            term=result['italian_text'], 
-            flashcard_id=result['flashcard_id'],
-            phonetic=result.get('phonetic', ''),
-            translation=result.get('english_translation', ''),
-            example_sentence=result.get('example_sentence', '')
-        )
-        
-        print(f"Success: Text sent for {result['italian_text']}. Image task scheduled.")
+        # Phase 1: Text generation (fast). Image generation starts alongside the DB insert.
+        result = await create_and_send_daily_flashcard_async(prefetch_image=True)
+
+        # Phase 2: queued durably, then run in-process after the response is sent.
+        # If this instance dies first, the job stays queued for the next worker.
+        job = await enqueue_flashcard_image_async(result)
+        background_tasks.add_task(drain_jobs_async, max_jobs=settings.jobs_concurrency)
+
+        print(f"Success: Text sent for {result['italian_text']}. Image job {job['id']} queued.")
         return {
-            "status": "success", 
+            "status": "success",
             "message": "Flashcard text sent! Image will follow in 20-30 seconds.",
             "data": result
         }
@@ -92,13 +173,318 @@ def generate_now(background_tasks: BackgroundTasks) -> dict:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+@app.get("/flashcards/pregenerate")
+@app.post("/flashcards/pregenerate")
+async def pregenerate(target: int | None = None) -> dict:
+    """Fill the ready buffer so scheduled sends only pop and deliver (only with PREGEN_ENABLED=1)."""
+    from app.pregen import fill_ready_buffer_async
+
+    if not settings.pregen_enabled:
+        # The Vercel cron calls this nightly; without pregen nothing would ever pop these cards
+        return {"status": "skipped", "reason": "PREGEN_ENABLED is off"}
+    try:
+        return {"status": "success", **(await fill_ready_buffer_async(target=target))}
+    except Exception as exc:
+        print(f"Error during pre-generation: {exc}")
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
 @app.get("/flashcards")
-def get_flashcards(limit: int = 100) -> dict:
-    return {"items": list_flashcards(limit=limit)}
+def get_flashcards(
+    request: Request,
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    fields: str | None = None,
+    format: str = "json",
+):
+    """History, newest first. Pages via `next_cursor`; `format=ndjson` streams everything (or `limit` rows)."""
+    from app.flashcards import decode_cursor, iter_flashcards, list_flashcards_page, parse_fields
+
+    try:
+        columns = parse_fields(fields)
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        lines = (json.dumps(row, default=str) + "\n" for row in iter_flashcards(limit, before, columns))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+
+    body = json.dumps(list_flashcards_page(min(limit or 100, 1000), before, columns), default=str).encode()
+    etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in (tags := _if_none_match(request)) or "*" in tags:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/flashcards/export")
+def export_flashcards(
+    format: str = "apkg", since: str | None = None, cursor: str | None = None, deck: str | None = None
+):
+    """Stream the history, oldest first, as an Anki package, CSV or ZIP of images; see app.export."""
+    from datetime import datetime, timezone
+
+    from app.export import DEFAULT_DECK, MEDIA_TYPES, DeckExport, start_position
+
+    try:
+        export = DeckExport(format, start_position(since, cursor), deck or DEFAULT_DECK)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    filename = f"italian-flashcards-{datetime.now(timezone.utc):%Y%m%d}.{format}"
+    return StreamingResponse(
+        iter(export), media_type=MEDIA_TYPES[format], headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def _if_none_match(request: Request) -> set[str]:
+    header = request.headers.get("if-none-match", "")
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+
+@app.post("/flashcards/{flashcard_id}/fan-out")
+async def fan_out(flashcard_id: int, concurrency: int | None = None) -> dict:
+    """Deliver a stored flashcard to every active subscriber. Rerunning resumes where it stopped."""
+    from app.fanout import fan_out_flashcard_async
+    from app.flashcards import build_caption
+    from app.pregen import resolve_card_image
+    from app.storage import get_async_storage
+
+    card = await get_async_storage().get_flashcard(flashcard_id)
+    if card is None:
+        raise HTTPException(status_code=404, detail=f"Flashcard {flashcard_id} not found")
+    caption = card.get("caption") or build_caption(
+        card["italian_text"], card.get("phonetic") or "", card.get("english_translation") or "", card.get("example_sentence") or ""
+    )
+    image_path = resolve_card_image(card)
+    return await fan_out_flashcard_async(flashcard_id, caption, image_path=image_path, concurrency=concurrency)
+
+
+@app.get("/subscribers")
+def subscribers() -> dict:
+    from app.storage import get_storage
+    return {"active": get_storage().count_subscribers()}
+
+
+@app.post("/subscribers")
+def subscribe(chat_id: str) -> dict:
+    from app.fanout import add_subscriber
+    add_subscriber(chat_id)
+    return {"status": "subscribed", "chat_id": chat_id}
+
+
+@app.put("/subscribers/{chat_id}/schedule")
+def subscriber_schedule(chat_id: str, timezone: str | None = None, delivery_time: str | None = None) -> dict:
+    """Subscribe with a local delivery time, e.g. ?timezone=Europe/Rome&delivery_time=07:30 (omitted = default)."""
+    from app.dispatcher import set_subscriber_schedule
+    try:
+        return {"status": "scheduled", **set_subscriber_schedule(chat_id, timezone, delivery_time)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/subscribers/{chat_id}")
+def unsubscribe(chat_id: str) -> dict:
+    from app.fanout import remove_subscriber
+    remove_subscriber(chat_id)
+    if settings.per_subscriber_schedule:
+        from app.dispatcher import get_dispatcher
+        get_dispatcher().update(chat_id, None)
+    return {"status": "unsubscribed", "chat_id": chat_id}
+
+
+@app.get("/reviews/{chat_id}")
+def reviews_due(chat_id: str, limit: int = 20) -> dict:
+    """Due reviews for one user and how many new cards they may still start today."""
+    from app.reviews import review_session
+    return review_session(chat_id, limit=limit)
+
+
+@app.post("/reviews/{chat_id}")
+def reviews_start_new(chat_id: str, count: int = 5, generate: bool = False) -> dict:
+    """Start up to `count` new cards for one user, capped by REVIEWS_NEW_PER_DAY."""
+    from app.reviews import introduce_new_cards
+    cards = introduce_new_cards(chat_id, count, generate=generate)
+    return {"chat_id": str(chat_id), "new": cards}
+
+
+@app.post("/reviews/{chat_id}/{flashcard_id}")
+def review_answer(chat_id: str, flashcard_id: int, grade: int) -> dict:
+    """Record a 0-5 recall grade and return when the card is due next."""
+    from app.reviews import record_review
+    try:
+        return record_review(chat_id, flashcard_id, grade)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+
+@app.post("/telegram/webhook")
+async def telegram_webhook(request: Request, background_tasks: BackgroundTasks) -> dict:
+    """Telegram updates (quiz answers, /quiz). Acknowledged at once; answers are written in batches."""
+    from app.quiz import get_quiz_ingest
+
+    _check_webhook_secret(request.headers.get("x-telegram-bot-api-secret-token", ""))
+    try:
+        update = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body is not JSON")
+    ingest = get_quiz_ingest()
+    reply = ingest.submit(update) if isinstance(update, dict) else None
+    if settings.is_vercel:
+        # No process outlives the request here: write after responding
+        background_tasks.add_task(ingest.flush)
+    else:
+        ingest.ensure_flusher()
+    # Telegram runs a method returned in the webhook response (here: answerCallbackQuery)
+    return reply or {"ok": True}
+
+
+@app.post("/telegram/webhook/register")
+async def telegram_webhook_register(url: str, request: Request) -> dict:
+    """Call setWebhook so Telegram posts updates to `url` (needs `Authorization: Bearer <TELEGRAM_WEBHOOK_SECRET>`)."""
+    from app.quiz import set_webhook_async
+
+    _check_webhook_secret(request.headers.get("authorization", "").removeprefix("Bearer "))
+    return await set_webhook_async(url)
+
+
+def _check_webhook_secret(provided: str) -> None:
+    import hmac
+
+    secret = settings.telegram_webhook_secret
+    if not secret:
+        # Without it anyone could post forged updates or repoint the bot
+        raise HTTPException(status_code=503, detail="TELEGRAM_WEBHOOK_SECRET is not set")
+    if not hmac.compare_digest(provided.encode(), secret.encode()):
+        raise HTTPException(status_code=401, detail="Invalid webhook secret")
+
+
+@app.post("/quizzes/{chat_id}")
+async def send_quiz(chat_id: str, flashcard_id: int | None = None) -> dict:
+    """Send a translation quiz with inline buttons (default: the user's most overdue review or the latest card)."""
+    from app.quiz import send_quiz_async
+    try:
+        return await send_quiz_async(chat_id, flashcard_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.get("/quizzes/{chat_id}")
+async def quiz_results(chat_id: str, limit: int = Query(20, ge=1, le=200)) -> dict:
+    """A user's quiz accuracy and latest answers."""
+    from app.quiz import quiz_results_async
+    return await quiz_results_async(chat_id, limit)
+
+
+@app.get("/jobs")
+def jobs() -> dict:
+    """Queue depth per status (queued, running, done, dead)."""
+    from app.jobs import job_stats
+    return job_stats()
+
+
+@app.post("/jobs/drain")
+async def drain(max_jobs: int | None = None) -> dict:
+    """Run due jobs now (e.g. from a cron when no separate worker is deployed)."""
+    from app.jobs import drain_jobs_async
+    return await drain_jobs_async(max_jobs=max_jobs)
+
+
+@app.post("/jobs/{job_id}/requeue")
+def requeue(job_id: int) -> dict:
+    """Retry a dead-lettered job from scratch."""
+    from app.jobs import requeue_job
+    if not requeue_job(job_id):
+        raise HTTPException(status_code=404, detail=f"No dead job {job_id}")
+    return {"status": "queued", "job_id": job_id}
+
+
+@app.get("/images/routing")
+def image_routing() -> dict:
+    """Circuit breaker state, latency stats and recent routing decisions per image model."""
+    from app.image_router import routing_stats
+    return routing_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    """Prometheus scrape endpoint: per-step duration histograms and counters."""
+    from app.tracing import render_metrics
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+def stats() -> dict:
+    """Runtime counters (pooled client reuse, content and image cache hits, ...)."""
+    from app.clients import client_stats
+    from app.content_cache import content_cache_stats
+    from app.image_pipeline import image_pipeline_stats
+    from app.image_store import image_store_stats
+    from app.telegram_client import telegram_stats
+    from app.quiz import quiz_ingest_stats
+    from app.term_selector import term_index_stats
+    if settings.per_subscriber_schedule:
+        from app.dispatcher import get_dispatcher
+    return {
+        "clients": client_stats(),
+        "content_cache": content_cache_stats(),
+        "image_store": image_store_stats(),
+        "image_pipeline": image_pipeline_stats(),
+        "telegram": telegram_stats(),
+        "term_index": term_index_stats(),
+        "dispatcher": get_dispatcher().stats() if settings.per_subscriber_schedule else None,
+        "quiz_ingest": quiz_ingest_stats(),
+    }
+
+
+@app.post("/terms/import")
+async def import_terms(
+    request: Request,
+    format: str | None = None,
+    difficulty: str = "beginner",
+    category: str = "general",
+    dry_run: bool = False,
+) -> dict:
+    """Import the request body (JSON array, JSON Lines or CSV) into source_terms; see app.importer."""
+    import io
+    import tempfile
+
+    from app.importer import FORMATS, import_terms_async
+
+    if format is not None and format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+    # Spools to disk past 8 MB, so a large upload is never held in memory
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+        try:
+            return await import_terms_async(text, fmt=format, difficulty=difficulty, category=category, dry_run=dry_run)
+        except (ValueError, UnicodeDecodeError, csv.Error) as e:
+            raise HTTPException(status_code=400, detail=f"Could not parse the upload: {e}") from e
+        finally:
+            text.detach()
+
+
+@app.post("/content-cache/warm")
+def warm_content_cache(limit: int = 1000) -> dict:
+    """Fill the linguistic content cache from previously generated flashcards."""
+    from app.flashcards import warm_linguistic_content_cache
+    return {"warmed": warm_linguistic_content_cache(limit=limit)}
+
+
+@app.post("/content-cache/prefill")
+async def prefill_content_cache(difficulty: str = "beginner", limit: int = Query(200, ge=1, le=5000)) -> dict:
+    """Generate linguistic content for upcoming terms in batched LLM requests."""
+    from app.content_batch import prefill_content_cache_async
+    return await prefill_content_cache_async(difficulty, limit)
 
 
 @app.get("/diagnostics")
-def diagnostics() -> dict:
-    """Run diagnostic tests on all components."""
-    from app.diagnostics import run_all_diagnostics
-    return run_all_diagnostics()
+async def diagnostics(deep: bool = False, refresh: bool = False) -> dict:
+    """Run diagnostic tests on all components (`deep=true` for real completions, images and messages)."""
+    from app.diagnostics import run_all_diagnostics_async
+    return await run_all_diagnostics_async(deep=deep, refresh=refresh)
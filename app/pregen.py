@@ -0,0 +1,186 @@
+"""Ahead-of-time flashcard generation.
+
+Off-hours, `fill_ready_buffer` renders complete cards (text, image, caption)
+and stores them with status='ready'. At send time `send_ready_flashcard` only
+pops one and delivers it, so the slow LLM and image calls are off the
+delivery path. `deliver_daily_flashcard` is the scheduled entry point and
+falls back to inline generation when the buffer is empty.
+"""
+import asyncio
+from pathlib import Path
+from typing import Any
+
+from app.clients import run_sync
+from app.config import settings
+from app.content_batch import build_linguistic_content_batch_async
+from app.flashcards import (
+    build_caption,
+    build_linguistic_content_async,
+    claim_next_terms_async,
+    create_and_send_daily_flashcard_async,
+    deliver_flashcard_async,
+    generate_image_for_term_async,
+)
+from app.image_store import get_image_store, image_key
+from app.jobs import drain_jobs_async, enqueue_flashcard_image_async
+from app.storage import get_async_storage
+
+
+async def pregenerate_flashcard_async(term: str, content: dict[str, str] | None = None) -> dict[str, Any]:
+    """Render one complete card and park it in the ready buffer."""
+    content = content or await build_linguistic_content_async(term)
+    # Ready cards always keep their image on disk until they are sent
+    _, image, image_prompt, model_used = await generate_image_for_term_async(
+        content["italian_text"], content["phonetic"], content["english_translation"], persist=True
+    )
+    row = {
+        "italian_text": content["italian_text"],
+        "phonetic": content["phonetic"],
+        "english_translation": content["english_translation"],
+        "example_sentence": content["example_sentence"],
+        "difficulty": "beginner",
+        "sent_channel": "telegram",
+        "status": "ready",
+        "caption": build_caption(
+            content["italian_text"], content["phonetic"], content["english_translation"], content["example_sentence"]
+        ),
+    }
+    if image:
+        row.update({
+            "image_url": image.path,
+            "image_key": image_key(image_prompt, model_used, settings.image_size),
+            "prompt_used": f"[{model_used}] {image_prompt}",
+        })
+    return await get_async_storage().insert_flashcard(row)
+
+
+def fill_ready_buffer(target: int | None = None, workers: int | None = None) -> dict[str, Any]:
+    return run_sync(fill_ready_buffer_async(target, workers))
+
+
+async def fill_ready_buffer_async(target: int | None = None, workers: int | None = None) -> dict[str, Any]:
+    """Top the ready buffer up to `target` cards, at most `workers` rendering at once."""
+    target = settings.pregen_buffer_size if target is None else target
+    workers = settings.pregen_workers if workers is None else workers
+    storage = get_async_storage()
+    missing = target - await storage.count_ready_flashcards()
+    if missing <= 0:
+        return {"generated": 0, "failed": 0, "errors": [], "ready": target - missing}
+
+    terms = await claim_next_terms_async(missing)
+    print(f"Pre-generating {len(terms)} flashcards with {workers} workers...")
+    # Text for every term in a few batched requests; a term missing here falls back to its own call
+    contents = await build_linguistic_content_batch_async(terms)
+    slots = asyncio.Semaphore(max(1, workers))
+
+    async def render(term: str) -> dict[str, Any]:
+        async with slots:
+            return await pregenerate_flashcard_async(term, contents.get(term))
+
+    results = await asyncio.gather(*(render(term) for term in terms), return_exceptions=True)
+    errors = []
+    for term, result in zip(terms, results):
+        if isinstance(result, BaseException):
+            print(f"Pre-generation failed for '{term}': {result}")
+            errors.append(f"{term}: {result}")
+    return {
+        "generated": len(terms) - len(errors),
+        "failed": len(errors),
+        "errors": errors,
+        "ready": await storage.count_ready_flashcards(),
+    }
+
+
+def send_ready_flashcard() -> dict[str, Any] | None:
+    return run_sync(send_ready_flashcard_async())
+
+
+async def send_ready_flashcard_async() -> dict[str, Any] | None:
+    """Pop one ready card and deliver it. Returns None when the buffer is empty."""
+    storage = get_async_storage()
+    card = await storage.pop_ready_flashcard()
+    if card is None:
+        return None
+
+    image_path = await card_image_async(card)
+    try:
+        await deliver_flashcard_async(
+            card["id"], card["caption"], image_path=image_path, status="sent" if image_path else "sent_text_only"
+        )
+    except Exception:
+        # Put it back so the next trigger can retry it (fan-out skips chats already reached)
+        await storage.update_flashcard(card["id"], {"status": "ready", "sent_at": None})
+        raise
+    print(f"Delivered pre-generated flashcard {card['id']} ('{card['italian_text']}').")
+    return {
+        "status": "sent_from_buffer",
+        "flashcard_id": card["id"],
+        "italian_text": card["italian_text"],
+        "phonetic": card["phonetic"],
+        "english_translation": card["english_translation"],
+        "example_sentence": card["example_sentence"],
+    }
+
+
+def deliver_daily_flashcard() -> dict[str, Any]:
+    return run_sync(deliver_daily_flashcard_async())
+
+
+async def deliver_daily_flashcard_async() -> dict[str, Any]:
+    """Scheduled entry point: send a ready card, or generate one inline if the buffer is empty.
+
+    Runs at most once per day, however many workers or triggers call it (see app.leader).
+    """
+    from app.leader import daily_run_key, run_once_async
+
+    return await run_once_async(daily_run_key(), _deliver_daily_flashcard_async)
+
+
+async def _deliver_daily_flashcard_async() -> dict[str, Any]:
+    if settings.pregen_enabled:
+        sent = await send_ready_flashcard_async()
+        if sent:
+            return sent
+        print("Ready buffer empty. Generating inline.")
+
+    result = await create_and_send_daily_flashcard_async(prefetch_image=True)
+    # Run Phase 2 now, but through the queue so a failure is retried later
+    await enqueue_flashcard_image_async(result)
+    await drain_jobs_async(max_jobs=settings.jobs_concurrency)
+    return result
+
+
+async def card_image_async(card: dict[str, Any]) -> str | None:
+    """The card's image on this instance's disk, rendered again when it is missing.
+
+    The store is per instance (/tmp on Vercel) and evicts old files, so a card
+    rendered elsewhere or long ago would otherwise go out text-only.
+    """
+    path = await asyncio.to_thread(resolve_card_image, card)
+    if path or not card.get("image_key"):
+        return path
+    print(f"Image for flashcard {card['id']} is not on this instance. Rendering it again.")
+    try:
+        _, image, image_prompt, model_used = await generate_image_for_term_async(
+            card["italian_text"], card.get("phonetic") or "", card.get("english_translation") or "", persist=True
+        )
+    except Exception as e:
+        print(f"⚠️ Could not re-render the image for flashcard {card['id']}: {e}")
+        return None
+    if image is None or not image.path:
+        return None
+    fields = {"image_url": image.path, "image_key": image_key(image_prompt, model_used, settings.image_size)}
+    await get_async_storage().update_flashcard(card["id"], fields)
+    card.update(fields)
+    return image.path
+
+
+def resolve_card_image(card: dict[str, Any]) -> str | None:
+    # The file may have been evicted (or lived on another serverless instance)
+    if card.get("image_url") and Path(card["image_url"]).is_file():
+        return card["image_url"]
+    if card.get("image_key"):
+        path = get_image_store().get(card["image_key"])
+        if path:
+            return str(path)
+    return None
@@ -0,0 +1,285 @@
+"""Inline-keyboard translation quizzes, answered through the Telegram webhook.
+
+`send_quiz_async` asks what a stored flashcard's Italian text means, with
+QUIZ_OPTIONS buttons: its translation and distractors from other flashcards.
+Each button's callback_data is `quiz:<flashcard_id>:<chosen flashcard_id>`,
+so an answer is graded without a lookup.
+
+/telegram/webhook passes every update to `QuizIngest.submit`, which does no
+I/O. It drops update_ids it has seen (Telegram redelivers until it gets a 200)
+and grades the answer. It returns the answerCallbackQuery call that Telegram
+runs from the webhook response, so no extra request is needed to stop the
+button spinning. Answers are buffered and written with one bulk insert every
+QUIZ_FLUSH_SECONDS, or as soon as QUIZ_FLUSH_ROWS are waiting. Only the first
+answer per quiz message counts. Each new answer also grades the card in
+app.reviews (correct 4, wrong 1), so quizzes drive spaced repetition. A
+correct answer before the card is due leaves its schedule alone.
+"""
+import asyncio
+import contextlib
+import random
+import time
+from collections import deque
+from typing import Any, Hashable
+
+from app.config import settings
+from app.reviews import record_reviews
+from app.storage import get_async_storage
+from app.telegram_client import send_telegram_message_async
+from app.tracing import count, span
+
+CALLBACK_PREFIX = "quiz"
+CORRECT_GRADE, WRONG_GRADE = 4, 1
+_DISTRACTOR_POOL = 50
+# Answers kept for retry while storage is down; beyond this the oldest are dropped
+_MAX_PENDING = 100_000
+
+
+async def send_quiz_async(chat_id: str, flashcard_id: int | None = None) -> dict[str, Any]:
+    """Send a multiple-choice quiz for `flashcard_id`, or the user's most overdue review, or the latest card."""
+    storage = get_async_storage()
+    chat_id = str(chat_id)
+    if flashcard_id is None:
+        due = await storage.due_reviews(chat_id, int(time.time()), 1)
+        flashcard_id = due[0]["flashcard_id"] if due else None
+    pool = await storage.list_flashcards(limit=_DISTRACTOR_POOL, columns=["italian_text", "english_translation"])
+    card = await storage.get_flashcard(flashcard_id) if flashcard_id is not None else (pool[0] if pool else None)
+    if card is None:
+        raise LookupError(f"Flashcard {flashcard_id} not found" if flashcard_id is not None else "No flashcards yet")
+
+    options = build_options(card, pool, settings.quiz_options)
+    keyboard = {
+        "inline_keyboard": [
+            [{"text": text, "callback_data": f"{CALLBACK_PREFIX}:{card['id']}:{option_id}"}] for option_id, text in options
+        ]
+    }
+    response = await send_telegram_message_async(
+        f"🇮🇹 What does “{card['italian_text']}” mean?", chat_id=chat_id, reply_markup=keyboard
+    )
+    count("quiz_sent_total")
+    return {
+        "chat_id": chat_id,
+        "flashcard_id": card["id"],
+        "message_id": (response.get("result") or {}).get("message_id"),
+        "options": [text for _, text in options],
+    }
+
+
+def build_options(card: dict[str, Any], pool: list[dict[str, Any]], size: int) -> list[tuple[int, str]]:
+    """(flashcard_id, translation) for the card and up to `size - 1` distinct distractors, shuffled."""
+    answer = (card.get("english_translation") or "").strip()
+    seen = {answer.lower()}
+    distractors = []
+    for other in random.sample(pool, len(pool)):
+        text = (other.get("english_translation") or "").strip()
+        if other["id"] != card["id"] and text and text.lower() not in seen:
+            seen.add(text.lower())
+            distractors.append((other["id"], text))
+    if not answer or not distractors:
+        raise ValueError("A quiz needs the card's translation and at least one other flashcard to compare with")
+    options = [(card["id"], answer), *distractors[:max(1, size - 1)]]
+    random.shuffle(options)
+    return options
+
+
+class _RecentKeys:
+    """Set of the last `capacity` keys added; older ones are forgotten in insertion order."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._keys: set[Hashable] = set()
+        self._order: deque[Hashable] = deque()
+
+    def add(self, key: Hashable) -> bool:
+        """Remember `key`; False when it was already there."""
+        if key in self._keys:
+            return False
+        self._keys.add(key)
+        self._order.append(key)
+        if len(self._order) > self.capacity:
+            self._keys.discard(self._order.popleft())
+        return True
+
+
+class QuizIngest:
+    """Webhook-side buffer: dedups and grades updates in memory, writes answers in batches."""
+
+    def __init__(self, dedup_window: int) -> None:
+        self._updates = _RecentKeys(dedup_window)
+        self._answered = _RecentKeys(dedup_window)
+        self._pending: list[dict[str, Any]] = []
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._commands: set[asyncio.Task] = set()
+        self.stats = {
+            "updates": 0, "duplicates": 0, "answers": 0, "repeat_presses": 0, "ignored": 0,
+            "written": 0, "flushes": 0, "flush_errors": 0,
+        }
+
+    def submit(self, update: dict[str, Any]) -> dict[str, Any] | None:
+        """Take one update; returns the Bot API method to reply with, if any."""
+        self.stats["updates"] += 1
+        update_id = update.get("update_id")
+        if not isinstance(update_id, int) or not self._updates.add(update_id):
+            self.stats["duplicates"] += 1
+            return None
+        if update.get("callback_query"):
+            return self._answer(update_id, update["callback_query"])
+        message = update.get("message") or {}
+        if (message.get("text") or "").split("@")[0].strip() == "/quiz" and message.get("chat"):
+            self._run_command(send_quiz_async(str(message["chat"]["id"])))
+            return None
+        self.stats["ignored"] += 1
+        return None
+
+    def _answer(self, update_id: int, query: dict[str, Any]) -> dict[str, Any]:
+        reply = {"method": "answerCallbackQuery", "callback_query_id": query.get("id")}
+        message = query.get("message") or {}
+        chat_id = (message.get("chat") or {}).get("id")
+        prefix, _, rest = (query.get("data") or "").partition(":")
+        try:
+            flashcard_id, chosen_id = (int(part) for part in rest.split(":"))
+        except ValueError:
+            flashcard_id = chosen_id = None
+        if prefix != CALLBACK_PREFIX or flashcard_id is None or chat_id is None or "message_id" not in message:
+            self.stats["ignored"] += 1
+            return reply
+        if not self._answered.add((str(chat_id), message["message_id"])):
+            self.stats["repeat_presses"] += 1
+            return {**reply, "text": "You already answered this one."}
+
+        correct = chosen_id == flashcard_id
+        self._pending.append({
+            "chat_id": str(chat_id),
+            "message_id": message["message_id"],
+            "update_id": update_id,
+            "flashcard_id": flashcard_id,
+            "chosen_flashcard_id": chosen_id,
+            "correct": correct,
+            "answered_at": int(time.time()),
+        })
+        self.stats["answers"] += 1
+        if len(self._pending) >= settings.quiz_flush_rows and self._wake is not None:
+            self._wake.set()
+        return {**reply, "text": "✅ Corretto!" if correct else "❌ Not quite."}
+
+    def _run_command(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._commands.add(task)
+        task.add_done_callback(self._command_done)
+
+    def _command_done(self, task: asyncio.Task) -> None:
+        self._commands.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Telegram command failed: {task.exception()}")
+
+    # --- writing ---
+
+    def ensure_flusher(self) -> None:
+        """Start the periodic flush on the running loop (once)."""
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._flush_forever())
+
+    async def _flush_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.quiz_flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write every buffered answer; returns how many were new."""
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+        storage = get_async_storage()
+        with span("quiz_flush", answers=len(batch)):
+            try:
+                # Answers to deleted (or forged) cards would fail the whole insert
+                known = {card["id"] for card in await storage.get_flashcards(sorted({row["flashcard_id"] for row in batch}))}
+                inserted = await storage.record_quiz_answers([row for row in batch if row["flashcard_id"] in known])
+            except BaseException as e:
+                self._pending[:0] = batch
+                del self._pending[:-_MAX_PENDING]
+                if not isinstance(e, Exception):
+                    # Cancelled mid-write (shutdown): the batch stays queued for the final flush
+                    raise
+                self.stats["flush_errors"] += 1
+                print(f"⚠️ Could not write {len(batch)} quiz answers; retrying on the next flush: {e}")
+                return 0
+            self.stats["flushes"] += 1
+            self.stats["written"] += len(inserted)
+            count("quiz_answers_total", len(inserted), result="written")
+            count("quiz_answers_total", len(batch) - len(inserted), result="dropped")
+            if inserted:
+                # One grade per card and user per batch (the latest), so rapid repeat quizzes do not compound
+                latest = {
+                    (row["chat_id"], row["flashcard_id"]): row
+                    for row in sorted(inserted, key=lambda row: (row["answered_at"], row["update_id"]))
+                }
+                try:
+                    await asyncio.to_thread(record_reviews, [
+                        (row["chat_id"], row["flashcard_id"], CORRECT_GRADE if row["correct"] else WRONG_GRADE,
+                         row["answered_at"])
+                        for row in latest.values()
+                    ], only_due=True)
+                except Exception as e:
+                    print(f"⚠️ Quiz answers saved, but review states were not updated: {e}")
+        return len(inserted)
+
+    async def close(self) -> None:
+        """Stop the periodic flush, then write whatever is still buffered."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            # Wait for an in-flight flush to put its batch back before the last one
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await self.flush()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats, "pending": len(self._pending), "flusher_running": bool(self._task and not self._task.done())}
+
+
+_ingest: QuizIngest | None = None
+
+
+def get_quiz_ingest() -> QuizIngest:
+    global _ingest
+    if _ingest is None:
+        _ingest = QuizIngest(settings.quiz_dedup_window)
+    return _ingest
+
+
+def quiz_ingest_stats() -> dict[str, Any] | None:
+    return _ingest.snapshot() if _ingest is not None else None
+
+
+async def close_quiz_ingest_async() -> None:
+    if _ingest is not None:
+        await _ingest.close()
+
+
+async def quiz_results_async(chat_id: str, limit: int = 20) -> dict[str, Any]:
+    results = await get_async_storage().quiz_results(str(chat_id), limit)
+    answered = results["answered"]
+    return {
+        "chat_id": str(chat_id),
+        **results,
+        "accuracy": round(results["correct"] / answered, 3) if answered else None,
+    }
+
+
+async def set_webhook_async(url: str) -> dict[str, Any]:
+    """Point the bot at `url`, with TELEGRAM_WEBHOOK_SECRET and only the update types used here."""
+    from app.clients import get_async_telegram_http
+
+    payload = {"url": url, "allowed_updates": ["message", "callback_query"], "max_connections": 100}
+    if settings.telegram_webhook_secret:
+        payload["secret_token"] = settings.telegram_webhook_secret
+    response = await get_async_telegram_http().post("/setWebhook", json=payload)
+    response.raise_for_status()
+    return response.json()
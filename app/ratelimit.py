@@ -0,0 +1,72 @@
+"""Asyncio token buckets for outbound rate limits (Telegram, OpenAI).
+
+Buckets are shared process-wide, so they hold no asyncio primitives: callers
+on different event loops (the server's, the run_sync portal) draw from the
+same bucket.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """`rate` tokens per second, bursting up to `capacity`.
+
+    Waiters are served in arrival order: each acquire reserves its tokens
+    (the balance may go negative) and sleeps until they have refilled.
+    `pause(seconds)` blocks every acquirer, e.g. when the server answers 429
+    with retry_after.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+        while (paused := self._paused_until - time.monotonic()) > 0:
+            await asyncio.sleep(paused)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class KeyedTokenBuckets:
+    """One TokenBucket per key (e.g. per chat), keeping only the most recent `max_keys`."""
+
+    def __init__(self, rate: float, capacity: float | None = None, max_keys: int = 10_000) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+    async def acquire(self, key: str, tokens: float = 1.0) -> None:
+        await self.bucket(key).acquire(tokens)
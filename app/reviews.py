@@ -0,0 +1,164 @@
+"""Per-user spaced repetition (SM-2).
+
+Every (chat_id, flashcard_id) pair a user has started has one small review row:
+ease in thousandths, interval in days, repetition and lapse counters, and
+due_at as epoch seconds. Finding what is due reads the (chat_id, due_at) or
+(due_at, ...) index, so the cost grows with the number of due cards, not with
+the number of users and cards.
+
+Reading a session never writes. New cards are started by a separate call,
+`introduce_new_cards`: the stored flashcards the user has not started yet, in
+id order after the highest flashcard_id they already have, at most
+REVIEWS_NEW_PER_DAY in any 24 hours (counted from `introduced_at`). When the
+stored deck runs out, `generate=True` renders the next beginner term as a new
+flashcard with status 'study': stored, but never sent to a chat, so it stays
+out of the delivery history.
+"""
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterator
+
+from app.config import settings
+from app.storage import get_storage
+
+DAY = 86_400
+STUDY_STATUS = "study"
+DEFAULT_EASE = 2500
+MIN_EASE = 1300
+
+
+@dataclass(slots=True)
+class ReviewState:
+    chat_id: str
+    flashcard_id: int
+    ease: int = DEFAULT_EASE
+    interval_days: int = 0
+    repetitions: int = 0
+    lapses: int = 0
+    due_at: int = 0
+    reviewed_at: int | None = None
+    introduced_at: int | None = None
+
+
+def schedule(state: ReviewState, grade: int, now: int | None = None) -> ReviewState:
+    """Apply one SM-2 answer (grade 0-5; below 3 is a lapse) and return the next state."""
+    if not 0 <= grade <= 5:
+        raise ValueError("grade must be between 0 and 5")
+    now = int(time.time()) if now is None else now
+
+    if grade < 3:
+        repetitions, interval, lapses = 0, 1, state.lapses + 1
+    else:
+        repetitions, lapses = state.repetitions + 1, state.lapses
+        if repetitions == 1:
+            interval = 1
+        elif repetitions == 2:
+            interval = 6
+        else:
+            interval = max(1, round(state.interval_days * state.ease / 1000))
+
+    miss = 5 - grade
+    ease = max(MIN_EASE, state.ease + round(1000 * (0.1 - miss * (0.08 + miss * 0.02))))
+    return ReviewState(
+        chat_id=state.chat_id,
+        flashcard_id=state.flashcard_id,
+        ease=ease,
+        interval_days=interval,
+        repetitions=repetitions,
+        lapses=lapses,
+        due_at=now + interval * DAY,
+        reviewed_at=now,
+        introduced_at=state.introduced_at,
+    )
+
+
+def record_review(chat_id: str, flashcard_id: int, grade: int, now: int | None = None) -> dict[str, Any]:
+    """Grade a card for a user (starting it if needed) and persist the new state."""
+    return record_reviews([(str(chat_id), flashcard_id, grade, now)])[0]
+
+
+def record_reviews(answers: list[tuple[str, int, int, int | None]], only_due: bool = False) -> list[dict[str, Any]]:
+    """Apply many (chat_id, flashcard_id, grade, now) answers in order with one read and one write.
+
+    With `only_due`, a passing grade for a card that is not due yet leaves it
+    as it is (lapses still count), so extra practice does not push cards out.
+    """
+    storage = get_storage()
+    states = {
+        (row["chat_id"], row["flashcard_id"]): ReviewState(**row)
+        for row in storage.get_reviews([(chat_id, flashcard_id) for chat_id, flashcard_id, _, _ in answers])
+    }
+    results = []
+    for chat_id, flashcard_id, grade, now in answers:
+        key = (str(chat_id), flashcard_id)
+        now = int(time.time()) if now is None else now
+        state = states.get(key) or ReviewState(*key, introduced_at=now)
+        if not (only_due and grade >= 3 and state.due_at > now):
+            states[key] = schedule(state, grade, now)
+        else:
+            states[key] = state
+        results.append(asdict(states[key]))
+    storage.save_reviews([asdict(state) for state in states.values()])
+    return results
+
+
+def introduce_new_cards(chat_id: str, count: int, now: int | None = None, generate: bool = False) -> list[dict[str, Any]]:
+    """Start up to `count` cards the user has not seen, due immediately, within the daily new-card limit."""
+    chat_id = str(chat_id)
+    now = int(time.time()) if now is None else now
+    storage = get_storage()
+    count = min(count, settings.reviews_new_per_day - storage.count_introduced_since(chat_id, now - DAY))
+    if count <= 0:
+        return []
+    cards = storage.list_new_flashcards(storage.last_introduced_flashcard_id(chat_id), count)
+    if generate and len(cards) < count:
+        cards.extend(_generate_study_cards(count - len(cards)))
+    storage.save_reviews([asdict(ReviewState(chat_id, card["id"], due_at=now, introduced_at=now)) for card in cards])
+    return cards
+
+
+def _generate_study_cards(count: int) -> list[dict[str, Any]]:
+    """Claim the next beginner terms and store them as text-only cards that were never sent."""
+    from app.flashcards import build_linguistic_content, claim_next_terms
+
+    storage = get_storage()
+    cards = []
+    for term in claim_next_terms(count, "beginner"):
+        content = build_linguistic_content(term)
+        cards.append(storage.insert_flashcard({
+            **{field: content[field] for field in ("italian_text", "phonetic", "english_translation", "example_sentence")},
+            "difficulty": "beginner",
+            "status": STUDY_STATUS,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }))
+    return cards
+
+
+def review_session(chat_id: str, limit: int = 20, now: int | None = None) -> dict[str, Any]:
+    """Today's due reviews for one user, most overdue first. Read-only."""
+    chat_id = str(chat_id)
+    now = int(time.time()) if now is None else now
+    storage = get_storage()
+    due = storage.due_reviews(chat_id, now, limit)
+    cards = {card["id"]: card for card in storage.get_flashcards([row["flashcard_id"] for row in due])}
+    return {
+        "chat_id": chat_id,
+        "due": [{**cards[row["flashcard_id"]], "review": row} for row in due if row["flashcard_id"] in cards],
+        "new_remaining_today": max(0, settings.reviews_new_per_day - storage.count_introduced_since(chat_id, now - DAY)),
+    }
+
+
+def iter_due_reviews(now: int | None = None, page_size: int = 1000) -> Iterator[dict[str, Any]]:
+    """Every user's due review rows, oldest due first, read page by page from the due index."""
+    now = int(time.time()) if now is None else now
+    storage = get_storage()
+    after = None
+    while True:
+        page = storage.due_reviews_page(now, after, page_size)
+        yield from page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+        after = (last["due_at"], last["chat_id"], last["flashcard_id"])
+
@@ -0,0 +1,40 @@
+"""Pluggable storage backends. Use `get_storage()` rather than a backend directly."""
+import threading
+
+from app.config import settings
+from app.storage.aio import AsyncStorage
+from app.storage.base import Storage
+
+_storage: Storage | None = None
+_lock = threading.Lock()
+
+
+def resolve_backend_name() -> str:
+    backend = settings.storage_backend.lower()
+    if backend == "auto":
+        return "supabase" if settings.supabase_url and settings.supabase_key else "sqlite"
+    return backend
+
+
+def get_storage() -> Storage:
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                backend = resolve_backend_name()
+                if backend == "supabase":
+                    from app.storage.supabase_backend import SupabaseStorage
+                    _storage = SupabaseStorage()
+                elif backend == "sqlite":
+                    from app.storage.sqlite_backend import SQLiteStorage
+                    _storage = SQLiteStorage(settings.db_path)
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {settings.storage_backend!r} (expected auto, supabase or sqlite)")
+    return _storage
+
+
+def get_async_storage() -> AsyncStorage:
+    return AsyncStorage(get_storage())
+
+
+__all__ = ["AsyncStorage", "Storage", "get_async_storage", "get_storage", "resolve_backend_name"]
@@ -0,0 +1,29 @@
+import asyncio
+import functools
+from typing import Any
+
+from app.storage.base import Storage
+
+
+class AsyncStorage:
+    """Awaitable view of a Storage backend.
+
+    Each call runs the blocking backend method on the default thread pool, so
+    Supabase round trips and SQLite writes never stall the event loop. Method
+    names and signatures mirror Storage: `await storage.insert_flashcard(row)`.
+    """
+
+    def __init__(self, storage: Storage) -> None:
+        self.sync = storage
+        self.name = storage.name
+
+    def __getattr__(self, name: str) -> Any:
+        method = getattr(self.sync, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
@@ -0,0 +1,289 @@
+import re
+import unicodedata
+from abc import ABC, abstractmethod
+from typing import Any
+
+_APOSTROPHES = str.maketrans({"\u2019": "'", "\u2018": "'", "\u02bc": "'", "`": "'", "\u00b4": "'"})
+_SPACES = re.compile(r"\s+")
+
+
+def clean_term(text: str) -> str:
+    """Canonical spelling: NFC, one kind of apostrophe, single spaces."""
+    return _SPACES.sub(" ", unicodedata.normalize("NFC", text).translate(_APOSTROPHES)).strip()
+
+
+def normalize_term(text: str) -> str:
+    """Dedup key for source_terms.term_key and the content cache.
+
+    Case-insensitive but accent-sensitive ("e" and "è" differ).
+    """
+    return clean_term(text).lower()
+
+
+class Storage(ABC):
+    """Persistence for source_terms, flashcards, delivery records and caches.
+
+    Implementations: SupabaseStorage (remote PostgREST) and SQLiteStorage
+    (local file in WAL mode). Rows are plain dicts shaped like the Supabase
+    tables so callers never care which backend is active.
+    """
+
+    name: str = "base"
+
+    @abstractmethod
+    def init(self) -> None:
+        """Create or migrate the schema. Safe to call on every startup."""
+
+    # --- source_terms ---
+
+    @abstractmethod
+    def count_source_terms(self) -> int:
+        ...
+
+    @abstractmethod
+    def source_term_hashes(self, term_keys: list[str]) -> dict[str, str | None]:
+        """content_hash of the stored terms among `term_keys` (None for rows imported before hashes existed)."""
+
+    @abstractmethod
+    def upsert_source_terms(self, rows: list[dict[str, Any]]) -> None:
+        """Insert or update by term_key (term_key, italian_text, category, difficulty, content_hash).
+
+        The used/used_at state of existing terms is kept.
+        """
+
+    @abstractmethod
+    def list_source_terms(self, difficulty: str, after_id: int | None, limit: int) -> list[dict[str, Any]]:
+        """Terms of one difficulty in id order after `after_id` (keyset paging), used or not."""
+
+    @abstractmethod
+    def mark_terms_used(self, term_ids: list[int], used_at: str, not_used_after: str) -> list[int]:
+        """Set used/used_at on the terms whose used_at is empty or not after `not_used_after`; returns their ids."""
+
+    @abstractmethod
+    def claim_terms(self, difficulty: str, count: int) -> list[dict[str, Any]]:
+        """Atomically mark up to `count` unused terms used, recycling when the deck is empty."""
+
+    # --- flashcards ---
+
+    @abstractmethod
+    def insert_flashcard(self, row: dict[str, Any]) -> dict[str, Any]:
+        """Insert a flashcard and return the stored row (including its id)."""
+
+    @abstractmethod
+    def update_flashcard(self, flashcard_id: int, fields: dict[str, Any]) -> None:
+        ...
+
+    @abstractmethod
+    def get_flashcard(self, flashcard_id: int) -> dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def list_flashcards(
+        self,
+        limit: int = 100,
+        before: tuple[str, int] | None = None,
+        columns: list[str] | None = None,
+        after: tuple[str, int] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Most recent first (created_at, id). Cards never sent to a chat (status 'ready' or 'study') are excluded.
+
+        `before` is the (created_at, id) of the last row of the previous page (keyset
+        pagination). `columns` limits the selected columns; id and created_at are always included.
+        With `after` instead, rows after that position are returned oldest first (exports).
+        """
+
+    @abstractmethod
+    def count_ready_flashcards(self) -> int:
+        ...
+
+    @abstractmethod
+    def pop_ready_flashcard(self) -> dict[str, Any] | None:
+        """Atomically take the oldest status='ready' card, marking it sent. None when the buffer is empty.
+
+        created_at and sent_at are set to now, so the card sorts in send order, not generation order.
+        """
+
+    @abstractmethod
+    def find_image_url(self, image_key: str) -> str | None:
+        """image_url of the latest flashcard rendered from the given image-store key."""
+
+    # --- deliveries ---
+
+    @abstractmethod
+    def record_delivery(
+        self,
+        flashcard_id: int | None,
+        channel: str,
+        chat_id: str | None,
+        status: str,
+        message_id: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        ...
+
+    @abstractmethod
+    def record_deliveries(self, rows: list[dict[str, Any]]) -> None:
+        """Bulk insert of delivery rows (flashcard_id, channel, chat_id, status, message_id, error)."""
+
+    @abstractmethod
+    def delivered_chat_ids(self, flashcard_id: int) -> set[str]:
+        """Chats that already received this flashcard (any status starting with 'sent')."""
+
+    # --- subscribers ---
+
+    @abstractmethod
+    def upsert_subscriber(self, chat_id: str, active: bool = True) -> None:
+        ...
+
+    @abstractmethod
+    def list_subscribers(self, after: str | None = None, limit: int = 1000) -> list[str]:
+        """Active subscriber chat_ids in chat_id order, starting after `after` (keyset paging)."""
+
+    @abstractmethod
+    def set_subscriber_schedule(self, chat_id: str, timezone: str | None, delivery_time: str | None) -> None:
+        """Per-subscriber IANA timezone and local "HH:MM" delivery time (None = the global default)."""
+
+    @abstractmethod
+    def list_subscriber_schedules(self, after: str | None = None, limit: int = 1000) -> list[dict[str, Any]]:
+        """Active subscribers' chat_id, timezone and delivery_time in chat_id order (keyset paging)."""
+
+    @abstractmethod
+    def list_subscriber_changes(self, since: str, limit: int = 1000) -> list[dict[str, Any]]:
+        """Subscribers (active or not) with updated_at >= `since`: chat_id, active, timezone, delivery_time."""
+
+    @abstractmethod
+    def count_subscribers(self) -> int:
+        """Active subscribers."""
+
+    # --- reviews (spaced repetition) ---
+
+    @abstractmethod
+    def get_flashcards(self, flashcard_ids: list[int]) -> list[dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def list_new_flashcards(self, after_id: int | None, limit: int) -> list[dict[str, Any]]:
+        """Non-ready flashcards (delivered, or generated for study) with id > `after_id`, in id order."""
+
+    @abstractmethod
+    def get_review(self, chat_id: str, flashcard_id: int) -> dict[str, Any] | None:
+        ...
+
+    @abstractmethod
+    def get_reviews(self, keys: list[tuple[str, int]]) -> list[dict[str, Any]]:
+        """Review states for many (chat_id, flashcard_id) pairs; pairs without one are absent."""
+
+    @abstractmethod
+    def save_reviews(self, rows: list[dict[str, Any]]) -> None:
+        """Upsert review states keyed by (chat_id, flashcard_id)."""
+
+    @abstractmethod
+    def due_reviews(self, chat_id: str, now: int, limit: int) -> list[dict[str, Any]]:
+        """One user's reviews with due_at <= `now` (epoch seconds), most overdue first."""
+
+    @abstractmethod
+    def due_reviews_page(self, now: int, after: tuple[int, str, int] | None, limit: int) -> list[dict[str, Any]]:
+        """All users' due reviews ordered by (due_at, chat_id, flashcard_id), after that key."""
+
+    @abstractmethod
+    def last_introduced_flashcard_id(self, chat_id: str) -> int | None:
+        """Highest flashcard_id this user has a review state for."""
+
+    @abstractmethod
+    def count_introduced_since(self, chat_id: str, since: int) -> int:
+        """Review states this user started at or after `since` (epoch seconds)."""
+
+    # --- jobs (durable queue) ---
+
+    @abstractmethod
+    def enqueue_job(self, row: dict[str, Any]) -> dict[str, Any]:
+        """Insert a queued job (kind, job_key, payload, run_at, max_attempts).
+
+        A job_key that already exists is not enqueued twice; the existing row is returned.
+        """
+
+    @abstractmethod
+    def lease_jobs(self, worker_id: str, now: str, lease_until: str, limit: int) -> list[dict[str, Any]]:
+        """Atomically take due queued jobs, or running jobs whose lease expired, and count an attempt."""
+
+    @abstractmethod
+    def finish_job(
+        self, job_id: int, worker_id: str, status: str, error: str | None = None, run_at: str | None = None
+    ) -> bool:
+        """Move a leased job to done, queued (retry at `run_at`) or dead. False if the lease was lost."""
+
+    @abstractmethod
+    def requeue_job(self, job_id: int, run_at: str) -> bool:
+        """Give a dead job a fresh set of attempts."""
+
+    @abstractmethod
+    def count_jobs(self) -> dict[str, int]:
+        """Number of jobs per status."""
+
+    # --- quiz answers ---
+
+    @abstractmethod
+    def record_quiz_answers(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Insert answers; the first per (chat_id, message_id) wins. Returns the rows actually inserted."""
+
+    @abstractmethod
+    def quiz_results(self, chat_id: str, limit: int = 20) -> dict[str, Any]:
+        """One user's answered and correct counts plus their latest `limit` answers."""
+
+    # --- leases and scheduled runs ---
+
+    @abstractmethod
+    def acquire_lease(self, name: str, holder: str, now: str, expires_at: str) -> bool:
+        """Take or renew lease `name` until `expires_at` if it is free, expired at `now` or already `holder`'s."""
+
+    @abstractmethod
+    def release_lease(self, name: str, holder: str) -> None:
+        """Give up the lease if `holder` still has it."""
+
+    @abstractmethod
+    def claim_run(self, run_key: str, holder: str, now: str, stale_before: str) -> bool:
+        """Start `run_key` once. Also True when its last attempt failed or went quiet before `stale_before`."""
+
+    @abstractmethod
+    def finish_run(self, run_key: str, holder: str, status: str, result: dict[str, Any] | None, error: str | None) -> None:
+        """Mark `holder`'s claimed run done or failed."""
+
+    @abstractmethod
+    def get_run(self, run_key: str) -> dict[str, Any] | None:
+        ...
+
+    # --- content_cache ---
+
+    @abstractmethod
+    def get_cached_content(self, cache_key: str, now: str) -> dict[str, str] | None:
+        """Return the cached content if present and not expired at `now`; refreshes last_used_at."""
+
+    @abstractmethod
+    def put_cached_content(self, entry: dict[str, Any]) -> None:
+        """Upsert a content_cache row (`content` is a dict)."""
+
+    @abstractmethod
+    def put_cached_contents(self, entries: list[dict[str, Any]]) -> None:
+        """Bulk form of put_cached_content."""
+
+    @abstractmethod
+    def get_cached_contents(self, cache_keys: list[str], now: str) -> dict[str, dict[str, str]]:
+        """Bulk form of get_cached_content, keyed by cache_key; misses are absent."""
+
+    @abstractmethod
+    def evict_cached_content(self, max_entries: int, now: str) -> int:
+        """Drop expired rows, then least-recently-used rows beyond `max_entries`. Returns rows removed."""
+
+    # --- telegram_files ---
+
+    @abstractmethod
+    def get_telegram_file_id(self, image_hash: str) -> str | None:
+        ...
+
+    @abstractmethod
+    def save_telegram_file(self, image_hash: str, file_id: str, flashcard_id: int | None) -> None:
+        """Upsert the Telegram file_id for an image's sha256."""
+
+    @abstractmethod
+    def delete_telegram_file(self, image_hash: str, file_id: str) -> None:
+        """Forget a file_id Telegram rejected (only if it is still the stored one)."""
@@ -0,0 +1,788 @@
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+from app.storage.base import Storage, normalize_term
+
+# Applied in order; PRAGMA user_version records how many have run.
+MIGRATIONS: list[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS source_terms (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        italian_text TEXT NOT NULL,
+        category TEXT NOT NULL DEFAULT 'general',
+        difficulty TEXT NOT NULL DEFAULT 'beginner',
+        used INTEGER NOT NULL DEFAULT 0,
+        used_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS source_terms_difficulty_used_id_idx ON source_terms (difficulty, used, id);
+
+    CREATE TABLE IF NOT EXISTS flashcards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        italian_text TEXT NOT NULL,
+        phonetic TEXT,
+        english_translation TEXT,
+        example_sentence TEXT,
+        difficulty TEXT,
+        image_url TEXT,
+        prompt_used TEXT,
+        sent_channel TEXT,
+        sent_at TEXT,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS flashcards_created_at_idx ON flashcards (created_at);
+
+    CREATE TABLE IF NOT EXISTS deliveries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        flashcard_id INTEGER REFERENCES flashcards (id),
+        channel TEXT NOT NULL,
+        chat_id TEXT,
+        status TEXT NOT NULL,
+        message_id TEXT,
+        error TEXT,
+        created_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS deliveries_flashcard_id_idx ON deliveries (flashcard_id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS content_cache (
+        cache_key TEXT PRIMARY KEY,
+        term TEXT NOT NULL,
+        model TEXT NOT NULL,
+        prompt_version TEXT NOT NULL,
+        content TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        last_used_at TEXT NOT NULL,
+        expires_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS content_cache_last_used_at_idx ON content_cache (last_used_at);
+    CREATE INDEX IF NOT EXISTS content_cache_expires_at_idx ON content_cache (expires_at);
+    """,
+    """
+    ALTER TABLE flashcards ADD COLUMN image_key TEXT;
+    CREATE INDEX IF NOT EXISTS flashcards_image_key_idx ON flashcards (image_key);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS telegram_files (
+        image_hash TEXT PRIMARY KEY,
+        file_id TEXT NOT NULL,
+        flashcard_id INTEGER REFERENCES flashcards (id) ON DELETE SET NULL,
+        created_at TEXT NOT NULL
+    );
+    """,
+    """
+    ALTER TABLE flashcards ADD COLUMN status TEXT NOT NULL DEFAULT 'sent';
+    ALTER TABLE flashcards ADD COLUMN caption TEXT;
+    CREATE INDEX IF NOT EXISTS flashcards_status_id_idx ON flashcards (status, id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS subscribers (
+        chat_id TEXT PRIMARY KEY,
+        active INTEGER NOT NULL DEFAULT 1,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS subscribers_active_chat_id_idx ON subscribers (active, chat_id);
+    CREATE INDEX IF NOT EXISTS deliveries_flashcard_chat_idx ON deliveries (flashcard_id, chat_id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS reviews (
+        chat_id TEXT NOT NULL,
+        flashcard_id INTEGER NOT NULL,
+        ease INTEGER NOT NULL,
+        interval_days INTEGER NOT NULL,
+        repetitions INTEGER NOT NULL,
+        lapses INTEGER NOT NULL,
+        due_at INTEGER NOT NULL,
+        reviewed_at INTEGER,
+        PRIMARY KEY (chat_id, flashcard_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS reviews_chat_due_idx ON reviews (chat_id, due_at);
+    CREATE INDEX IF NOT EXISTS reviews_due_idx ON reviews (due_at, chat_id, flashcard_id);
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        job_key TEXT UNIQUE,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        run_at TEXT NOT NULL,
+        lease_until TEXT,
+        locked_by TEXT,
+        last_error TEXT,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status_run_at_idx ON jobs (status, run_at);
+    CREATE INDEX IF NOT EXISTS jobs_status_lease_until_idx ON jobs (status, lease_until);
+    """,
+    """
+    ALTER TABLE source_terms ADD COLUMN term_key TEXT;
+    ALTER TABLE source_terms ADD COLUMN content_hash TEXT;
+    UPDATE source_terms SET term_key = normalize_term(italian_text);
+    -- Duplicates already in the deck keep their rows; only the oldest one is keyed
+    UPDATE source_terms SET term_key = NULL
+    WHERE id NOT IN (SELECT MIN(id) FROM source_terms GROUP BY term_key);
+    CREATE UNIQUE INDEX IF NOT EXISTS source_terms_term_key_idx ON source_terms (term_key);
+    """,
+    """
+    ALTER TABLE subscribers ADD COLUMN timezone TEXT;
+    ALTER TABLE subscribers ADD COLUMN delivery_time TEXT;
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS scheduled_runs (
+        run_key TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 1,
+        result TEXT,
+        error TEXT,
+        started_at TEXT NOT NULL,
+        finished_at TEXT
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quiz_answers (
+        chat_id TEXT NOT NULL,
+        message_id INTEGER NOT NULL,
+        update_id INTEGER NOT NULL,
+        flashcard_id INTEGER NOT NULL,
+        chosen_flashcard_id INTEGER NOT NULL,
+        correct INTEGER NOT NULL,
+        answered_at INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, message_id)
+    );
+    CREATE INDEX IF NOT EXISTS quiz_answers_chat_answered_idx ON quiz_answers (chat_id, answered_at);
+    """,
+    """
+    ALTER TABLE reviews ADD COLUMN introduced_at INTEGER;
+    CREATE INDEX IF NOT EXISTS reviews_chat_introduced_idx ON reviews (chat_id, introduced_at);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS subscribers_updated_at_idx ON subscribers (updated_at);
+    """,
+]
+
+REVIEW_COLUMNS = (
+    "chat_id", "flashcard_id", "ease", "interval_days", "repetitions", "lapses", "due_at", "reviewed_at", "introduced_at",
+)
+
+QUIZ_ANSWER_COLUMNS = (
+    "chat_id", "message_id", "update_id", "flashcard_id", "chosen_flashcard_id", "correct", "answered_at",
+)
+_QUIZ_ANSWER_VALUES = ", ".join(f"json_extract(value, '$.{column}')" for column in QUIZ_ANSWER_COLUMNS)
+
+FLASHCARD_COLUMNS = (
+    "italian_text", "phonetic", "english_translation", "example_sentence", "difficulty",
+    "image_url", "image_key", "prompt_used", "sent_channel", "sent_at", "created_at", "status", "caption",
+)
+
+_CLAIM_SQL = """
+    UPDATE source_terms SET used = 1, used_at = ?
+    WHERE id IN (
+        SELECT id FROM source_terms
+        WHERE difficulty = ? AND used = 0
+        ORDER BY id
+        LIMIT ?
+    )
+    RETURNING id, italian_text, category, difficulty
+"""
+
+
+class SQLiteStorage(Storage):
+    """Local single-file storage in WAL mode, one connection per thread.
+
+    All statements are constant, parameterised SQL so sqlite3's statement
+    cache keeps them prepared across calls.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialised = False
+
+    # --- connection handling ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            conn.execute("PRAGMA busy_timeout=5000")
+            # Used by the term_key backfill migration
+            conn.create_function("normalize_term", 1, normalize_term, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def init(self) -> None:
+        if self._initialised:
+            return
+        with self._init_lock:
+            if self._initialised:
+                return
+            conn = self._connect()
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {number};\nCOMMIT;")
+                print(f"Applied SQLite migration {number} to {self.path}")
+            self._initialised = True
+
+    # --- source_terms ---
+
+    def count_source_terms(self) -> int:
+        self.init()
+        return self._connect().execute("SELECT COUNT(*) FROM source_terms").fetchone()[0]
+
+    def source_term_hashes(self, term_keys: list[str]) -> dict[str, str | None]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT term_key, content_hash FROM source_terms WHERE term_key IN (SELECT value FROM json_each(?))",
+            (json.dumps(term_keys),),
+        )
+        return {row["term_key"]: row["content_hash"] for row in rows}
+
+    def upsert_source_terms(self, rows: list[dict[str, Any]]) -> None:
+        self.init()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO source_terms (term_key, italian_text, category, difficulty, content_hash, used) "
+                "VALUES (?, ?, ?, ?, ?, 0) "
+                "ON CONFLICT (term_key) DO UPDATE SET italian_text = excluded.italian_text, "
+                "category = excluded.category, difficulty = excluded.difficulty, content_hash = excluded.content_hash "
+                "WHERE source_terms.content_hash IS NOT excluded.content_hash",
+                [
+                    (row["term_key"], row["italian_text"], row["category"], row["difficulty"], row["content_hash"])
+                    for row in rows
+                ],
+            )
+
+    def list_source_terms(self, difficulty: str, after_id: int | None, limit: int) -> list[dict[str, Any]]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT * FROM source_terms WHERE difficulty = ? AND id > ? ORDER BY id LIMIT ?",
+            (difficulty, after_id or 0, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def mark_terms_used(self, term_ids: list[int], used_at: str, not_used_after: str) -> list[int]:
+        self.init()
+        rows = self._connect().execute(
+            "UPDATE source_terms SET used = 1, used_at = ? "
+            "WHERE id IN (SELECT value FROM json_each(?)) AND (used_at IS NULL OR used_at <= ?) RETURNING id",
+            (used_at, json.dumps(term_ids), not_used_after),
+        ).fetchall()
+        return [row["id"] for row in rows]
+
+    def claim_terms(self, difficulty: str, count: int) -> list[dict[str, Any]]:
+        self.init()
+        now = _utc_now_iso()
+        with self._transaction() as conn:
+            claimed = _by_id(conn.execute(_CLAIM_SQL, (now, difficulty, count)))
+            missing = count - len(claimed)
+            if missing > 0:
+                # Deck exhausted: recycle everything except what we just claimed.
+                keep = [row["id"] for row in claimed]
+                conn.execute(
+                    f"UPDATE source_terms SET used = 0, used_at = NULL "
+                    f"WHERE difficulty = ? AND used = 1 AND id NOT IN ({','.join('?' * len(keep))})",
+                    (difficulty, *keep),
+                )
+                claimed += _by_id(conn.execute(_CLAIM_SQL, (now, difficulty, missing)))
+        return claimed
+
+    # --- flashcards ---
+
+    def insert_flashcard(self, row: dict[str, Any]) -> dict[str, Any]:
+        self.init()
+        values = {column: row.get(column) for column in FLASHCARD_COLUMNS}
+        values["created_at"] = values["created_at"] or _utc_now_iso()
+        values["status"] = values["status"] or "sent"
+        cursor = self._connect().execute(
+            f"INSERT INTO flashcards ({', '.join(FLASHCARD_COLUMNS)}) VALUES ({', '.join('?' * len(FLASHCARD_COLUMNS))})",
+            tuple(values.values()),
+        )
+        return {"id": cursor.lastrowid, **values}
+
+    def update_flashcard(self, flashcard_id: int, fields: dict[str, Any]) -> None:
+        self.init()
+        columns = [column for column in fields if column in FLASHCARD_COLUMNS]
+        if not columns:
+            return
+        self._connect().execute(
+            f"UPDATE flashcards SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+            (*(fields[column] for column in columns), flashcard_id),
+        )
+
+    def get_flashcard(self, flashcard_id: int) -> dict[str, Any] | None:
+        self.init()
+        row = self._connect().execute("SELECT * FROM flashcards WHERE id = ?", (flashcard_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list_flashcards(
+        self,
+        limit: int = 100,
+        before: tuple[str, int] | None = None,
+        columns: list[str] | None = None,
+        after: tuple[str, int] | None = None,
+    ) -> list[dict[str, Any]]:
+        self.init()
+        selected = "*"
+        if columns is not None:
+            selected = ", ".join(["id", "created_at", *(c for c in columns if c in FLASHCARD_COLUMNS and c != "created_at")])
+        where, params = "status NOT IN ('ready', 'study')", []
+        if before is not None:
+            where += " AND (created_at, id) < (?, ?)"
+            params.extend(before)
+        order = "DESC"
+        if after is not None:
+            where += " AND (created_at, id) > (?, ?)"
+            params.extend(after)
+            order = "ASC"
+        rows = self._connect().execute(
+            f"SELECT {selected} FROM flashcards WHERE {where} ORDER BY created_at {order}, id {order} LIMIT ?",
+            (*params, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def count_ready_flashcards(self) -> int:
+        self.init()
+        return self._connect().execute("SELECT COUNT(*) FROM flashcards WHERE status = 'ready'").fetchone()[0]
+
+    def pop_ready_flashcard(self) -> dict[str, Any] | None:
+        self.init()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "UPDATE flashcards SET status = 'sent', sent_at = ?1, created_at = ?1 "
+                "WHERE id = (SELECT id FROM flashcards WHERE status = 'ready' ORDER BY id LIMIT 1) "
+                "RETURNING *",
+                (_utc_now_iso(),),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def find_image_url(self, image_key: str) -> str | None:
+        self.init()
+        row = self._connect().execute(
+            "SELECT image_url FROM flashcards WHERE image_key = ? AND image_url IS NOT NULL ORDER BY id DESC LIMIT 1",
+            (image_key,),
+        ).fetchone()
+        return row["image_url"] if row else None
+
+    # --- deliveries ---
+
+    def record_delivery(
+        self,
+        flashcard_id: int | None,
+        channel: str,
+        chat_id: str | None,
+        status: str,
+        message_id: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        self.init()
+        self._connect().execute(
+            "INSERT INTO deliveries (flashcard_id, channel, chat_id, status, message_id, error, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (flashcard_id, channel, chat_id, status, message_id, error, _utc_now_iso()),
+        )
+
+    def record_deliveries(self, rows: list[dict[str, Any]]) -> None:
+        self.init()
+        now = _utc_now_iso()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO deliveries (flashcard_id, channel, chat_id, status, message_id, error, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (row.get("flashcard_id"), row.get("channel", "telegram"), row.get("chat_id"), row["status"],
+                     row.get("message_id"), row.get("error"), row.get("created_at") or now)
+                    for row in rows
+                ],
+            )
+
+    def delivered_chat_ids(self, flashcard_id: int) -> set[str]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT DISTINCT chat_id FROM deliveries WHERE flashcard_id = ? AND status LIKE 'sent%'", (flashcard_id,)
+        )
+        return {row["chat_id"] for row in rows}
+
+    # --- subscribers ---
+
+    def upsert_subscriber(self, chat_id: str, active: bool = True) -> None:
+        self.init()
+        now = _utc_now_iso()
+        self._connect().execute(
+            "INSERT INTO subscribers (chat_id, active, created_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (chat_id) DO UPDATE SET active = excluded.active, updated_at = excluded.updated_at",
+            (str(chat_id), int(active), now, now),
+        )
+
+    def list_subscribers(self, after: str | None = None, limit: int = 1000) -> list[str]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT chat_id FROM subscribers WHERE active = 1 AND chat_id > ? ORDER BY chat_id LIMIT ?",
+            (after or "", limit),
+        )
+        return [row["chat_id"] for row in rows]
+
+    def set_subscriber_schedule(self, chat_id: str, timezone: str | None, delivery_time: str | None) -> None:
+        self.init()
+        self._connect().execute(
+            "UPDATE subscribers SET timezone = ?, delivery_time = ?, updated_at = ? WHERE chat_id = ?",
+            (timezone, delivery_time, _utc_now_iso(), str(chat_id)),
+        )
+
+    def list_subscriber_schedules(self, after: str | None = None, limit: int = 1000) -> list[dict[str, Any]]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT chat_id, timezone, delivery_time FROM subscribers WHERE active = 1 AND chat_id > ? "
+            "ORDER BY chat_id LIMIT ?",
+            (after or "", limit),
+        )
+        return [dict(row) for row in rows]
+
+    def list_subscriber_changes(self, since: str, limit: int = 1000) -> list[dict[str, Any]]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT chat_id, active, timezone, delivery_time FROM subscribers WHERE updated_at >= ? "
+            "ORDER BY updated_at LIMIT ?",
+            (since, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def count_subscribers(self) -> int:
+        self.init()
+        return self._connect().execute("SELECT COUNT(*) FROM subscribers WHERE active = 1").fetchone()[0]
+
+    # --- reviews ---
+
+    def get_flashcards(self, flashcard_ids: list[int]) -> list[dict[str, Any]]:
+        if not flashcard_ids:
+            return []
+        self.init()
+        rows = self._connect().execute(
+            "SELECT * FROM flashcards WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(flashcard_ids),)
+        )
+        return _by_id(rows)
+
+    def list_new_flashcards(self, after_id: int | None, limit: int) -> list[dict[str, Any]]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT * FROM flashcards WHERE id > ? AND status != 'ready' ORDER BY id LIMIT ?", (after_id or 0, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def get_review(self, chat_id: str, flashcard_id: int) -> dict[str, Any] | None:
+        self.init()
+        row = self._connect().execute(
+            "SELECT * FROM reviews WHERE chat_id = ? AND flashcard_id = ?", (chat_id, flashcard_id)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_reviews(self, keys: list[tuple[str, int]]) -> list[dict[str, Any]]:
+        if not keys:
+            return []
+        self.init()
+        rows = self._connect().execute(
+            "SELECT r.* FROM json_each(?) AS k JOIN reviews AS r "
+            "ON r.chat_id = json_extract(k.value, '$[0]') AND r.flashcard_id = json_extract(k.value, '$[1]')",
+            (json.dumps([[str(chat_id), int(flashcard_id)] for chat_id, flashcard_id in keys]),),
+        )
+        return [dict(row) for row in rows]
+
+    def save_reviews(self, rows: list[dict[str, Any]]) -> None:
+        if not rows:
+            return
+        self.init()
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO reviews ({', '.join(REVIEW_COLUMNS)}) VALUES ({', '.join('?' * len(REVIEW_COLUMNS))})",
+                [tuple(row.get(column) for column in REVIEW_COLUMNS) for row in rows],
+            )
+
+    def due_reviews(self, chat_id: str, now: int, limit: int) -> list[dict[str, Any]]:
+        self.init()
+        rows = self._connect().execute(
+            "SELECT * FROM reviews WHERE chat_id = ? AND due_at <= ? ORDER BY due_at LIMIT ?", (chat_id, now, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def due_reviews_page(self, now: int, after: tuple[int, str, int] | None, limit: int) -> list[dict[str, Any]]:
+        self.init()
+        after = after or (-1, "", 0)
+        rows = self._connect().execute(
+            "SELECT * FROM reviews WHERE due_at <= ? AND (due_at, chat_id, flashcard_id) > (?, ?, ?) "
+            "ORDER BY due_at, chat_id, flashcard_id LIMIT ?",
+            (now, *after, limit),
+        )
+        return [dict(row) for row in rows]
+
+    def last_introduced_flashcard_id(self, chat_id: str) -> int | None:
+        self.init()
+        return self._connect().execute(
+            "SELECT MAX(flashcard_id) FROM reviews WHERE chat_id = ?", (chat_id,)
+        ).fetchone()[0]
+
+    def count_introduced_since(self, chat_id: str, since: int) -> int:
+        self.init()
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM reviews WHERE chat_id = ? AND introduced_at >= ?", (chat_id, since)
+        ).fetchone()[0]
+
+    # --- jobs ---
+
+    def enqueue_job(self, row: dict[str, Any]) -> dict[str, Any]:
+        self.init()
+        now = _utc_now_iso()
+        with self._transaction() as conn:
+            inserted = conn.execute(
+                "INSERT INTO jobs (kind, job_key, payload, max_attempts, run_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (job_key) DO NOTHING RETURNING *",
+                (row["kind"], row.get("job_key"), json.dumps(row["payload"]), row["max_attempts"], row["run_at"], now, now),
+            ).fetchone()
+            if inserted is None:
+                inserted = conn.execute("SELECT * FROM jobs WHERE job_key = ?", (row["job_key"],)).fetchone()
+        return _job(inserted)
+
+    def lease_jobs(self, worker_id: str, now: str, lease_until: str, limit: int) -> list[dict[str, Any]]:
+        self.init()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_by = ?, lease_until = ?, updated_at = ? "
+                "WHERE id IN ("
+                "  SELECT id FROM jobs WHERE status = 'queued' AND run_at <= ? "
+                "  UNION ALL "
+                "  SELECT id FROM jobs WHERE status = 'running' AND lease_until <= ? "
+                "  LIMIT ?"
+                ") RETURNING *",
+                (worker_id, lease_until, now, now, now, limit),
+            )
+            return sorted((_job(row) for row in rows), key=lambda job: job["run_at"])
+
+    def finish_job(
+        self, job_id: int, worker_id: str, status: str, error: str | None = None, run_at: str | None = None
+    ) -> bool:
+        self.init()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, last_error = ?, run_at = COALESCE(?, run_at), lease_until = NULL, "
+            "locked_by = NULL, updated_at = ? WHERE id = ? AND locked_by = ? AND status = 'running'",
+            (status, error, run_at, _utc_now_iso(), job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+    def requeue_job(self, job_id: int, run_at: str) -> bool:
+        self.init()
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = 'queued', attempts = 0, run_at = ?, updated_at = ? WHERE id = ? AND status = 'dead'",
+            (run_at, _utc_now_iso(), job_id),
+        )
+        return cursor.rowcount == 1
+
+    def count_jobs(self) -> dict[str, int]:
+        self.init()
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: count for status, count in rows}
+
+    # --- quiz answers ---
+
+    def record_quiz_answers(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        if not rows:
+            return []
+        self.init()
+        with self._transaction() as conn:
+            # WHERE true keeps SQLite from reading ON CONFLICT as part of the SELECT's join
+            inserted = conn.execute(
+                f"INSERT INTO quiz_answers ({', '.join(QUIZ_ANSWER_COLUMNS)}) SELECT {_QUIZ_ANSWER_VALUES} "
+                "FROM json_each(?) WHERE true ON CONFLICT DO NOTHING RETURNING *",
+                (json.dumps(rows),),
+            )
+            return [dict(row) for row in inserted]
+
+    def quiz_results(self, chat_id: str, limit: int = 20) -> dict[str, Any]:
+        self.init()
+        conn = self._connect()
+        answered, correct = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(correct), 0) FROM quiz_answers WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        recent = conn.execute(
+            "SELECT * FROM quiz_answers WHERE chat_id = ? ORDER BY answered_at DESC LIMIT ?", (chat_id, limit)
+        )
+        return {"answered": answered, "correct": correct, "recent": [dict(row) for row in recent]}
+
+    # --- leases and scheduled runs ---
+
+    def acquire_lease(self, name: str, holder: str, now: str, expires_at: str) -> bool:
+        self.init()
+        row = self._connect().execute(
+            "INSERT INTO leases (name, holder, expires_at, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at, "
+            "updated_at = excluded.updated_at "
+            "WHERE leases.holder = excluded.holder OR leases.expires_at <= ? "
+            "RETURNING name",
+            (name, holder, expires_at, now, now),
+        ).fetchone()
+        return row is not None
+
+    def release_lease(self, name: str, holder: str) -> None:
+        self.init()
+        self._connect().execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def claim_run(self, run_key: str, holder: str, now: str, stale_before: str) -> bool:
+        self.init()
+        row = self._connect().execute(
+            "INSERT INTO scheduled_runs (run_key, holder, status, started_at) VALUES (?, ?, 'running', ?) "
+            "ON CONFLICT (run_key) DO UPDATE SET holder = excluded.holder, status = 'running', "
+            "attempts = scheduled_runs.attempts + 1, error = NULL, started_at = excluded.started_at, finished_at = NULL "
+            "WHERE scheduled_runs.status = 'failed' OR (scheduled_runs.status = 'running' AND scheduled_runs.started_at <= ?) "
+            "RETURNING run_key",
+            (run_key, holder, now, stale_before),
+        ).fetchone()
+        return row is not None
+
+    def finish_run(self, run_key: str, holder: str, status: str, result: dict[str, Any] | None, error: str | None) -> None:
+        self.init()
+        self._connect().execute(
+            "UPDATE scheduled_runs SET status = ?, result = ?, error = ?, finished_at = ? WHERE run_key = ? AND holder = ?",
+            (status, json.dumps(result) if result is not None else None, error, _utc_now_iso(), run_key, holder),
+        )
+
+    def get_run(self, run_key: str) -> dict[str, Any] | None:
+        self.init()
+        row = self._connect().execute("SELECT * FROM scheduled_runs WHERE run_key = ?", (run_key,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run["result"] = json.loads(run["result"]) if run["result"] else None
+        return run
+
+    # --- content_cache ---
+
+    def get_cached_content(self, cache_key: str, now: str) -> dict[str, str] | None:
+        self.init()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT content FROM content_cache WHERE cache_key = ? AND expires_at > ?", (cache_key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE content_cache SET last_used_at = ? WHERE cache_key = ?", (now, cache_key))
+        return json.loads(row["content"])
+
+    def put_cached_content(self, entry: dict[str, Any]) -> None:
+        self.put_cached_contents([entry])
+
+    def put_cached_contents(self, entries: list[dict[str, Any]]) -> None:
+        self.init()
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO content_cache (cache_key, term, model, prompt_version, content, created_at, last_used_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (cache_key) DO UPDATE SET content = excluded.content, "
+                "last_used_at = excluded.last_used_at, expires_at = excluded.expires_at",
+                [
+                    (
+                        entry["cache_key"], entry["term"], entry["model"], entry["prompt_version"],
+                        json.dumps(entry["content"], ensure_ascii=False),
+                        entry["created_at"], entry["last_used_at"], entry["expires_at"],
+                    )
+                    for entry in entries
+                ],
+            )
+
+    def get_cached_contents(self, cache_keys: list[str], now: str) -> dict[str, dict[str, str]]:
+        self.init()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT cache_key, content FROM content_cache "
+                "WHERE cache_key IN (SELECT value FROM json_each(?)) AND expires_at > ?",
+                (json.dumps(cache_keys), now),
+            ).fetchall()
+            found = {row["cache_key"]: json.loads(row["content"]) for row in rows}
+            if found:
+                conn.execute(
+                    "UPDATE content_cache SET last_used_at = ? WHERE cache_key IN (SELECT value FROM json_each(?))",
+                    (now, json.dumps(list(found))),
+                )
+        return found
+
+    def evict_cached_content(self, max_entries: int, now: str) -> int:
+        self.init()
+        with self._transaction() as conn:
+            removed = conn.execute("DELETE FROM content_cache WHERE expires_at <= ?", (now,)).rowcount
+            removed += conn.execute(
+                "DELETE FROM content_cache WHERE cache_key IN ("
+                "SELECT cache_key FROM content_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            ).rowcount
+        return removed
+
+    # --- telegram_files ---
+
+    def get_telegram_file_id(self, image_hash: str) -> str | None:
+        self.init()
+        row = self._connect().execute(
+            "SELECT file_id FROM telegram_files WHERE image_hash = ?", (image_hash,)
+        ).fetchone()
+        return row["file_id"] if row else None
+
+    def save_telegram_file(self, image_hash: str, file_id: str, flashcard_id: int | None) -> None:
+        self.init()
+        self._connect().execute(
+            "INSERT INTO telegram_files (image_hash, file_id, flashcard_id, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (image_hash) DO UPDATE SET file_id = excluded.file_id, "
+            "flashcard_id = COALESCE(excluded.flashcard_id, telegram_files.flashcard_id)",
+            (image_hash, file_id, flashcard_id, _utc_now_iso()),
+        )
+
+    def delete_telegram_file(self, image_hash: str, file_id: str) -> None:
+        self.init()
+        self._connect().execute(
+            "DELETE FROM telegram_files WHERE image_hash = ? AND file_id = ?", (image_hash, file_id)
+        )
+
+
+def _by_id(rows: sqlite3.Cursor) -> list[dict[str, Any]]:
+    # RETURNING gives no ordering guarantee
+    return sorted((dict(row) for row in rows), key=lambda row: row["id"])
+
+
+def _job(row: sqlite3.Row) -> dict[str, Any]:
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"])
+    return job
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,517 @@
+from datetime import datetime, timezone
+from typing import Any
+
+from app.clients import get_supabase
+from app.storage.base import Storage
+
+
+class SupabaseStorage(Storage):
+    """Tables live in Supabase; schema changes are in supabase/migrations/."""
+
+    name = "supabase"
+
+    def init(self) -> None:
+        # Tables are created in the dashboard / via `supabase db push`
+        pass
+
+    def count_source_terms(self) -> int:
+        response = get_supabase().table("source_terms").select("id", count="exact").limit(1).execute()
+        return response.count or 0
+
+    def source_term_hashes(self, term_keys: list[str]) -> dict[str, str | None]:
+        hashes = {}
+        # Keys travel in the query string; keep each URL well under proxy limits
+        for start in range(0, len(term_keys), 200):
+            response = get_supabase().table("source_terms") \
+                .select("term_key, content_hash") \
+                .in_("term_key", term_keys[start:start + 200]) \
+                .execute()
+            hashes.update({row["term_key"]: row["content_hash"] for row in response.data or []})
+        return hashes
+
+    def upsert_source_terms(self, rows: list[dict[str, Any]]) -> None:
+        if rows:
+            get_supabase().table("source_terms").upsert(rows, on_conflict="term_key").execute()
+
+    def list_source_terms(self, difficulty: str, after_id: int | None, limit: int) -> list[dict[str, Any]]:
+        response = get_supabase().table("source_terms") \
+            .select("*") \
+            .eq("difficulty", difficulty) \
+            .gt("id", after_id or 0) \
+            .order("id") \
+            .limit(limit) \
+            .execute()
+        return response.data or []
+
+    def mark_terms_used(self, term_ids: list[int], used_at: str, not_used_after: str) -> list[int]:
+        response = get_supabase().table("source_terms") \
+            .update({"used": True, "used_at": used_at}) \
+            .in_("id", term_ids) \
+            .or_(f'used_at.is.null,used_at.lte."{not_used_after}"') \
+            .execute()
+        return [row["id"] for row in response.data or []]
+
+    def claim_terms(self, difficulty: str, count: int) -> list[dict[str, Any]]:
+        supabase = get_supabase()
+        try:
+            response = supabase.rpc("claim_next_terms", {"p_difficulty": difficulty, "p_count": count}).execute()
+        except Exception as e:
+            if "claim_next_terms" not in str(e):
+                raise
+            print(f"⚠️ claim_next_terms RPC unavailable ({e}). Falling back to multi-step claim.")
+            rows = []
+            for _ in range(count):
+                row = self._claim_term_legacy(difficulty)
+                if row is None:
+                    break
+                rows.append(row)
+            return rows
+        return response.data or []
+
+    def _claim_term_legacy(self, difficulty: str) -> dict[str, Any] | None:
+        supabase = get_supabase()
+
+        # Find one unused term
+        response = supabase.table("source_terms") \
+            .select("id, italian_text, category") \
+            .eq("difficulty", difficulty) \
+            .eq("used", False) \
+            .order("id") \
+            .limit(1) \
+            .execute()
+
+        row = response.data[0] if response.data else None
+
+        if not row:
+            # Recycle if none left
+            print(f"No unused {difficulty} terms left. Recycling...")
+            supabase.table("source_terms") \
+                .update({"used": False, "used_at": None}) \
+                .eq("difficulty", difficulty) \
+                .execute()
+
+            response = supabase.table("source_terms") \
+                .select("id, italian_text, category") \
+                .eq("difficulty", difficulty) \
+                .order("id") \
+                .limit(1) \
+                .execute()
+
+            row = response.data[0] if response.data else None
+            if not row:
+                return None
+
+        supabase.table("source_terms") \
+            .update({"used": True, "used_at": _utc_now_iso()}) \
+            .eq("id", row["id"]) \
+            .execute()
+        return row
+
+    def insert_flashcard(self, row: dict[str, Any]) -> dict[str, Any]:
+        response = get_supabase().table("flashcards").insert(row).execute()
+        return response.data[0] if response.data else {**row, "id": 0}
+
+    def update_flashcard(self, flashcard_id: int, fields: dict[str, Any]) -> None:
+        get_supabase().table("flashcards").update(fields).eq("id", flashcard_id).execute()
+
+    def get_flashcard(self, flashcard_id: int) -> dict[str, Any] | None:
+        response = get_supabase().table("flashcards").select("*").eq("id", flashcard_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    def list_flashcards(
+        self,
+        limit: int = 100,
+        before: tuple[str, int] | None = None,
+        columns: list[str] | None = None,
+        after: tuple[str, int] | None = None,
+    ) -> list[dict[str, Any]]:
+        selected = "*" if columns is None else ",".join(dict.fromkeys(["id", "created_at", *columns]))
+        query = get_supabase().table("flashcards").select(selected).not_.in_("status", ["ready", "study"])
+        if before is not None:
+            # (created_at, id) < before, spelled out: PostgREST has no row-value comparison
+            created_at, flashcard_id = before
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{int(flashcard_id)})')
+        if after is not None:
+            created_at, flashcard_id = after
+            query = query.or_(f'created_at.gt."{created_at}",and(created_at.eq."{created_at}",id.gt.{int(flashcard_id)})')
+        desc = after is None
+        response = query.order("created_at", desc=desc).order("id", desc=desc).limit(limit).execute()
+        return response.data if response.data else []
+
+    def count_ready_flashcards(self) -> int:
+        response = get_supabase().table("flashcards") \
+            .select("id", count="exact") \
+            .eq("status", "ready") \
+            .limit(1) \
+            .execute()
+        return response.count or 0
+
+    def pop_ready_flashcard(self) -> dict[str, Any] | None:
+        response = get_supabase().rpc("pop_ready_flashcard", {}).execute()
+        return response.data[0] if response.data else None
+
+    def find_image_url(self, image_key: str) -> str | None:
+        response = get_supabase().table("flashcards") \
+            .select("image_url") \
+            .eq("image_key", image_key) \
+            .not_.is_("image_url", "null") \
+            .order("id", desc=True) \
+            .limit(1) \
+            .execute()
+        return response.data[0]["image_url"] if response.data else None
+
+    def record_delivery(
+        self,
+        flashcard_id: int | None,
+        channel: str,
+        chat_id: str | None,
+        status: str,
+        message_id: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        get_supabase().table("deliveries").insert({
+            "flashcard_id": flashcard_id,
+            "channel": channel,
+            "chat_id": chat_id,
+            "status": status,
+            "message_id": message_id,
+            "error": error,
+            "created_at": _utc_now_iso(),
+        }).execute()
+
+    def record_deliveries(self, rows: list[dict[str, Any]]) -> None:
+        if rows:
+            now = _utc_now_iso()
+            get_supabase().table("deliveries").insert([
+                {"channel": "telegram", "created_at": now, **row} for row in rows
+            ]).execute()
+
+    def delivered_chat_ids(self, flashcard_id: int) -> set[str]:
+        chat_ids: set[str] = set()
+        page = 1000
+        offset = 0
+        while True:
+            response = get_supabase().table("deliveries") \
+                .select("chat_id") \
+                .eq("flashcard_id", flashcard_id) \
+                .like("status", "sent%") \
+                .order("id") \
+                .range(offset, offset + page - 1) \
+                .execute()
+            rows = response.data or []
+            chat_ids.update(row["chat_id"] for row in rows)
+            if len(rows) < page:
+                return chat_ids
+            offset += page
+
+    def upsert_subscriber(self, chat_id: str, active: bool = True) -> None:
+        get_supabase().table("subscribers").upsert(
+            {"chat_id": str(chat_id), "active": active, "updated_at": _utc_now_iso()}, on_conflict="chat_id"
+        ).execute()
+
+    def list_subscribers(self, after: str | None = None, limit: int = 1000) -> list[str]:
+        query = get_supabase().table("subscribers").select("chat_id").eq("active", True)
+        if after:
+            query = query.gt("chat_id", after)
+        response = query.order("chat_id").limit(limit).execute()
+        return [row["chat_id"] for row in response.data or []]
+
+    def set_subscriber_schedule(self, chat_id: str, timezone: str | None, delivery_time: str | None) -> None:
+        get_supabase().table("subscribers") \
+            .update({"timezone": timezone, "delivery_time": delivery_time, "updated_at": _utc_now_iso()}) \
+            .eq("chat_id", str(chat_id)) \
+            .execute()
+
+    def list_subscriber_schedules(self, after: str | None = None, limit: int = 1000) -> list[dict[str, Any]]:
+        query = get_supabase().table("subscribers").select("chat_id,timezone,delivery_time").eq("active", True)
+        if after:
+            query = query.gt("chat_id", after)
+        return query.order("chat_id").limit(limit).execute().data or []
+
+    def list_subscriber_changes(self, since: str, limit: int = 1000) -> list[dict[str, Any]]:
+        response = get_supabase().table("subscribers") \
+            .select("chat_id,active,timezone,delivery_time") \
+            .gte("updated_at", since) \
+            .order("updated_at") \
+            .limit(limit) \
+            .execute()
+        return response.data or []
+
+    def count_subscribers(self) -> int:
+        response = get_supabase().table("subscribers") \
+            .select("chat_id", count="exact") \
+            .eq("active", True) \
+            .limit(1) \
+            .execute()
+        return response.count or 0
+
+    def get_flashcards(self, flashcard_ids: list[int]) -> list[dict[str, Any]]:
+        if not flashcard_ids:
+            return []
+        response = get_supabase().table("flashcards").select("*").in_("id", flashcard_ids).order("id").execute()
+        return response.data or []
+
+    def list_new_flashcards(self, after_id: int | None, limit: int) -> list[dict[str, Any]]:
+        response = get_supabase().table("flashcards") \
+            .select("*") \
+            .gt("id", after_id or 0) \
+            .neq("status", "ready") \
+            .order("id") \
+            .limit(limit) \
+            .execute()
+        return response.data or []
+
+    def get_review(self, chat_id: str, flashcard_id: int) -> dict[str, Any] | None:
+        response = get_supabase().table("reviews") \
+            .select("*") \
+            .eq("chat_id", chat_id) \
+            .eq("flashcard_id", flashcard_id) \
+            .limit(1) \
+            .execute()
+        return response.data[0] if response.data else None
+
+    def get_reviews(self, keys: list[tuple[str, int]]) -> list[dict[str, Any]]:
+        wanted = {(str(chat_id), int(flashcard_id)) for chat_id, flashcard_id in keys}
+        rows = []
+        ordered = sorted(wanted)
+        for start in range(0, len(ordered), 100):
+            chunk = ordered[start:start + 100]
+            response = get_supabase().table("reviews") \
+                .select("*") \
+                .in_("chat_id", sorted({chat_id for chat_id, _ in chunk})) \
+                .in_("flashcard_id", sorted({flashcard_id for _, flashcard_id in chunk})) \
+                .execute()
+            # The two IN lists also match cross pairs; keep only the ones asked for
+            rows += [row for row in response.data or [] if (row["chat_id"], row["flashcard_id"]) in wanted]
+        return list({(row["chat_id"], row["flashcard_id"]): row for row in rows}.values())
+
+    def save_reviews(self, rows: list[dict[str, Any]]) -> None:
+        if rows:
+            get_supabase().table("reviews").upsert(rows, on_conflict="chat_id,flashcard_id").execute()
+
+    def due_reviews(self, chat_id: str, now: int, limit: int) -> list[dict[str, Any]]:
+        response = get_supabase().table("reviews") \
+            .select("*") \
+            .eq("chat_id", chat_id) \
+            .lte("due_at", now) \
+            .order("due_at") \
+            .limit(limit) \
+            .execute()
+        return response.data or []
+
+    def due_reviews_page(self, now: int, after: tuple[int, str, int] | None, limit: int) -> list[dict[str, Any]]:
+        # Row-value keyset comparison is not expressible in PostgREST filters
+        after_due, after_chat, after_card = after or (-1, "", 0)
+        response = get_supabase().rpc("due_reviews_page", {
+            "p_now": now,
+            "p_after_due": after_due,
+            "p_after_chat": after_chat,
+            "p_after_card": after_card,
+            "p_limit": limit,
+        }).execute()
+        return response.data or []
+
+    def last_introduced_flashcard_id(self, chat_id: str) -> int | None:
+        response = get_supabase().table("reviews") \
+            .select("flashcard_id") \
+            .eq("chat_id", chat_id) \
+            .order("flashcard_id", desc=True) \
+            .limit(1) \
+            .execute()
+        return response.data[0]["flashcard_id"] if response.data else None
+
+    def count_introduced_since(self, chat_id: str, since: int) -> int:
+        response = get_supabase().table("reviews") \
+            .select("flashcard_id", count="exact") \
+            .eq("chat_id", chat_id) \
+            .gte("introduced_at", since) \
+            .limit(1) \
+            .execute()
+        return response.count or 0
+
+    def enqueue_job(self, row: dict[str, Any]) -> dict[str, Any]:
+        supabase = get_supabase()
+        response = supabase.table("jobs").upsert(
+            {**row, "status": "queued"}, on_conflict="job_key", ignore_duplicates=True
+        ).execute()
+        if response.data:
+            return response.data[0]
+        existing = supabase.table("jobs").select("*").eq("job_key", row["job_key"]).limit(1).execute()
+        return existing.data[0]
+
+    def lease_jobs(self, worker_id: str, now: str, lease_until: str, limit: int) -> list[dict[str, Any]]:
+        response = get_supabase().rpc("lease_jobs", {
+            "p_worker_id": worker_id,
+            "p_now": now,
+            "p_lease_until": lease_until,
+            "p_limit": limit,
+        }).execute()
+        return response.data or []
+
+    def finish_job(
+        self, job_id: int, worker_id: str, status: str, error: str | None = None, run_at: str | None = None
+    ) -> bool:
+        fields = {
+            "status": status,
+            "last_error": error,
+            "lease_until": None,
+            "locked_by": None,
+            "updated_at": _utc_now_iso(),
+        }
+        if run_at:
+            fields["run_at"] = run_at
+        response = get_supabase().table("jobs") \
+            .update(fields) \
+            .eq("id", job_id) \
+            .eq("locked_by", worker_id) \
+            .eq("status", "running") \
+            .execute()
+        return bool(response.data)
+
+    def requeue_job(self, job_id: int, run_at: str) -> bool:
+        response = get_supabase().table("jobs") \
+            .update({"status": "queued", "attempts": 0, "run_at": run_at, "updated_at": _utc_now_iso()}) \
+            .eq("id", job_id) \
+            .eq("status", "dead") \
+            .execute()
+        return bool(response.data)
+
+    def count_jobs(self) -> dict[str, int]:
+        counts = {}
+        for status in ("queued", "running", "done", "dead"):
+            response = get_supabase().table("jobs").select("id", count="exact").eq("status", status).limit(1).execute()
+            counts[status] = response.count or 0
+        return counts
+
+    def record_quiz_answers(self, rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        if not rows:
+            return []
+        response = get_supabase().table("quiz_answers") \
+            .upsert(rows, on_conflict="chat_id,message_id", ignore_duplicates=True) \
+            .execute()
+        return response.data or []
+
+    def quiz_results(self, chat_id: str, limit: int = 20) -> dict[str, Any]:
+        supabase = get_supabase()
+        counts = {}
+        for key, only_correct in (("answered", False), ("correct", True)):
+            query = supabase.table("quiz_answers").select("message_id", count="exact").eq("chat_id", chat_id)
+            if only_correct:
+                query = query.eq("correct", True)
+            counts[key] = query.limit(1).execute().count or 0
+        recent = supabase.table("quiz_answers") \
+            .select("*") \
+            .eq("chat_id", chat_id) \
+            .order("answered_at", desc=True) \
+            .limit(limit) \
+            .execute()
+        return {**counts, "recent": recent.data or []}
+
+    def acquire_lease(self, name: str, holder: str, now: str, expires_at: str) -> bool:
+        response = get_supabase().rpc("acquire_lease", {
+            "p_name": name,
+            "p_holder": holder,
+            "p_now": now,
+            "p_expires_at": expires_at,
+        }).execute()
+        return bool(response.data)
+
+    def release_lease(self, name: str, holder: str) -> None:
+        get_supabase().table("leases").delete().eq("name", name).eq("holder", holder).execute()
+
+    def claim_run(self, run_key: str, holder: str, now: str, stale_before: str) -> bool:
+        response = get_supabase().rpc("claim_run", {
+            "p_run_key": run_key,
+            "p_holder": holder,
+            "p_now": now,
+            "p_stale_before": stale_before,
+        }).execute()
+        return bool(response.data)
+
+    def finish_run(self, run_key: str, holder: str, status: str, result: dict[str, Any] | None, error: str | None) -> None:
+        get_supabase().table("scheduled_runs") \
+            .update({"status": status, "result": result, "error": error, "finished_at": _utc_now_iso()}) \
+            .eq("run_key", run_key) \
+            .eq("holder", holder) \
+            .execute()
+
+    def get_run(self, run_key: str) -> dict[str, Any] | None:
+        response = get_supabase().table("scheduled_runs").select("*").eq("run_key", run_key).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    def get_cached_content(self, cache_key: str, now: str) -> dict[str, str] | None:
+        supabase = get_supabase()
+        response = supabase.table("content_cache") \
+            .select("content") \
+            .eq("cache_key", cache_key) \
+            .gt("expires_at", now) \
+            .limit(1) \
+            .execute()
+        if not response.data:
+            return None
+        supabase.table("content_cache").update({"last_used_at": now}).eq("cache_key", cache_key).execute()
+        return response.data[0]["content"]
+
+    def put_cached_content(self, entry: dict[str, Any]) -> None:
+        get_supabase().table("content_cache").upsert(entry, on_conflict="cache_key").execute()
+
+    def put_cached_contents(self, entries: list[dict[str, Any]]) -> None:
+        if entries:
+            get_supabase().table("content_cache").upsert(entries, on_conflict="cache_key").execute()
+
+    def get_cached_contents(self, cache_keys: list[str], now: str) -> dict[str, dict[str, str]]:
+        supabase = get_supabase()
+        found = {}
+        # sha256 keys are 64 characters; 100 per request keeps the URL short
+        for start in range(0, len(cache_keys), 100):
+            response = supabase.table("content_cache") \
+                .select("cache_key,content") \
+                .in_("cache_key", cache_keys[start:start + 100]) \
+                .gt("expires_at", now) \
+                .execute()
+            hits = {row["cache_key"]: row["content"] for row in response.data or []}
+            if hits:
+                supabase.table("content_cache").update({"last_used_at": now}).in_("cache_key", list(hits)).execute()
+            found.update(hits)
+        return found
+
+    def evict_cached_content(self, max_entries: int, now: str) -> int:
+        supabase = get_supabase()
+        expired = supabase.table("content_cache").delete().lte("expires_at", now).execute()
+        removed = len(expired.data or [])
+        # Everything ranked past max_entries by recency is surplus
+        surplus = supabase.table("content_cache") \
+            .select("cache_key") \
+            .order("last_used_at", desc=True) \
+            .range(max_entries, max_entries + 999) \
+            .execute()
+        keys = [row["cache_key"] for row in surplus.data or []]
+        if keys:
+            supabase.table("content_cache").delete().in_("cache_key", keys).execute()
+            removed += len(keys)
+        return removed
+
+    def get_telegram_file_id(self, image_hash: str) -> str | None:
+        response = get_supabase().table("telegram_files") \
+            .select("file_id") \
+            .eq("image_hash", image_hash) \
+            .limit(1) \
+            .execute()
+        return response.data[0]["file_id"] if response.data else None
+
+    def save_telegram_file(self, image_hash: str, file_id: str, flashcard_id: int | None) -> None:
+        row = {"image_hash": image_hash, "file_id": file_id, "created_at": _utc_now_iso()}
+        if flashcard_id:
+            row["flashcard_id"] = flashcard_id
+        get_supabase().table("telegram_files").upsert(row, on_conflict="image_hash").execute()
+
+    def delete_telegram_file(self, image_hash: str, file_id: str) -> None:
+        get_supabase().table("telegram_files") \
+            .delete() \
+            .eq("image_hash", image_hash) \
+            .eq("file_id", file_id) \
+            .execute()
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -1,59 +1,196 @@
+import asyncio
+import json
 from typing import Optional
 from pathlib import Path
 
-import requests
-
+from app.clients import get_async_telegram_http, run_sync
 from app.config import settings
+from app.image_pipeline import ImageBytes, load_image
+from app.storage import get_async_storage
+from app.tracing import annotate, count, traced
 
 
 class TelegramDeliveryError(Exception):
-    pass
+    def __init__(self, message: str, status_code: int | None = None, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        # Seconds Telegram asked us to wait (429 Too Many Requests)
+        self.retry_after = retry_after
+
+
+# image sha256 -> Telegram file_id, in front of the telegram_files table
+_file_ids: dict[str, str] = {}
+_stats = {"photo_uploads": 0, "photo_file_id_sends": 0, "file_id_rejected": 0}
+# Bad Request descriptions that mean the file_id itself is unusable
+_STALE_FILE_ID_MARKERS = ("file identifier", "file_reference", "file reference", "file_id")
 
 
 def send_telegram_message(
-    text: str, image_url: Optional[str] = None, image_path: Optional[str | Path] = None
-) -> None:
-    if not settings.telegram_bot_token or not settings.telegram_chat_id:
+    text: str,
+    image_url: Optional[str] = None,
+    image_path: Optional[str | Path] = None,
+    flashcard_id: Optional[int] = None,
+    chat_id: Optional[str] = None,
+    image: Optional[ImageBytes] = None,
+    reply_markup: Optional[dict] = None,
+) -> dict:
+    return run_sync(send_telegram_message_async(
+        text, image_url=image_url, image_path=image_path, flashcard_id=flashcard_id, chat_id=chat_id, image=image,
+        reply_markup=reply_markup,
+    ))
+
+
+@traced("telegram_send")
+async def send_telegram_message_async(
+    text: str,
+    image_url: Optional[str] = None,
+    image_path: Optional[str | Path] = None,
+    flashcard_id: Optional[int] = None,
+    chat_id: Optional[str] = None,
+    image: Optional[ImageBytes] = None,
+    reply_markup: Optional[dict] = None,
+) -> dict:
+    """Send to `chat_id`, or to TELEGRAM_CHAT_ID when omitted.
+
+    `image` uploads straight from memory; `image_path` is read from disk first.
+    `reply_markup` attaches e.g. an inline keyboard.
+    """
+    chat_id = chat_id or settings.telegram_chat_id
+    if not settings.telegram_bot_token or not chat_id:
         raise TelegramDeliveryError("Telegram is not configured. Set TELEGRAM_BOT_TOKEN and TELEGRAM_CHAT_ID.")
 
-    base_url = f"https://api.telegram.org/bot{settings.telegram_bot_token}"
+    client = get_async_telegram_http()
+    markup = {"reply_markup": reply_markup} if reply_markup else {}
 
-    if image_path:
+    if image is None and image_path:
         # Uploading local file
-        path = Path(image_path)
-        if not path.exists():
+        if not Path(image_path).exists():
             raise TelegramDeliveryError(f"Image file not found at: {image_path}")
-        
-        with open(path, "rb") as photo:
-            response = requests.post(
-                f"{base_url}/sendPhoto",
-                data={
-                    "chat_id": settings.telegram_chat_id,
+        image = await asyncio.to_thread(load_image, image_path)
+
+    if image is not None:
+        image_hash = image.sha256
+
+        # Telegram already has these bytes: resend by file_id (small JSON POST, no upload)
+        file_id = await _lookup_file_id(image_hash)
+        if file_id:
+            response = await client.post(
+                "/sendPhoto",
+                json={
+                    "chat_id": chat_id,
+                    "photo": file_id,
                     "caption": text,
+                    **markup,
                 },
-                files={"photo": photo},
-                timeout=30,
             )
+            if response.status_code < 400:
+                _stats["photo_file_id_sends"] += 1
+                annotate(method="file_id")
+                return response.json()
+            if response.status_code != 400 or not _is_stale_file_id(response):
+                # Rate limit, blocked bot, unknown chat, outage: the file_id is still good
+                raise _delivery_error(response)
+            print(f"⚠️ Telegram rejected cached file_id ({response.status_code}); re-uploading.")
+            _stats["file_id_rejected"] += 1
+            await _forget_file_id(image_hash, file_id)
+
+        annotate(method="upload", bytes=len(image.data))
+        response = await client.post(
+            "/sendPhoto",
+            data={
+                "chat_id": chat_id,
+                "caption": text,
+                # Multipart fields are strings: nested objects go as JSON
+                **({"reply_markup": json.dumps(reply_markup)} if reply_markup else {}),
+            },
+            files={"photo": (image.filename, image.data, image.mime)},
+            timeout=settings.telegram_upload_timeout,
+        )
+        if response.status_code < 400:
+            _stats["photo_uploads"] += 1
+            await _remember_file_id(image_hash, response.json(), flashcard_id)
     elif image_url:
         # Sending via remote URL
-        response = requests.post(
-            f"{base_url}/sendPhoto",
+        annotate(method="url")
+        response = await client.post(
+            "/sendPhoto",
             json={
-                "chat_id": settings.telegram_chat_id,
+                "chat_id": chat_id,
                 "photo": image_url,
                 "caption": text,
+                **markup,
             },
-            timeout=20,
         )
     else:
         # Plain text message
-        response = requests.post(
-            f"{base_url}/sendMessage",
-            json={"chat_id": settings.telegram_chat_id, "text": text},
-            timeout=20,
+        annotate(method="text")
+        response = await client.post(
+            "/sendMessage",
+            json={"chat_id": chat_id, "text": text, **markup},
         )
 
     if response.status_code >= 400:
-        raise TelegramDeliveryError(f"Telegram API error: {response.status_code} {response.text}")
-    
+        raise _delivery_error(response)
+
     return response.json()
+
+
+def _delivery_error(response) -> TelegramDeliveryError:
+    count("flashcard_telegram_errors_total", status=response.status_code)
+    retry_after = None
+    try:
+        retry_after = response.json().get("parameters", {}).get("retry_after")
+    except ValueError:
+        pass
+    return TelegramDeliveryError(
+        f"Telegram API error: {response.status_code} {response.text}",
+        status_code=response.status_code,
+        retry_after=float(retry_after) if retry_after is not None else None,
+    )
+
+
+def _is_stale_file_id(response) -> bool:
+    try:
+        description = str(response.json().get("description") or "").lower()
+    except ValueError:
+        return False
+    return any(marker in description for marker in _STALE_FILE_ID_MARKERS)
+
+
+def telegram_stats() -> dict[str, int]:
+    return {**_stats, "cached_file_ids": len(_file_ids)}
+
+
+async def _lookup_file_id(image_hash: str) -> str | None:
+    if image_hash in _file_ids:
+        return _file_ids[image_hash]
+    try:
+        file_id = await get_async_storage().get_telegram_file_id(image_hash)
+    except Exception as e:
+        print(f"⚠️ file_id lookup failed: {e}")
+        return None
+    if file_id:
+        _file_ids[image_hash] = file_id
+    return file_id
+
+
+async def _forget_file_id(image_hash: str, file_id: str) -> None:
+    # Drop the stored row too, or every new process would try the stale id again
+    _file_ids.pop(image_hash, None)
+    try:
+        await get_async_storage().delete_telegram_file(image_hash, file_id)
+    except Exception as e:
+        print(f"⚠️ Could not delete rejected Telegram file_id: {e}")
+
+
+async def _remember_file_id(image_hash: str, payload: dict, flashcard_id: Optional[int]) -> None:
+    # sendPhoto returns every server-side size; the last one is the original resolution
+    photos = (payload.get("result") or {}).get("photo") or []
+    if not photos:
+        return
+    file_id = photos[-1]["file_id"]
+    _file_ids[image_hash] = file_id
+    try:
+        await get_async_storage().save_telegram_file(image_hash, file_id, flashcard_id)
+    except Exception as e:
+        print(f"⚠️ Could not persist Telegram file_id: {e}")
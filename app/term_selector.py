@@ -0,0 +1,329 @@
+"""Weighted, repeat-avoiding term selection from an in-memory index.
+
+The index holds every source term of a difficulty, grouped by category. Each
+category keeps an `eligible` array (terms not seen for TERM_NO_REPEAT_DAYS)
+and a `cooling` queue of recently used terms in use order. A pick is O(1):
+an alias-method draw of a category, then a uniform draw inside it with
+swap-remove. Terms move back from cooling to eligible as they age out.
+
+Category probability is proportional to its number of terms, times its
+TERM_CATEGORY_WEIGHTS multiplier (default 1, so plain picks are uniform over
+terms). TERM_CATEGORY_QUOTAS caps a category's share of the picks in the
+no-repeat window. When every term is cooling, the least recently used term
+is picked instead, which recycles the deck oldest first.
+
+Picks are written back with one conditional UPDATE (used_at still older than
+the window), so two instances never hand out the same term. New terms are
+added every TERM_INDEX_REFRESH_SECONDS by id. The whole index is reloaded
+every TERM_INDEX_MAX_AGE_SECONDS to pick up edits and other instances' picks.
+"""
+import functools
+import math
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Sequence
+
+from app.config import settings
+from app.storage import get_storage
+from app.tracing import annotate
+
+_PAGE_SIZE = 5000
+_MAX_CLAIM_ROUNDS = 3
+
+
+class AliasTable:
+    """Vose's alias method: O(n) to build, O(1) per weighted draw."""
+
+    def __init__(self, items: Sequence[Any], weights: Sequence[float]) -> None:
+        total = float(sum(weights))
+        if not items or total <= 0:
+            raise ValueError("AliasTable needs at least one positive weight")
+        n = len(items)
+        self.items = list(items)
+        self._probability = [0.0] * n
+        self._alias = [0] * n
+        scaled = [weight * n / total for weight in weights]
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        for index in small + large:
+            # Leftovers are 1.0 up to rounding
+            self._probability[index] = 1.0
+
+    def sample(self, rng: random.Random) -> Any:
+        index = rng.randrange(len(self.items))
+        return self.items[index if rng.random() < self._probability[index] else self._alias[index]]
+
+
+@dataclass
+class _Category:
+    name: str
+    size: int = 0
+    eligible: list[int] = field(default_factory=list)
+    position: dict[int, int] = field(default_factory=dict)
+    cooling: deque = field(default_factory=deque)  # (used_ts, term_id), oldest first
+
+    def add_eligible(self, term_id: int) -> None:
+        self.position[term_id] = len(self.eligible)
+        self.eligible.append(term_id)
+
+    def take(self, rng: random.Random) -> int:
+        index = rng.randrange(len(self.eligible))
+        term_id, last = self.eligible[index], self.eligible[-1]
+        self.eligible[index] = last
+        self.position[last] = index
+        self.eligible.pop()
+        del self.position[term_id]
+        return term_id
+
+
+class TermIndex:
+    """In-memory selection index for one difficulty."""
+
+    def __init__(self, difficulty: str, rng: random.Random | None = None) -> None:
+        self.difficulty = difficulty
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._reset()
+        self._loaded_at = self._refreshed_at = 0.0
+
+    def _reset(self) -> None:
+        self.terms: dict[int, tuple[str, str]] = {}
+        self.used: dict[int, float | None] = {}
+        self.categories: dict[str, _Category] = {}
+        self.max_id = 0
+        self._table: AliasTable | None = None
+        self._table_key: tuple | None = None
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    # --- loading ---
+
+    def refresh(self, force: bool = False) -> None:
+        """Full reload when stale or empty, otherwise fetch only terms added since the last refresh."""
+        now = time.monotonic()
+        if force or not self.terms or now - self._loaded_at >= settings.term_index_max_age_seconds:
+            self._reset()
+            self._load_after(0)
+            self._loaded_at = self._refreshed_at = now
+        elif now - self._refreshed_at >= settings.term_index_refresh_seconds:
+            self._load_after(self.max_id)
+            self._refreshed_at = now
+
+    def _load_after(self, after_id: int) -> None:
+        storage = get_storage()
+        loaded: list[tuple[float, int]] = []
+        while True:
+            page = storage.list_source_terms(self.difficulty, after_id, _PAGE_SIZE)
+            for row in page:
+                used_ts = _timestamp(row.get("used_at")) if row.get("used") else None
+                self._add(row["id"], row["italian_text"], row.get("category") or "general", used_ts)
+                if used_ts is not None:
+                    loaded.append((used_ts, row["id"]))
+            if len(page) < _PAGE_SIZE:
+                break
+            after_id = page[-1]["id"]
+        # Cooling queues must stay in use order
+        for used_ts, term_id in sorted(loaded):
+            self.categories[self.terms[term_id][1]].cooling.append((used_ts, term_id))
+        self._table_key = None
+
+    def _add(self, term_id: int, text: str, category: str, used_ts: float | None) -> None:
+        self.terms[term_id] = (text, category)
+        self.used[term_id] = used_ts
+        self.max_id = max(self.max_id, term_id)
+        bucket = self.categories.get(category)
+        if bucket is None:
+            bucket = self.categories[category] = _Category(category)
+        bucket.size += 1
+        if used_ts is None:
+            bucket.add_eligible(term_id)
+
+    # --- picking ---
+
+    def pick(self, count: int, now: float | None = None) -> list[tuple[int, float | None]]:
+        """Choose up to `count` distinct terms and mark them used in memory (not in storage).
+
+        Returns (term_id, previous use) pairs.
+        """
+        now = time.time() if now is None else now
+        cutoff = now - settings.term_no_repeat_days * 86400
+        for bucket in self.categories.values():
+            while bucket.cooling and bucket.cooling[0][0] <= cutoff:
+                used_ts, term_id = bucket.cooling.popleft()
+                if self.used.get(term_id) == used_ts:
+                    bucket.add_eligible(term_id)
+        picked: list[tuple[int, float | None]] = []
+        for _ in range(min(count, len(self.terms))):
+            table = self._alias_table()
+            if table is not None:
+                bucket = table.sample(self.rng)
+                term_id = bucket.take(self.rng)
+            else:
+                term_id = self._least_recently_used(exclude={term_id for term_id, _ in picked})
+                if term_id is None:
+                    break
+                bucket = self.categories[self.terms[term_id][1]]
+            picked.append((term_id, self.used[term_id]))
+            self.used[term_id] = now
+            bucket.cooling.append((now, term_id))
+        return picked
+
+    def _alias_table(self) -> AliasTable | None:
+        """Categories with eligible terms and room in their quota; rebuilt only when that set changes."""
+        weights = _parse_shares(settings.term_category_weights)
+        quotas = _parse_shares(settings.term_category_quotas)
+        candidates = [bucket for bucket in self.categories.values() if bucket.eligible]
+        if quotas and candidates:
+            window_total = sum(len(bucket.cooling) for bucket in self.categories.values()) + 1
+            within = [
+                bucket for bucket in candidates
+                if bucket.name not in quotas or len(bucket.cooling) + 1 <= math.ceil(quotas[bucket.name] * window_total)
+            ]
+            # Quotas that cannot all be met are ignored rather than blocking every pick
+            candidates = within or candidates
+        candidates = [bucket for bucket in candidates if weights.get(bucket.name, 1.0) > 0]
+        if not candidates:
+            return None
+        key = tuple(bucket.name for bucket in candidates)
+        if key != self._table_key:
+            self._table = AliasTable(candidates, [bucket.size * weights.get(bucket.name, 1.0) for bucket in candidates])
+            self._table_key = key
+        return self._table
+
+    def _least_recently_used(self, exclude: set[int]) -> int | None:
+        oldest = None
+        for bucket in self.categories.values():
+            # Skip stale entries left behind by a newer use of the same term
+            while bucket.cooling and self.used.get(bucket.cooling[0][1]) != bucket.cooling[0][0]:
+                bucket.cooling.popleft()
+            for used_ts, term_id in bucket.cooling:
+                if term_id not in exclude and self.used.get(term_id) == used_ts:
+                    if oldest is None or used_ts < oldest[0]:
+                        oldest = (used_ts, term_id)
+                    break
+        if oldest is None:
+            return None
+        bucket = self.categories[self.terms[oldest[1]][1]]
+        bucket.cooling.remove(oldest)
+        return oldest[1]
+
+    # --- claiming ---
+
+    def claim(self, count: int) -> list[dict[str, Any]]:
+        """Pick `count` terms and record them in storage; terms another instance took meanwhile are replaced."""
+        with self._lock:
+            self.refresh()
+            storage = get_storage()
+            claimed: list[dict[str, Any]] = []
+            for _ in range(_MAX_CLAIM_ROUNDS):
+                missing = count - len(claimed)
+                if missing <= 0:
+                    break
+                now = time.time()
+                picked = self.pick(missing, now)
+                if not picked:
+                    break
+                # Fresh terms must still be outside the window; recycled ones untouched since we last saw them
+                window_cutoff = now - settings.term_no_repeat_days * 86400
+                fresh = [term_id for term_id, previous in picked if previous is None or previous <= window_cutoff]
+                recycled = [previous for _, previous in picked if previous is not None and previous > window_cutoff]
+                accepted = set(storage.mark_terms_used(fresh, _iso(now), _iso(window_cutoff))) if fresh else set()
+                if recycled:
+                    ids = [term_id for term_id, previous in picked if previous is not None and previous > window_cutoff]
+                    accepted.update(storage.mark_terms_used(ids, _iso(now), _iso(max(recycled) + 0.001)))
+                claimed += [
+                    {"id": term_id, "italian_text": self.terms[term_id][0], "category": self.terms[term_id][1],
+                     "difficulty": self.difficulty}
+                    for term_id, _ in picked if term_id in accepted
+                ]
+            annotate(index_terms=len(self.terms), categories=len(self.categories))
+            return claimed
+
+    def peek(self, count: int) -> list[str]:
+        """Terms a claim of `count` could hand out next, drawn on a copy so nothing is marked used.
+
+        Draws are random, so this is a sample from the same distribution, not the exact next picks.
+        """
+        with self._lock:
+            self.refresh()
+            shadow = TermIndex(self.difficulty)
+            shadow.terms, shadow.used, shadow.max_id = dict(self.terms), dict(self.used), self.max_id
+            shadow.categories = {
+                name: _Category(name, bucket.size, list(bucket.eligible), dict(bucket.position), deque(bucket.cooling))
+                for name, bucket in self.categories.items()
+            }
+        return [shadow.terms[term_id][0] for term_id, _ in shadow.pick(count)]
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "difficulty": self.difficulty,
+                "terms": len(self.terms),
+                "categories": {
+                    name: {"terms": bucket.size, "eligible": len(bucket.eligible)}
+                    for name, bucket in sorted(self.categories.items())
+                },
+                "loaded_s_ago": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            }
+
+
+_indexes: dict[str, TermIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_term_index(difficulty: str) -> TermIndex:
+    with _indexes_lock:
+        index = _indexes.get(difficulty)
+        if index is None:
+            index = _indexes[difficulty] = TermIndex(difficulty)
+        return index
+
+
+def pick_terms(difficulty: str, count: int) -> list[dict[str, Any]]:
+    return get_term_index(difficulty).claim(count)
+
+
+def peek_terms(difficulty: str, count: int) -> list[str]:
+    return get_term_index(difficulty).peek(count)
+
+
+def term_index_stats() -> list[dict[str, Any]]:
+    with _indexes_lock:
+        indexes = list(_indexes.values())
+    return [index.stats() for index in indexes]
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_shares(text: str) -> dict[str, float]:
+    """`"greetings=2, food=0.5"` -> {"greetings": 2.0, "food": 0.5}."""
+    shares = {}
+    for pair in text.split(","):
+        if "=" in pair:
+            name, value = pair.rsplit("=", 1)
+            shares[name.strip()] = float(value)
+    return shares
+
+
+def _timestamp(value: str | None) -> float:
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def _iso(timestamp: float) -> str:
+    # Fixed-width timestamps so text comparison in SQLite matches time order
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="microseconds")
@@ -0,0 +1,206 @@
+"""Timing spans for the hot path, exported as Prometheus metrics.
+
+    with span("llm_call", model=CONTENT_MODEL) as sp:
+        ...
+        sp.set(fallback=True)
+
+    @traced("phase2_image")
+    async def background_image_task_async(...): ...
+
+Every span lands in the `flashcard_span_duration_seconds` histogram labelled
+by span name, status (ok/error) and the low-cardinality attributes in
+LABEL_KEYS. Spans nest through a context variable, so asyncio tasks started
+inside a span inherit its trace. With TRACE_LOG_PATH set, each finished span
+is also appended to that file as one JSON line (trace_id, span_id, parent_id,
+name, start, duration_ms, status, attributes).
+"""
+import contextvars
+import functools
+import inspect
+import json
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator
+
+from app.config import settings
+
+# Upper bounds in seconds: DB calls land in the low buckets, image generation in the top ones
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 90.0, 120.0)
+# Span attributes that become metric labels; everything else only goes to the span log
+LABEL_KEYS = ("model", "fallback", "method", "backend", "kind")
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_log_lock = threading.Lock()
+_histograms: dict[tuple, "_Histogram"] = {}
+_counters: dict[tuple, float] = {}
+
+
+@dataclass
+class _Histogram:
+    counts: list[int] = field(default_factory=lambda: [0] * len(BUCKETS))
+    total: float = 0.0
+    count: int = 0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    attributes: dict[str, Any]
+    started_at: float = field(default_factory=time.time)
+    status: str = "ok"
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    parent = _current.get()
+    current = Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(8),
+        span_id=secrets.token_hex(4),
+        parent_id=parent.span_id if parent else None,
+        attributes=attributes,
+    )
+    token = _current.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set(error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _current.reset(token)
+        _record(current, duration)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Run the decorated function (sync or async) inside a span."""
+    def decorate(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the enclosing span, if any."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
+
+
+def count(name: str, value: float = 1, **labels: Any) -> None:
+    key = (name, _label_items(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def _label_items(labels: dict[str, Any]) -> tuple:
+    return tuple(sorted((key, str(value).lower() if isinstance(value, bool) else str(value)) for key, value in labels.items()))
+
+
+def _record(current: Span, duration: float) -> None:
+    labels = {"span": current.name, "status": current.status}
+    labels.update({key: current.attributes[key] for key in LABEL_KEYS if key in current.attributes})
+    key = _label_items(labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram()
+        histogram.observe(duration)
+    if settings.trace_log_path:
+        _write_span(current, duration)
+
+
+def _write_span(current: Span, duration: float) -> None:
+    line = json.dumps({
+        "trace_id": current.trace_id,
+        "span_id": current.span_id,
+        "parent_id": current.parent_id,
+        "name": current.name,
+        "start": datetime.fromtimestamp(current.started_at, timezone.utc).isoformat(),
+        "duration_ms": round(duration * 1000, 2),
+        "status": current.status,
+        "attributes": current.attributes,
+    }, default=str)
+    try:
+        with _log_lock, open(settings.trace_log_path, "a", encoding="utf-8") as log:
+            log.write(line + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write span log: {e}")
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = [
+        "# HELP flashcard_span_duration_seconds Duration of traced steps.",
+        "# TYPE flashcard_span_duration_seconds histogram",
+    ]
+    with _lock:
+        histograms = {key: (list(h.counts), h.total, h.count) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    for key, (counts, total, observed) in sorted(histograms.items()):
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append(f"flashcard_span_duration_seconds_bucket{_format_labels(key + (('le', repr(bound)),))} {cumulative}")
+        lines.append(f"flashcard_span_duration_seconds_bucket{_format_labels(key + (('le', '+Inf'),))} {observed}")
+        lines.append(f"flashcard_span_duration_seconds_sum{_format_labels(key)} {total}")
+        lines.append(f"flashcard_span_duration_seconds_count{_format_labels(key)} {observed}")
+
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (counter_name, labels), value in sorted(counters.items()):
+            if counter_name == name:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _format_value(value: float) -> str:
+    # Full precision: `:g` would turn 1234567 into 1.23457e+06
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+def _format_labels(items: tuple) -> str:
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def reset_metrics() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,38 @@
+"""Standalone job worker: `python -m app.worker [--concurrency N] [--once]`.
+
+Drains the durable job queue (see app.jobs) outside the web process. Several
+workers can run side by side; leases keep them from taking the same job.
+"""
+import argparse
+import asyncio
+import signal
+
+from app.config import settings
+from app.db import init_db
+from app.jobs import drain_jobs_async, run_worker_async
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run queued flashcard jobs.")
+    parser.add_argument("--concurrency", type=int, default=settings.jobs_concurrency)
+    parser.add_argument("--poll", type=float, default=settings.jobs_poll_seconds, help="seconds between polls when idle")
+    parser.add_argument("--once", action="store_true", help="drain what is due and exit")
+    args = parser.parse_args()
+
+    init_db()
+    asyncio.run(_run(args))
+
+
+async def _run(args: argparse.Namespace) -> None:
+    if args.once:
+        print(await drain_jobs_async(concurrency=args.concurrency))
+        return
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await run_worker_async(concurrency=args.concurrency, poll_seconds=args.poll, stop=stop)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Cold-start benchmark for the serverless entry point.
+
+Measures, in fresh interpreters:
+  * import time of the entry module (`python -X importtime`), with the
+    heaviest packages by self time, and which heavy SDKs got imported;
+  * time to first response: spawn uvicorn and poll /health until it answers.
+
+Usage:
+    python benchmarks/cold_start.py --runs 5
+    python benchmarks/cold_start.py --max-import-ms 600 --max-first-response-ms 2500   # exit 1 on regression
+
+Runs with VERCEL=1 and a throwaway SQLite database unless --no-serverless is given.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# Must stay out of the serverless import path; they are loaded on first use
+LAZY_MODULES = ("openai", "supabase", "postgrest", "apscheduler", "httpx")
+
+
+def bench_env(serverless: bool, db_dir: str) -> dict[str, str]:
+    env = {**os.environ, "PYTHONPATH": str(ROOT), "STORAGE_BACKEND": "sqlite", "DB_PATH": f"{db_dir}/bench.db"}
+    env.pop("SUPABASE_URL", None)
+    env.pop("SUPABASE_KEY", None)
+    if serverless:
+        env["VERCEL"] = "1"
+    else:
+        env.pop("VERCEL", None)
+    return env
+
+
+def measure_import(entry: str, env: dict[str, str]) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    self_by_package: dict[str, int] = defaultdict(int)
+    imported = set()
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            self_us, cumulative_us = int(self_us), int(cumulative_us)
+        except ValueError:
+            continue  # header line
+        root = name.split(".")[0]
+        self_by_package[root] += self_us
+        imported.add(root)
+        if name == entry:
+            total_us = cumulative_us
+    heaviest = sorted(self_by_package.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "total_ms": total_us / 1000,
+        "heaviest_ms": {name: round(us / 1000, 1) for name, us in heaviest},
+        "lazy_modules_imported": sorted(imported & set(LAZY_MODULES)),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_first_response(entry: str, env: dict[str, str], timeout: float = 30.0) -> float:
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{entry}:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+                conn.request("GET", "/health")
+                if conn.getresponse().status == 200:
+                    return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise TimeoutError(f"No response from {entry} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entry", default="api.index", help="module exposing the ASGI `app`")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-serverless", action="store_true", help="do not set VERCEL=1")
+    parser.add_argument("--max-import-ms", type=float, help="fail if the median import time is higher")
+    parser.add_argument("--max-first-response-ms", type=float, help="fail if the median time to first response is higher")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as db_dir:
+        env = bench_env(not args.no_serverless, db_dir)
+        imports = [measure_import(args.entry, env) for _ in range(args.runs)]
+        first_responses = [measure_first_response(args.entry, env) for _ in range(args.runs)]
+
+    report = {
+        "entry": args.entry,
+        "serverless": not args.no_serverless,
+        "runs": args.runs,
+        "import_ms": {"median": round(statistics.median(r["total_ms"] for r in imports), 1),
+                      "max": round(max(r["total_ms"] for r in imports), 1)},
+        "first_response_ms": {"median": round(statistics.median(first_responses), 1),
+                              "max": round(max(first_responses), 1)},
+        "heaviest_packages_ms": imports[-1]["heaviest_ms"],
+        "lazy_modules_imported": imports[-1]["lazy_modules_imported"],
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report["lazy_modules_imported"] and not args.no_serverless:
+        failures.append(f"imported at startup: {', '.join(report['lazy_modules_imported'])}")
+    if args.max_import_ms and report["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import {report['import_ms']['median']}ms > {args.max_import_ms}ms")
+    if args.max_first_response_ms and report["first_response_ms"]["median"] > args.max_first_response_ms:
+        failures.append(f"first response {report['first_response_ms']['median']}ms > {args.max_first_response_ms}ms")
+    for failure in failures:
+        print(f"❌ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
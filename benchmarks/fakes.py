@@ -0,0 +1,624 @@
+"""Local stand-ins for the OpenAI, Telegram Bot and Supabase (PostgREST) APIs.
+
+One process serves all three, each under its own prefix:
+
+    /openai/v1/...          chat completions, image generation and model lookups
+    /telegram/bot<token>/   getMe, sendMessage and sendPhoto
+    /supabase/rest/v1/...   in-memory PostgREST tables plus the RPCs in supabase/migrations
+
+Point the app at it with
+    OPENAI_BASE_URL=http://127.0.0.1:8787/openai/v1
+    TELEGRAM_API_URL=http://127.0.0.1:8787/telegram
+    SUPABASE_URL=http://127.0.0.1:8787/supabase   SUPABASE_KEY=fake.fake.fake
+
+Every route has a name (openai.chat, openai.images, openai.models,
+telegram.getMe, telegram.sendMessage, telegram.sendPhoto, supabase.select,
+supabase.insert, supabase.update, supabase.delete, supabase.rpc). Latency and
+errors are configured per route or per service, the route setting winning.
+Image settings can also name the model (openai.images.dall-e-3):
+
+    python benchmarks/fakes.py --port 8787 --latency openai.images=2000 \\
+        --latency telegram=80 --error-rate telegram.sendPhoto=0.1 --error-status telegram=429
+
+Control endpoints: GET /_fake/stats (calls, errors, bytes per route),
+POST /_fake/reset (stats; `?data=1` also empties the tables) and
+POST /_fake/config (JSON with the same latency/jitter/error_rate/error_status maps
+and batch_item_error_rate).
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import random
+import re
+import struct
+import time
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+# Natural keys checked for upsert / duplicate inserts; tables not listed only have `id`
+UNIQUE_KEYS = {
+    "source_terms": ("term_key",),
+    "subscribers": ("chat_id",),
+    "reviews": ("chat_id", "flashcard_id"),
+    "jobs": ("job_key",),
+    "content_cache": ("cache_key",),
+    "telegram_files": ("image_hash",),
+    "quiz_answers": ("chat_id", "message_id"),
+}
+# Tables whose primary key is the natural key above, with no `id` column
+NO_ID = {"reviews", "quiz_answers"}
+DEFAULTS = {
+    "source_terms": {"used": False, "used_at": None},
+    "flashcards": {"status": "sent", "image_url": None, "image_key": None, "caption": None},
+    "subscribers": {"active": True},
+    "jobs": {"payload": {}, "status": "queued", "attempts": 0, "lease_until": None, "locked_by": None, "last_error": None},
+}
+TIMESTAMP_DEFAULTS = {
+    "deliveries": ("created_at",),
+    "content_cache": ("created_at", "last_used_at"),
+    "telegram_files": ("created_at",),
+    "subscribers": ("created_at", "updated_at"),
+    "jobs": ("run_at", "created_at", "updated_at"),
+}
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: dict[str, float] = field(default_factory=dict)
+    jitter_ms: dict[str, float] = field(default_factory=dict)
+    error_rate: dict[str, float] = field(default_factory=dict)
+    error_status: dict[str, int] = field(default_factory=dict)
+    image_side: int = 1024
+    # Fraction of items in a batched chat completion that come back missing or malformed
+    batch_item_error_rate: float = 0.0
+
+    def lookup(self, values: dict, route: str, default: Any, variant: str | None = None) -> Any:
+        """Most specific setting first: ROUTE.VARIANT (e.g. openai.images.dall-e-3), ROUTE, then the service."""
+        for key in (f"{route}.{variant}" if variant else None, route, route.split(".")[0]):
+            if key in values:
+                return values[key]
+        return default
+
+    def update(self, changes: dict[str, dict]) -> None:
+        for name in ("latency_ms", "jitter_ms", "error_rate", "error_status"):
+            getattr(self, name).update(changes.get(name, {}))
+        self.batch_item_error_rate = changes.get("batch_item_error_rate", self.batch_item_error_rate)
+
+
+@dataclass
+class RouteStats:
+    calls: int = 0
+    errors: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+
+class FakeServices:
+    def __init__(self, config: FakeConfig) -> None:
+        self.config = config
+        self.stats: dict[str, RouteStats] = defaultdict(RouteStats)
+        self.tables: dict[str, list[dict[str, Any]]] = defaultdict(list)
+        self.ids: dict[str, itertools.count] = defaultdict(lambda: itertools.count(1))
+        self.message_ids = itertools.count(1)
+        self.images = _Illustration(config.image_side)
+        self.lock = asyncio.Lock()
+
+    async def enter(self, route: str, request: Request, variant: str | None = None) -> tuple[bytes, Response | None]:
+        """Count the call, apply latency, and return an injected error response if one is due."""
+        body = await request.body()
+        stats = self.stats[route]
+        stats.calls += 1
+        stats.bytes_in += len(body)
+        latency = self.config.lookup(self.config.latency_ms, route, 0.0, variant)
+        jitter = self.config.lookup(self.config.jitter_ms, route, 0.0, variant)
+        delay = max(0.0, latency + random.uniform(-jitter, jitter)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        if random.random() < self.config.lookup(self.config.error_rate, route, 0.0, variant):
+            stats.errors += 1
+            return body, _injected_error(route, self.config.lookup(self.config.error_status, route, 500, variant))
+        return body, None
+
+    def reply(self, route: str, payload: Any, status_code: int = 200, headers: dict | None = None) -> Response:
+        content = json.dumps(payload, default=str).encode()
+        self.stats[route].bytes_out += len(content)
+        return Response(content, status_code=status_code, headers=headers, media_type="application/json")
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        return {route: vars(stats).copy() for route, stats in sorted(self.stats.items())}
+
+
+def _chat_content(term: str) -> dict[str, str]:
+    return {
+        "italian_text": term,
+        "phonetic": f"/{term.lower()}/",
+        "english_translation": f"{term} (translated)",
+        "example_sentence": f"Ogni giorno dico: {term}.",
+    }
+
+
+def _injected_error(route: str, status: int) -> Response:
+    service = route.split(".")[0]
+    if service == "telegram":
+        body = {"ok": False, "error_code": status, "description": f"Injected error {status}"}
+        if status == 429:
+            body["parameters"] = {"retry_after": 1}
+        return JSONResponse(body, status_code=status)
+    if service == "openai":
+        return JSONResponse({"error": {"message": f"Injected error {status}", "type": "server_error"}}, status_code=status)
+    return JSONResponse({"code": "XX000", "message": f"Injected error {status}", "details": None, "hint": None}, status_code=status)
+
+
+def build_app(config: FakeConfig | None = None) -> FastAPI:
+    fakes = FakeServices(config or FakeConfig())
+    app = FastAPI(title="Fake OpenAI / Telegram / Supabase")
+    app.state.fakes = fakes
+
+    @app.get("/_fake/stats")
+    async def stats():
+        return {"routes": fakes.snapshot(), "rows": {name: len(rows) for name, rows in fakes.tables.items()}}
+
+    @app.post("/_fake/reset")
+    async def reset(data: bool = False):
+        fakes.stats.clear()
+        if data:
+            fakes.tables.clear()
+            fakes.ids.clear()
+        return {"ok": True}
+
+    @app.post("/_fake/config")
+    async def configure(request: Request):
+        fakes.config.update(await request.json())
+        return vars(fakes.config)
+
+    # --- OpenAI -----------------------------------------------------------
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body, error = await fakes.enter("openai.chat", request)
+        if error:
+            return error
+        payload = json.loads(body)
+        prompt = payload["messages"][-1]["content"]
+        schema = (payload.get("response_format") or {}).get("json_schema") or {}
+        if schema.get("name") == "flashcard_batch":
+            # Batched request: one term per line after the instructions
+            items = []
+            for term in prompt.split("\n\n", 1)[-1].splitlines():
+                item = {"term": term, **_chat_content(term)}
+                roll = random.random() < fakes.config.batch_item_error_rate
+                if roll and random.random() < 0.5:
+                    continue
+                if roll:
+                    item["phonetic"] = ""
+                items.append(item)
+            content = json.dumps({"items": items})
+        else:
+            match = re.search(r"word/phrase: (.+?)\.?$", prompt)
+            content = json.dumps(_chat_content(match.group(1) if match else "ciao"))
+        return fakes.reply("openai.chat", {
+            "id": f"chatcmpl-fake{next(fakes.message_ids)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4},
+        })
+
+    @app.get("/openai/v1/models/{model}")
+    async def retrieve_model(model: str, request: Request):
+        _, error = await fakes.enter("openai.models", request)
+        if error:
+            return error
+        return fakes.reply("openai.models", {"id": model, "object": "model", "created": 0, "owned_by": "system"})
+
+    @app.post("/openai/v1/images/generations")
+    async def image_generations(request: Request):
+        # Settings can target one model, e.g. --error-rate openai.images.gpt-image-1=1
+        model = json.loads(await request.body()).get("model")
+        _, error = await fakes.enter("openai.images", request, variant=model)
+        if error:
+            return error
+        return fakes.reply("openai.images", {
+            "created": int(time.time()),
+            "data": [{"b64_json": base64.b64encode(fakes.images.render()).decode()}],
+        })
+
+    # --- Telegram ---------------------------------------------------------
+
+    @app.post("/telegram/bot{token}/{method}")
+    async def telegram(token: str, method: str, request: Request):
+        route = f"telegram.{method}"
+        body, error = await fakes.enter(route, request)
+        if error:
+            return error
+        if method == "getMe":
+            return fakes.reply(route, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}})
+        if method not in ("sendMessage", "sendPhoto"):
+            return JSONResponse({"ok": False, "error_code": 404, "description": "Not Found"}, status_code=404)
+        chat_id = None
+        if request.headers.get("content-type", "").startswith("application/json"):
+            chat_id = json.loads(body).get("chat_id")
+        else:
+            # Multipart upload: pull chat_id out without a form parser
+            match = re.search(rb'name="chat_id"\r\n\r\n([^\r]*)', body)
+            chat_id = match.group(1).decode() if match else None
+        message_id = next(fakes.message_ids)
+        result: dict[str, Any] = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+        }
+        if method == "sendPhoto":
+            side = fakes.config.image_side
+            result["photo"] = [
+                {"file_id": f"fake-file-{message_id}-{size}", "file_unique_id": f"u{message_id}-{size}",
+                 "width": size, "height": size}
+                for size in (90, 320, 800, side)
+            ]
+        return fakes.reply(route, {"ok": True, "result": result})
+
+    # --- Supabase / PostgREST ---------------------------------------------
+
+    @app.post("/supabase/rest/v1/rpc/{function}")
+    async def rpc(function: str, request: Request):
+        body, error = await fakes.enter("supabase.rpc", request)
+        if error:
+            return error
+        handler = RPCS.get(function)
+        if handler is None:
+            return JSONResponse(
+                {"code": "PGRST202", "message": f"Could not find the function public.{function}", "details": None, "hint": None},
+                status_code=404,
+            )
+        async with fakes.lock:
+            rows = handler(fakes, json.loads(body or b"{}"))
+        return fakes.reply("supabase.rpc", rows)
+
+    @app.api_route("/supabase/rest/v1/{table}", methods=["GET", "HEAD", "POST", "PATCH", "DELETE"])
+    async def rest(table: str, request: Request):
+        route = {"GET": "supabase.select", "HEAD": "supabase.select", "POST": "supabase.insert",
+                 "PATCH": "supabase.update", "DELETE": "supabase.delete"}[request.method]
+        body, error = await fakes.enter(route, request)
+        if error:
+            return error
+        params = list(request.query_params.multi_items())
+        prefer = request.headers.get("prefer", "")
+        async with fakes.lock:
+            try:
+                if route == "supabase.insert":
+                    rows = _insert(fakes, table, json.loads(body), dict(params).get("on_conflict"), prefer)
+                else:
+                    rows = _filter(fakes.tables[table], params)
+                    if route == "supabase.update":
+                        changes = json.loads(body)
+                        for row in rows:
+                            row.update(changes)
+                    elif route == "supabase.delete":
+                        doomed = {id(row) for row in rows}
+                        fakes.tables[table] = [row for row in fakes.tables[table] if id(row) not in doomed]
+            except _Conflict as e:
+                return JSONResponse({"code": "23505", "message": str(e), "details": None, "hint": None}, status_code=409)
+        headers = {}
+        if route == "supabase.select":
+            total = len(rows)
+            rows = _window(_order(rows, dict(params).get("order")), params)
+            if "count=" in prefer:
+                headers["Content-Range"] = f"0-{max(len(rows) - 1, 0)}/{total}" if rows else f"*/{total}"
+            rows = _project(rows, dict(params).get("select", "*"))
+        elif "return=minimal" in prefer:
+            rows = []
+        return fakes.reply(route, [dict(row) for row in rows], status_code=201 if route == "supabase.insert" else 200, headers=headers)
+
+    return app
+
+
+class _Conflict(Exception):
+    pass
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _insert(fakes: FakeServices, table: str, payload: dict | list, on_conflict: str | None, prefer: str) -> list[dict]:
+    rows = payload if isinstance(payload, list) else [payload]
+    keys = tuple(on_conflict.split(",")) if on_conflict else UNIQUE_KEYS.get(table)
+    upsert = "resolution=" in prefer
+    stored = []
+    for row in rows:
+        existing = None
+        if keys and all(row.get(key) is not None for key in keys):
+            existing = next(
+                (other for other in fakes.tables[table] if all(other.get(key) == row[key] for key in keys)), None
+            )
+        if existing is not None:
+            if not upsert:
+                raise _Conflict(f"duplicate key value violates unique constraint on {table} ({', '.join(keys)})")
+            if "resolution=merge-duplicates" in prefer:
+                existing.update(row)
+                stored.append(existing)
+            continue
+        new = {} if table in NO_ID else {"id": next(fakes.ids[table])}
+        new.update(DEFAULTS.get(table, {}))
+        now = _now_iso()
+        new.update({column: now for column in TIMESTAMP_DEFAULTS.get(table, ())})
+        new.update(row)
+        fakes.tables[table].append(new)
+        stored.append(new)
+    return stored
+
+
+def _coerce(raw: str, sample: Any) -> Any:
+    if raw == "null":
+        return None
+    if isinstance(sample, bool):
+        # postgrest-py sends Python's True/False; Postgres reads booleans case-insensitively
+        return raw.lower() == "true"
+    if isinstance(sample, int):
+        return int(raw)
+    if isinstance(sample, float):
+        return float(raw)
+    return raw
+
+
+def _matches(value: Any, op: str, raw: str) -> bool:
+    if op == "is":
+        return value is None if raw == "null" else value == (raw.lower() == "true")
+    if op == "in":
+        items = [item.strip().strip('"') for item in raw.strip("()").split(",") if item.strip()]
+        return value in [_coerce(item, value) for item in items]
+    if value is None:
+        return False
+    if op in ("like", "ilike"):
+        pattern = "^" + re.escape(raw).replace(r"\*", ".*").replace("%", ".*") + "$"
+        return re.match(pattern, str(value), re.IGNORECASE if op == "ilike" else 0) is not None
+    target = _coerce(raw, value)
+    return {
+        "eq": value == target, "neq": value != target,
+        "gt": value > target, "gte": value >= target,
+        "lt": value < target, "lte": value <= target,
+    }[op]
+
+
+def _condition(column: str, expression: str):
+    negate = expression.startswith("not.")
+    op, _, raw = expression.removeprefix("not.").partition(".")
+    if raw.startswith('"') and raw.endswith('"'):
+        raw = raw[1:-1]
+    return lambda row: _matches(row.get(column), op, raw) != negate
+
+
+def _split_top_level(text: str) -> list[str]:
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char in "()":
+            depth += 1 if char == "(" else -1
+        elif not quoted and char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    return parts + [current] if current else parts
+
+
+def _logic(conjunction: str, expression: str):
+    """`or=(a.lt.1,and(b.eq.2,c.lt.3))` style logic trees."""
+    tests = []
+    for item in _split_top_level(expression.strip()[1:-1]):
+        negate = item.startswith("not.")
+        name, _, rest = item.removeprefix("not.").partition("(")
+        if name in ("and", "or") and rest:
+            inner = _logic(name, "(" + rest)
+            tests.append(lambda row, inner=inner, negate=negate: inner(row) != negate)
+        else:
+            column, _, condition = item.partition(".")
+            tests.append(_condition(column, condition))
+    combine = all if conjunction == "and" else any
+    return lambda row: combine(test(row) for test in tests)
+
+
+def _filter(rows: list[dict], params: list[tuple[str, str]]) -> list[dict]:
+    tests = []
+    for column, expression in params:
+        if column in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+            continue
+        tests.append(_logic(column, expression) if column in ("or", "and") else _condition(column, expression))
+    return [row for row in rows if all(test(row) for test in tests)]
+
+
+def _order(rows: list[dict], order: str | None) -> list[dict]:
+    if not order:
+        return sorted(rows, key=lambda row: row.get("id", 0))
+    ordered = list(rows)
+    for term in reversed(order.split(",")):
+        column, *modifiers = term.split(".")
+        present = [row for row in ordered if row.get(column) is not None]
+        missing = [row for row in ordered if row.get(column) is None]
+        present.sort(key=lambda row: row[column], reverse="desc" in modifiers)
+        ordered = missing + present if "nullsfirst" in modifiers else present + missing
+    return ordered
+
+
+def _window(rows: list[dict], params: list[tuple[str, str]]) -> list[dict]:
+    values = dict(params)
+    offset = int(values.get("offset", 0))
+    limit = values.get("limit")
+    return rows[offset:offset + int(limit)] if limit is not None else rows[offset:]
+
+
+def _project(rows: list[dict], select: str) -> list[dict]:
+    columns = [column.strip() for column in select.split(",")]
+    if "*" in columns:
+        return [dict(row) for row in rows]
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+# --- RPCs mirroring supabase/migrations -----------------------------------
+
+def _claim_next_terms(fakes: FakeServices, args: dict) -> list[dict]:
+    difficulty, wanted = args.get("p_difficulty", "beginner"), int(args.get("p_count", 1))
+    deck = sorted((row for row in fakes.tables["source_terms"] if row.get("difficulty") == difficulty), key=lambda r: r["id"])
+    claimed = [row for row in deck if not row["used"]][:wanted]
+    if len(claimed) < wanted:
+        for row in deck:
+            if row not in claimed:
+                row.update(used=False, used_at=None)
+        claimed += [row for row in deck if row not in claimed][:wanted - len(claimed)]
+    now = _now_iso()
+    for row in claimed:
+        row.update(used=True, used_at=now)
+    return [dict(row) for row in claimed]
+
+
+def _pop_ready_flashcard(fakes: FakeServices, args: dict) -> list[dict]:
+    ready = sorted((row for row in fakes.tables["flashcards"] if row.get("status") == "ready"), key=lambda r: r["id"])
+    if not ready:
+        return []
+    now = _now_iso()
+    ready[0].update(status="sent", sent_at=now, created_at=now)
+    return [dict(ready[0])]
+
+
+def _lease_jobs(fakes: FakeServices, args: dict) -> list[dict]:
+    now = args["p_now"]
+    due = [
+        row for row in fakes.tables["jobs"]
+        if (row["status"] == "queued" and row["run_at"] <= now)
+        or (row["status"] == "running" and row["lease_until"] and row["lease_until"] <= now)
+    ]
+    leased = sorted(due, key=lambda row: row["run_at"])[:int(args["p_limit"])]
+    for row in leased:
+        row.update(status="running", attempts=row["attempts"] + 1, locked_by=args["p_worker_id"],
+                   lease_until=args["p_lease_until"], updated_at=_now_iso())
+    return [dict(row) for row in leased]
+
+
+def _due_reviews_page(fakes: FakeServices, args: dict) -> list[dict]:
+    after = (args["p_after_due"], args["p_after_chat"], args["p_after_card"])
+    rows = sorted(
+        (row for row in fakes.tables["reviews"]
+         if row["due_at"] <= args["p_now"] and (row["due_at"], row["chat_id"], row["flashcard_id"]) > after),
+        key=lambda row: (row["due_at"], row["chat_id"], row["flashcard_id"]),
+    )
+    return [dict(row) for row in rows[:int(args["p_limit"])]]
+
+
+def _acquire_lease(fakes: FakeServices, args: dict) -> bool:
+    lease = next((row for row in fakes.tables["leases"] if row["name"] == args["p_name"]), None)
+    if lease is None:
+        lease = {"name": args["p_name"]}
+        fakes.tables["leases"].append(lease)
+    elif lease["holder"] != args["p_holder"] and lease["expires_at"] > args["p_now"]:
+        return False
+    lease.update(holder=args["p_holder"], expires_at=args["p_expires_at"], updated_at=_now_iso())
+    return True
+
+
+def _claim_run(fakes: FakeServices, args: dict) -> bool:
+    run = next((row for row in fakes.tables["scheduled_runs"] if row["run_key"] == args["p_run_key"]), None)
+    if run is None:
+        run = {"run_key": args["p_run_key"], "attempts": 0, "result": None}
+        fakes.tables["scheduled_runs"].append(run)
+    elif not (run["status"] == "failed" or (run["status"] == "running" and run["started_at"] <= args["p_stale_before"])):
+        return False
+    run.update(holder=args["p_holder"], status="running", attempts=run["attempts"] + 1, error=None,
+               started_at=args["p_now"], finished_at=None)
+    return True
+
+
+RPCS = {
+    "claim_next_terms": _claim_next_terms,
+    "pop_ready_flashcard": _pop_ready_flashcard,
+    "lease_jobs": _lease_jobs,
+    "due_reviews_page": _due_reviews_page,
+    "acquire_lease": _acquire_lease,
+    "claim_run": _claim_run,
+}
+
+
+class _Illustration:
+    """`side`x`side` RGB PNGs that compress roughly like an illustration (gradients plus noise).
+
+    Every render differs in its first row, so image hashes (and Telegram file_id
+    reuse) behave as with real generations. Only that row is compressed per
+    call: it is flushed as its own deflate block and the rest is precompressed.
+    """
+
+    def __init__(self, side: int) -> None:
+        rng = random.Random(side)
+        noise = rng.randbytes(side * 3)
+        rows = []
+        for y in range(side):
+            base = bytes((x * 255 // side + y) & 0xFF for x in range(side)) * 3
+            offset = (y * 7) % side
+            rows.append(b"\x00" + bytes(a ^ (b & 0x0F) for a, b in zip(base, noise[offset:] + noise[:offset])))
+        self.side = side
+        self.first_row = rows[0]
+        self.rest = b"".join(rows[1:])
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        self.compressed_rest = compressor.compress(self.rest) + compressor.flush()
+        self.renders = itertools.count()
+
+    def render(self) -> bytes:
+        stamp = next(self.renders).to_bytes(8, "big")
+        first = self.first_row[:1] + stamp + self.first_row[1 + len(stamp):]
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        head = compressor.compress(first) + compressor.flush(zlib.Z_FULL_FLUSH)
+        checksum = zlib.adler32(self.rest, zlib.adler32(first))
+        idat = b"\x78\x9c" + head + self.compressed_rest + struct.pack(">I", checksum)
+        header = struct.pack(">IIBBBBB", self.side, self.side, 8, 2, 0, 0, 0)
+        return b"\x89PNG\r\n\x1a\n" + _chunk(b"IHDR", header) + _chunk(b"IDAT", idat) + _chunk(b"IEND", b"")
+
+
+def _chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def _parse_pairs(items: list[str], cast) -> dict[str, Any]:
+    pairs = {}
+    for item in items:
+        route, _, value = item.partition("=")
+        pairs[route] = cast(value)
+    return pairs
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", action="append", default=[], metavar="ROUTE=MS")
+    parser.add_argument("--jitter", action="append", default=[], metavar="ROUTE=MS")
+    parser.add_argument("--error-rate", action="append", default=[], metavar="ROUTE=FRACTION")
+    parser.add_argument("--error-status", action="append", default=[], metavar="ROUTE=STATUS")
+    parser.add_argument("--image-side", type=int, default=1024, help="pixel size of the generated PNG")
+    parser.add_argument("--batch-item-error-rate", type=float, default=0.0,
+                        help="fraction of batched chat items dropped or left incomplete")
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        latency_ms=_parse_pairs(args.latency, float),
+        jitter_ms=_parse_pairs(args.jitter, float),
+        error_rate=_parse_pairs(args.error_rate, float),
+        error_status=_parse_pairs(args.error_status, int),
+        image_side=args.image_side,
+        batch_item_error_rate=args.batch_item_error_rate,
+    )
+    uvicorn.run(build_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""Offline load benchmark for the flashcard pipeline.
+
+Starts benchmarks/fakes.py in a subprocess and points the app at it (OpenAI,
+Telegram and, unless --storage sqlite, Supabase), then drives each scenario
+with `--ops` operations at `--concurrency`:
+
+  phase1     create_and_send_daily_flashcard_async (claim, content, insert)
+  phase2     background_image_task_async (image, re-encode, upload, log)
+  flashcards GET /flashcards through the ASGI app
+  cron       GET /api/cron, including its background job drain
+  content_batch  build_linguistic_content_batch_async for CONTENT_BATCH_SIZE new terms
+  webhook    POST /telegram/webhook quiz answers (acknowledged in memory, written in batches)
+
+For each it reports throughput, p50/p95/p99 latency, outbound calls per fake
+route (per operation too) and, from a separate shorter tracemalloc pass,
+allocations per operation.
+
+Usage:
+    python benchmarks/harness.py --ops 50 --concurrency 8
+    python benchmarks/harness.py --scenario phase2 --latency openai.images=1500 --latency telegram=60
+    python benchmarks/harness.py --error-rate openai.images=0.2 --output bench.json
+
+The fake latency and error flags are passed to benchmarks/fakes.py as given.
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import http.client
+import itertools
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+SCENARIOS = ("phase1", "phase2", "flashcards", "cron", "content_batch", "webhook")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _fake_request(port: int, method: str, path: str) -> dict:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conn.request(method, path)
+    return json.loads(conn.getresponse().read())
+
+
+def start_fakes(port: int, fake_args: list[str], timeout: float = 30.0) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, str(ROOT / "benchmarks" / "fakes.py"), "--port", str(port), *fake_args],
+        cwd=ROOT, stdout=subprocess.DEVNULL,
+    )
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if server.poll() is not None:
+            raise RuntimeError(f"fakes.py exited with code {server.returncode}")
+        try:
+            _fake_request(port, "GET", "/_fake/stats")
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise TimeoutError("fakes.py did not start")
+
+
+def configure_env(port: int, storage: str, db_dir: str) -> None:
+    """Must run before anything from `app` is imported: Settings reads the environment once."""
+    base = f"http://127.0.0.1:{port}"
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"{base}/openai/v1",
+        "TELEGRAM_BOT_TOKEN": "123456:fake",
+        "TELEGRAM_CHAT_ID": "1000",
+        "TELEGRAM_API_URL": f"{base}/telegram",
+        "TELEGRAM_WEBHOOK_SECRET": "bench-secret",
+        "SCHEDULER_ENABLED": "0",
+        "IMAGE_STORE_ENABLED": "0",
+        "DB_PATH": f"{db_dir}/bench.db",
+        "JOBS_BACKOFF_SECONDS": "0.1",
+        # Every cron op should do a full delivery, not hit the once-per-day key
+        "RUN_ONCE_PER_SLOT": "0",
+    })
+    os.environ.pop("VERCEL", None)
+    os.environ.pop("TRACE_LOG_PATH", None)
+    if storage == "supabase":
+        os.environ.update({"STORAGE_BACKEND": "supabase", "SUPABASE_URL": f"{base}/supabase", "SUPABASE_KEY": "fake.fake.fake"})
+    else:
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ.pop("SUPABASE_URL", None)
+        os.environ.pop("SUPABASE_KEY", None)
+
+
+def _asgi_get(module: str, path: str) -> Callable[[], Awaitable[Any]]:
+    import importlib
+
+    import httpx
+
+    app = importlib.import_module(module).app
+
+    async def call() -> Any:
+        # A client per call: ASGITransport clients are bound to the running loop
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            response = await client.get(path)
+        response.raise_for_status()
+        body = response.json()
+        if isinstance(body, dict) and body.get("status") == "error":
+            raise RuntimeError(body.get("detail"))
+        return body
+
+    return call
+
+
+def _asgi_post(module: str, path: str, headers: dict[str, str] | None = None) -> Callable[[Any], Awaitable[Any]]:
+    import importlib
+
+    import httpx
+
+    app = importlib.import_module(module).app
+
+    async def call(payload: Any) -> Any:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            response = await client.post(path, json=payload, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    return call
+
+
+async def _seed_flashcards(count: int) -> list[dict[str, Any]]:
+    from app.storage import get_async_storage
+
+    storage = get_async_storage()
+    cards = []
+    for index in range(count):
+        cards.append(await storage.insert_flashcard({
+            "italian_text": f"parola {index}",
+            "phonetic": f"/pa-ro-la {index}/",
+            "english_translation": f"word {index}",
+            "example_sentence": f"Questa è la parola {index}.",
+            "difficulty": "beginner",
+            "sent_channel": "telegram",
+        }))
+    return cards
+
+
+async def build_operation(name: str, ops: int) -> Callable[[int], Awaitable[Any]]:
+    """Return an async op(index) for a scenario, after any untimed setup it needs."""
+    if name == "phase1":
+        from app.flashcards import create_and_send_daily_flashcard_async
+
+        return lambda index: create_and_send_daily_flashcard_async()
+    if name == "phase2":
+        from app.flashcards import background_image_task_async
+
+        cards = await _seed_flashcards(ops)
+        return lambda index: background_image_task_async(
+            cards[index % len(cards)]["italian_text"],
+            cards[index % len(cards)]["id"],
+            cards[index % len(cards)]["phonetic"],
+            cards[index % len(cards)]["english_translation"],
+            cards[index % len(cards)]["example_sentence"],
+        )
+    if name == "flashcards":
+        await _seed_flashcards(100)
+        call = _asgi_get("app.main", "/flashcards?limit=100")
+        return lambda index: call()
+    if name == "cron":
+        call = _asgi_get("api.cron", "/api/cron")
+        return lambda index: call()
+    if name == "content_batch":
+        from app.config import settings
+        from app.content_batch import build_linguistic_content_batch_async
+
+        async def batch(index: int) -> None:
+            terms = [f"parola {index}-{item}" for item in range(settings.content_batch_size)]
+            contents = await build_linguistic_content_batch_async(terms)
+            if len(contents) < len(terms):
+                raise RuntimeError(f"{len(terms) - len(contents)} of {len(terms)} terms failed")
+
+        # Operation indexes repeat in the allocation pass; number calls instead so every batch misses the cache
+        calls = itertools.count()
+        return lambda index: batch(next(calls))
+    if name == "webhook":
+        cards = await _seed_flashcards(20)
+        post = _asgi_post(
+            "app.main", "/telegram/webhook", {"X-Telegram-Bot-Api-Secret-Token": os.environ["TELEGRAM_WEBHOOK_SECRET"]}
+        )
+        updates = itertools.count(1)
+
+        async def answer(index: int) -> None:
+            update_id = next(updates)
+            card = cards[update_id % len(cards)]
+            chosen = card["id"] if update_id % 3 else cards[(update_id + 1) % len(cards)]["id"]
+            reply = await post({
+                "update_id": update_id,
+                "callback_query": {
+                    "id": str(update_id),
+                    "from": {"id": 5000 + update_id % 100},
+                    "message": {"message_id": update_id, "chat": {"id": 5000 + update_id % 100}},
+                    "data": f"quiz:{card['id']}:{chosen}",
+                },
+            })
+            if reply.get("method") != "answerCallbackQuery":
+                raise RuntimeError(f"Unexpected webhook reply: {reply}")
+
+        return answer
+    raise ValueError(f"Unknown scenario {name}")
+
+
+async def _run_ops(op: Callable[[int], Awaitable[Any]], ops: int, concurrency: int) -> tuple[list[float], list[str], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors: list[str] = []
+
+    async def one(index: int) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await op(index)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(ops)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def _measure_allocations(op: Callable[[int], Awaitable[Any]], ops: int) -> dict[str, float]:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        for index in range(ops):
+            try:
+                await op(index)
+            except Exception:
+                pass
+        _, peak = tracemalloc.get_traced_memory()
+        gc.collect()
+        diff = tracemalloc.take_snapshot().compare_to(before, "filename")
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in diff if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in diff if stat.count_diff > 0)
+    return {
+        "ops": ops,
+        "retained_kb_per_op": round(allocated / ops / 1024, 1),
+        "retained_blocks_per_op": round(blocks / ops, 1),
+        "peak_kb": round((peak - baseline) / 1024, 1),
+    }
+
+
+def _percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(pct / 100 * len(ordered))) - 1]
+
+
+async def run_scenario(name: str, port: int, ops: int, concurrency: int, alloc_ops: int) -> dict[str, Any]:
+    from app.clients import client_stats
+
+    op = await build_operation(name, ops)
+    await op(0)  # warm-up: client pools, imports, first claim seeds the deck
+    _fake_request(port, "POST", "/_fake/reset")
+    before = client_stats()
+
+    latencies, errors, duration = await _run_ops(op, ops, concurrency)
+    outbound = _fake_request(port, "GET", "/_fake/stats")["routes"]
+    pooled = {
+        service: stats["requests"] - before.get(service, {}).get("requests", 0)
+        for service, stats in client_stats().items()
+    }
+    report = {
+        "scenario": name,
+        "ops": ops,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "duration_s": round(duration, 3),
+        "throughput_per_s": round(len(latencies) / duration, 2) if duration > 0 else None,
+        "latency_ms": {
+            label: round(value * 1000, 1) if value is not None else None
+            for label, value in (
+                ("p50", _percentile(latencies, 50)),
+                ("p95", _percentile(latencies, 95)),
+                ("p99", _percentile(latencies, 99)),
+                ("max", max(latencies, default=None)),
+            )
+        },
+        "outbound_calls": {route: stats["calls"] for route, stats in outbound.items()},
+        "outbound_calls_per_op": {route: round(stats["calls"] / ops, 2) for route, stats in outbound.items()},
+        "upload_kb_per_op": round(sum(stats["bytes_in"] for stats in outbound.values()) / ops / 1024, 1),
+        "pooled_client_requests": {service: count for service, count in pooled.items() if count},
+    }
+    if errors:
+        report["first_errors"] = sorted(set(errors))[:3]
+    if alloc_ops:
+        report["allocations"] = await _measure_allocations(op, alloc_ops)
+    return report
+
+
+async def run(args: argparse.Namespace, port: int) -> list[dict[str, Any]]:
+    from app.db import init_db
+    from app.flashcards import seed_beginner_terms_if_empty
+
+    init_db()
+    seed_beginner_terms_if_empty()
+    reports = []
+    for name in args.scenario or SCENARIOS:
+        reports.append(await run_scenario(name, port, args.ops, args.concurrency, args.alloc_ops))
+        print(f"✅ {name}: {reports[-1]['throughput_per_s']} ops/s, p95 {reports[-1]['latency_ms']['p95']} ms", file=sys.stderr)
+    return reports
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable; default: all")
+    parser.add_argument("--ops", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--alloc-ops", type=int, default=5, help="operations in the tracemalloc pass (0 = skip)")
+    parser.add_argument("--storage", choices=("supabase", "sqlite"), default="supabase",
+                        help="supabase = fake PostgREST, sqlite = a throwaway local database")
+    parser.add_argument("--output", help="also write the JSON report here")
+    args, fake_args = parser.parse_known_args()
+
+    port = _free_port()
+    fakes = start_fakes(port, fake_args)
+    try:
+        with tempfile.TemporaryDirectory() as db_dir:
+            configure_env(port, args.storage, db_dir)
+            sys.path.insert(0, str(ROOT))
+            # The app logs with print(); keep stdout for the JSON report
+            with contextlib.redirect_stdout(sys.stderr):
+                reports = asyncio.run(run(args, port))
+    finally:
+        fakes.terminate()
+        fakes.wait()
+
+    output = json.dumps({"storage": args.storage, "fake_args": fake_args, "scenarios": reports}, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    return 1 if any(report["errors"] == report["ops"] for report in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
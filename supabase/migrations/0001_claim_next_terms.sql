@@ -0,0 +1,66 @@
+-- Atomically claim the next unused source terms in a single round trip.
+--
+-- Selects up to p_count unused terms of the given difficulty (lowest id first),
+-- marks them used and returns them. When the deck runs out, every other term of
+-- that difficulty is recycled and the remainder is claimed from the fresh deck.
+-- FOR UPDATE SKIP LOCKED keeps concurrent callers (cron + manual trigger) from
+-- claiming the same row.
+--
+-- Called from app.flashcards.claim_next_terms via supabase.rpc("claim_next_terms", ...).
+
+create or replace function claim_next_terms(p_difficulty text default 'beginner', p_count integer default 1)
+returns setof source_terms
+language plpgsql
+as $$
+declare
+  claimed bigint[];
+  missing integer;
+begin
+  with picked as (
+    select s.id
+    from source_terms s
+    where s.difficulty = p_difficulty and s.used = false
+    order by s.id
+    limit p_count
+    for update skip locked
+  ), marked as (
+    update source_terms t
+    set used = true, used_at = now()
+    from picked
+    where t.id = picked.id
+    returning t.id
+  )
+  select coalesce(array_agg(marked.id order by marked.id), '{}') into claimed from marked;
+
+  missing := p_count - cardinality(claimed);
+  if missing > 0 then
+    -- Deck exhausted: recycle everything except what this call just claimed.
+    update source_terms t
+    set used = false, used_at = null
+    where t.difficulty = p_difficulty and t.used = true and not (t.id = any(claimed));
+
+    with picked as (
+      select s.id
+      from source_terms s
+      where s.difficulty = p_difficulty and s.used = false and not (s.id = any(claimed))
+      order by s.id
+      limit missing
+      for update skip locked
+    ), marked as (
+      update source_terms t
+      set used = true, used_at = now()
+      from picked
+      where t.id = picked.id
+      returning t.id
+    )
+    select claimed || coalesce(array_agg(marked.id order by marked.id), '{}') into claimed from marked;
+  end if;
+
+  return query
+    select t.* from source_terms t
+    where t.id = any(claimed)
+    order by array_position(claimed, t.id);
+end;
+$$;
+
+create index if not exists source_terms_difficulty_used_id_idx on source_terms (difficulty, used, id);
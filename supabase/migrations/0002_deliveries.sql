@@ -0,0 +1,15 @@
+-- Per-send delivery log, written by app.storage after every Telegram send attempt.
+
+create table if not exists deliveries (
+  id bigint generated by default as identity primary key,
+  flashcard_id bigint references flashcards (id) on delete set null,
+  channel text not null,
+  chat_id text,
+  status text not null,
+  message_id text,
+  error text,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists deliveries_flashcard_id_idx on deliveries (flashcard_id);
+create index if not exists flashcards_created_at_idx on flashcards (created_at);
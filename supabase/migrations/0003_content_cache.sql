@@ -0,0 +1,15 @@
+-- Persistent cache of LLM-generated linguistic content (see app/content_cache.py).
+
+create table if not exists content_cache (
+  cache_key text primary key,
+  term text not null,
+  model text not null,
+  prompt_version text not null,
+  content jsonb not null,
+  created_at timestamptz not null default now(),
+  last_used_at timestamptz not null default now(),
+  expires_at timestamptz not null
+);
+
+create index if not exists content_cache_last_used_at_idx on content_cache (last_used_at);
+create index if not exists content_cache_expires_at_idx on content_cache (expires_at);
@@ -0,0 +1,6 @@
+-- Image-store key (sha256 of model, size and final prompt) for each rendered flashcard,
+-- so a recycled term can reload its earlier image instead of rendering it again.
+
+alter table flashcards add column if not exists image_key text;
+
+create index if not exists flashcards_image_key_idx on flashcards (image_key);
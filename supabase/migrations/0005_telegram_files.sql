@@ -0,0 +1,9 @@
+-- Telegram file_id for every image uploaded via sendPhoto, keyed by sha256 of the image bytes.
+-- Later sends of the same image pass the file_id instead of re-uploading the PNG.
+
+create table if not exists telegram_files (
+  image_hash text primary key,
+  file_id text not null,
+  flashcard_id bigint references flashcards (id) on delete set null,
+  created_at timestamptz not null default now()
+);
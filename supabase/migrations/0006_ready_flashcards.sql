@@ -0,0 +1,25 @@
+-- Buffer of pre-generated ("ready") flashcards, filled off-hours by app.pregen.
+-- Existing rows default to 'sent'.
+
+alter table flashcards add column if not exists status text not null default 'sent';
+alter table flashcards add column if not exists caption text;
+
+create index if not exists flashcards_status_id_idx on flashcards (status, id);
+
+-- Take the oldest ready card and mark it sent in one round trip.
+-- SKIP LOCKED keeps two concurrent triggers from popping the same card.
+create or replace function pop_ready_flashcard()
+returns setof flashcards
+language sql
+as $$
+  update flashcards f
+  set status = 'sent', sent_at = now()
+  where f.id = (
+    select id from flashcards
+    where status = 'ready'
+    order by id
+    limit 1
+    for update skip locked
+  )
+  returning f.*;
+$$;
@@ -0,0 +1,12 @@
+-- Subscriber registry for fan-out delivery (app/fanout.py) and the per-recipient
+-- index used to resume an interrupted fan-out.
+
+create table if not exists subscribers (
+  chat_id text primary key,
+  active boolean not null default true,
+  created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now()
+);
+
+create index if not exists subscribers_active_chat_id_idx on subscribers (active, chat_id);
+create index if not exists deliveries_flashcard_chat_idx on deliveries (flashcard_id, chat_id);
@@ -0,0 +1,37 @@
+-- Per-user spaced-repetition state (app/reviews.py). One narrow row per
+-- (chat_id, flashcard_id): ease in thousandths, interval in days, times as
+-- epoch seconds. Both due indexes let "what is due now" read only due rows.
+
+create table if not exists reviews (
+  chat_id text not null,
+  flashcard_id bigint not null references flashcards (id) on delete cascade,
+  ease smallint not null,
+  interval_days integer not null,
+  repetitions smallint not null,
+  lapses smallint not null,
+  due_at bigint not null,
+  reviewed_at bigint,
+  primary key (chat_id, flashcard_id)
+);
+
+create index if not exists reviews_chat_due_idx on reviews (chat_id, due_at);
+create index if not exists reviews_due_idx on reviews (due_at, chat_id, flashcard_id);
+
+-- Keyset page over every user's due reviews, ordered by (due_at, chat_id, flashcard_id).
+create or replace function due_reviews_page(
+  p_now bigint,
+  p_after_due bigint,
+  p_after_chat text,
+  p_after_card bigint,
+  p_limit integer
+)
+returns setof reviews
+language sql
+stable
+as $$
+  select * from reviews
+  where due_at <= p_now
+    and (due_at, chat_id, flashcard_id) > (p_after_due, p_after_chat, p_after_card)
+  order by due_at, chat_id, flashcard_id
+  limit p_limit;
+$$;
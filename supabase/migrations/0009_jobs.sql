@@ -0,0 +1,49 @@
+-- Durable job queue (app/jobs.py). Workers lease jobs for a limited time; a
+-- job whose worker died is picked up again once its lease expires.
+
+create table if not exists jobs (
+  id bigint generated by default as identity primary key,
+  kind text not null,
+  job_key text unique,
+  payload jsonb not null default '{}'::jsonb,
+  status text not null default 'queued',
+  attempts integer not null default 0,
+  max_attempts integer not null,
+  run_at timestamptz not null default now(),
+  lease_until timestamptz,
+  locked_by text,
+  last_error text,
+  created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now()
+);
+
+create index if not exists jobs_status_run_at_idx on jobs (status, run_at);
+create index if not exists jobs_status_lease_until_idx on jobs (status, lease_until);
+
+-- Lease up to p_limit due jobs in one round trip.
+-- SKIP LOCKED lets several workers drain the queue in parallel without taking the same job.
+create or replace function lease_jobs(
+  p_worker_id text,
+  p_now timestamptz,
+  p_lease_until timestamptz,
+  p_limit integer
+)
+returns setof jobs
+language sql
+as $$
+  update jobs j
+  set status = 'running',
+      attempts = j.attempts + 1,
+      locked_by = p_worker_id,
+      lease_until = p_lease_until,
+      updated_at = now()
+  where j.id in (
+    select id from jobs
+    where (status = 'queued' and run_at <= p_now)
+       or (status = 'running' and lease_until <= p_now)
+    order by run_at
+    limit p_limit
+    for update skip locked
+  )
+  returning j.*;
+$$;
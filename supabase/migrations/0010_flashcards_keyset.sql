@@ -0,0 +1,4 @@
+-- Keyset pagination for GET /flashcards: newest first by (created_at, id).
+-- A backward scan of this index serves every page, however deep, without OFFSET.
+
+create index if not exists flashcards_created_at_id_idx on flashcards (created_at, id);
@@ -0,0 +1,19 @@
+-- Bulk vocabulary import (app/importer.py): terms are deduplicated on term_key
+-- and re-imports skip rows whose content_hash did not change.
+--
+-- term_key must match app.storage.base.normalize_term: NFC, one kind of
+-- apostrophe, single spaces, lower case, accents kept.
+
+alter table source_terms add column if not exists term_key text;
+alter table source_terms add column if not exists content_hash text;
+
+update source_terms
+set term_key = lower(btrim(regexp_replace(translate(normalize(italian_text, NFC), '’‘ʼ`´', ''''''''''''), '\s+', ' ', 'g')))
+where term_key is null;
+
+-- Duplicates already in the deck keep their rows; only the oldest one is keyed
+update source_terms s
+set term_key = null
+where exists (select 1 from source_terms d where d.term_key = s.term_key and d.id < s.id);
+
+create unique index if not exists source_terms_term_key_idx on source_terms (term_key);
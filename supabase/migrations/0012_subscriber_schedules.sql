@@ -0,0 +1,5 @@
+-- Per-subscriber delivery time for the timing-wheel dispatcher (app/dispatcher.py).
+-- NULL in either column means the global TIMEZONE / SCHEDULE_HOUR:SCHEDULE_MINUTE.
+
+alter table subscribers add column if not exists timezone text;
+alter table subscribers add column if not exists delivery_time text;
@@ -0,0 +1,67 @@
+-- Leader election and once-per-slot scheduled runs (app/leader.py).
+--
+-- Every worker that runs the scheduler renews the "scheduler" lease; only the
+-- holder runs scheduled jobs. A scheduled_runs row per run key (e.g.
+-- daily:2026-10-17) makes a slot run once even when several triggers fire.
+
+create table if not exists leases (
+  name text primary key,
+  holder text not null,
+  expires_at timestamptz not null,
+  updated_at timestamptz not null default now()
+);
+
+create table if not exists scheduled_runs (
+  run_key text primary key,
+  holder text not null,
+  status text not null,
+  attempts integer not null default 1,
+  result jsonb,
+  error text,
+  started_at timestamptz not null,
+  finished_at timestamptz
+);
+
+-- Take or renew a lease in one statement: free, expired or already ours.
+create or replace function acquire_lease(
+  p_name text,
+  p_holder text,
+  p_now timestamptz,
+  p_expires_at timestamptz
+)
+returns boolean
+language sql
+as $$
+  with taken as (
+    insert into leases (name, holder, expires_at, updated_at)
+    values (p_name, p_holder, p_expires_at, now())
+    on conflict (name) do update
+      set holder = excluded.holder, expires_at = excluded.expires_at, updated_at = now()
+      where leases.holder = excluded.holder or leases.expires_at <= p_now
+    returning 1
+  )
+  select exists (select 1 from taken);
+$$;
+
+-- Start a run once; a failed run, or one whose holder went quiet, may be taken over.
+create or replace function claim_run(
+  p_run_key text,
+  p_holder text,
+  p_now timestamptz,
+  p_stale_before timestamptz
+)
+returns boolean
+language sql
+as $$
+  with claimed as (
+    insert into scheduled_runs (run_key, holder, status, started_at)
+    values (p_run_key, p_holder, 'running', p_now)
+    on conflict (run_key) do update
+      set holder = excluded.holder, status = 'running', attempts = scheduled_runs.attempts + 1,
+          error = null, started_at = excluded.started_at, finished_at = null
+      where scheduled_runs.status = 'failed'
+         or (scheduled_runs.status = 'running' and scheduled_runs.started_at <= p_stale_before)
+    returning 1
+  )
+  select exists (select 1 from claimed);
+$$;
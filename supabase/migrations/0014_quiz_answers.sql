@@ -0,0 +1,16 @@
+-- Inline-keyboard quiz answers from the Telegram webhook (app/quiz.py).
+-- One row per quiz message: the first button a user presses is the answer,
+-- later presses and redelivered updates are ignored by the primary key.
+
+create table if not exists quiz_answers (
+  chat_id text not null,
+  message_id bigint not null,
+  update_id bigint not null,
+  flashcard_id bigint not null references flashcards (id) on delete cascade,
+  chosen_flashcard_id bigint not null,
+  correct boolean not null,
+  answered_at bigint not null,
+  primary key (chat_id, message_id)
+);
+
+create index if not exists quiz_answers_chat_answered_idx on quiz_answers (chat_id, answered_at);
@@ -0,0 +1,17 @@
+-- A popped ready card takes its send time as created_at, so history
+-- (ordered by created_at) lists it where it was sent, not where it was rendered.
+create or replace function pop_ready_flashcard()
+returns setof flashcards
+language sql
+as $$
+  update flashcards f
+  set status = 'sent', sent_at = now(), created_at = now()
+  where f.id = (
+    select id from flashcards
+    where status = 'ready'
+    order by id
+    limit 1
+    for update skip locked
+  )
+  returning f.*;
+$$;
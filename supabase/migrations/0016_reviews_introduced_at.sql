@@ -0,0 +1,6 @@
+-- When each review state was started (epoch seconds), so POST /reviews/{chat_id}
+-- can cap new cards per user per day. Rows started earlier stay null and do not count.
+
+alter table reviews add column if not exists introduced_at bigint;
+
+create index if not exists reviews_chat_introduced_idx on reviews (chat_id, introduced_at);
@@ -0,0 +1,4 @@
+-- The dispatcher rereads subscribers changed since its last tick (any instance
+-- may change them), once a minute.
+
+create index if not exists subscribers_updated_at_idx on subscribers (updated_at);
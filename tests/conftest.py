@@ -0,0 +1,50 @@
+"""Tests run against a throwaway SQLite file per test; nothing reaches OpenAI, Telegram or Supabase.
+
+Settings reads the environment once, on first import of app.config, so it is
+set here before any test module imports the app.
+"""
+import os
+import tempfile
+
+os.environ.update({
+    "STORAGE_BACKEND": "sqlite",
+    "DB_PATH": os.path.join(tempfile.mkdtemp(prefix="flashcard-tests-"), "flashcards.db"),
+    "OPENAI_API_KEY": "",
+    "TELEGRAM_BOT_TOKEN": "",
+    "TELEGRAM_CHAT_ID": "",
+    "SUPABASE_URL": "",
+    "SUPABASE_KEY": "",
+    "SCHEDULER_ENABLED": "0",
+    "IMAGE_STORE_ENABLED": "0",
+    "RUN_ONCE_PER_SLOT": "1",
+})
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """A fresh SQLite storage, installed as the one get_storage() returns."""
+    import app.storage
+    from app.storage.sqlite_backend import SQLiteStorage
+
+    store = SQLiteStorage(str(tmp_path / "flashcards.db"))
+    store.init()
+    monkeypatch.setattr(app.storage, "_storage", store)
+    return store
+
+
+@pytest.fixture
+def make_card(storage):
+    """Insert a delivered flashcard and return its row."""
+    def make(italian_text: str, english_translation: str = "", **fields):
+        return storage.insert_flashcard({
+            "italian_text": italian_text,
+            "english_translation": english_translation or f"{italian_text} (en)",
+            "phonetic": f"/{italian_text}/",
+            "example_sentence": f"Esempio con {italian_text}.",
+            "difficulty": "beginner",
+            "sent_channel": "telegram",
+            **fields,
+        })
+    return make
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from app.export import DeckExport
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 32
+
+
+@pytest.fixture
+def deck(make_card, tmp_path):
+    image = tmp_path / "gatto.png"
+    image.write_bytes(PNG)
+    return [
+        make_card("gatto", "cat", image_url=str(image)),
+        make_card("cane", "dog", image_url="https://example.com/expired.png"),
+        make_card("casa", "house"),
+    ]
+
+
+def _run(export: DeckExport) -> bytes:
+    return b"".join(export)
+
+
+def test_csv_has_one_row_per_card(deck):
+    export = DeckExport("csv")
+    rows = list(csv.DictReader(io.StringIO(_run(export).decode())))
+    assert [row["italian_text"] for row in rows] == ["gatto", "cane", "casa"]
+    assert export.report["cards"] == 3
+
+
+def test_zip_bundles_local_images_and_metadata(deck):
+    export = DeckExport("zip")
+    archive = zipfile.ZipFile(io.BytesIO(_run(export)))
+    assert sorted(archive.namelist()) == sorted([f"images/{deck[0]['id']}.png", "cards.csv", "export.json"])
+    assert archive.read(f"images/{deck[0]['id']}.png") == PNG
+    rows = list(csv.DictReader(io.StringIO(archive.read("cards.csv").decode())))
+    assert [row["image_file"] for row in rows] == [f"images/{deck[0]['id']}.png", "", ""]
+    summary = json.loads(archive.read("export.json"))
+    assert (summary["cards"], summary["images"], summary["missing_images"]) == (3, 1, 1)
+
+
+def test_apkg_is_a_readable_anki_package(deck, tmp_path):
+    export = DeckExport("apkg", deck_name="Test deck")
+    archive = zipfile.ZipFile(io.BytesIO(_run(export)))
+    assert sorted(archive.namelist()) == ["0", "collection.anki2", "media"]
+    assert json.loads(archive.read("media")) == {"0": f"italian-flashcard-{deck[0]['id']}.png"}
+    assert archive.read("0") == PNG
+
+    collection = tmp_path / "collection.anki2"
+    collection.write_bytes(archive.read("collection.anki2"))
+    conn = sqlite3.connect(collection)
+    notes = conn.execute("SELECT sfld, flds FROM notes ORDER BY id").fetchall()
+    assert [sfld for sfld, _ in notes] == ["gatto", "cane", "casa"]
+    assert f'<img src="italian-flashcard-{deck[0]["id"]}.png">' in notes[0][1]
+    assert conn.execute("SELECT COUNT(*) FROM cards").fetchone()[0] == 3
+    conn.close()
+
+
+def test_cursor_resumes_after_the_last_exported_card(deck):
+    first = DeckExport("csv")
+    _run(first)
+    second = DeckExport("csv", after=(deck[-1]["created_at"], deck[-1]["id"]))
+    assert len(list(csv.DictReader(io.StringIO(_run(second).decode())))) == 0
+    assert second.report["cursor"] == first.report["cursor"]
@@ -0,0 +1,34 @@
+import asyncio
+import io
+import json
+
+from app.importer import import_terms_async
+
+
+def _import(lines: list, **kwargs) -> dict:
+    text = "\n".join(json.dumps(line) for line in lines)
+    return asyncio.run(import_terms_async(io.StringIO(text), fmt="jsonl", chunk_size=2, **kwargs))
+
+
+def test_reimport_skips_unchanged_terms(storage):
+    terms = ["ciao", {"italian_text": "grazie", "category": "courtesy"}, "prego"]
+    first = _import(terms)
+    assert (first["new"], first["changed"], first["unchanged"]) == (3, 0, 0)
+    assert storage.count_source_terms() == 3
+
+    again = _import(terms)
+    assert (again["new"], again["changed"], again["unchanged"]) == (0, 0, 3)
+
+
+def test_changed_fields_are_rewritten_and_duplicates_counted(storage):
+    _import(["ciao", "grazie"])
+    report = _import([{"italian_text": "ciao", "category": "greetings"}, "Ciao", "  grazie ", "", "buongiorno"])
+    assert (report["new"], report["changed"], report["unchanged"]) == (1, 1, 1)
+    assert (report["duplicates"], report["invalid"]) == (1, 1)
+    assert storage.count_source_terms() == 3
+
+
+def test_dry_run_writes_nothing(storage):
+    report = _import(["ciao", "grazie"], dry_run=True)
+    assert report["new"] == 2
+    assert storage.count_source_terms() == 0
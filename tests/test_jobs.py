@@ -0,0 +1,73 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from app import jobs
+from app.config import settings
+
+
+@pytest.fixture
+def flaky_job(storage, monkeypatch):
+    """Register a job kind that fails its first `failures` attempts."""
+    calls = []
+
+    def register(failures: int) -> list:
+        async def handler(payload, job):
+            calls.append(job["attempts"])
+            if job["attempts"] <= failures:
+                raise RuntimeError("boom")
+        monkeypatch.setitem(jobs.HANDLERS, "test", handler)
+        return calls
+    return register
+
+
+def test_enqueue_with_key_is_idempotent(storage):
+    first = asyncio.run(jobs.enqueue_async("test", {"n": 1}, job_key="k"))
+    second = asyncio.run(jobs.enqueue_async("test", {"n": 2}, job_key="k"))
+    assert first["id"] == second["id"]
+    assert storage.count_jobs() == {"queued": 1}
+
+
+def test_failed_attempt_is_retried_after_backoff(storage, flaky_job):
+    calls = flaky_job(failures=1)
+    asyncio.run(jobs.enqueue_async("test", {}))
+    assert asyncio.run(jobs.drain_jobs_async()) == {"done": 0, "retried": 1, "dead": 0, "lost": 0}
+    # Not due again until the backoff has passed
+    assert asyncio.run(jobs.drain_jobs_async()) == {"done": 0, "retried": 0, "dead": 0, "lost": 0}
+    now = jobs._now() + timedelta(seconds=settings.jobs_backoff_seconds + 1)
+    leased = storage.lease_jobs("w", jobs._iso(now), jobs._iso(now + timedelta(seconds=60)), 10)
+    assert [job["attempts"] for job in leased] == [2]
+    assert calls == [1]
+
+
+def test_last_attempt_is_dead_lettered_and_can_be_requeued(storage, flaky_job, monkeypatch):
+    flaky_job(failures=99)
+    job = asyncio.run(jobs.enqueue_async("test", {}))
+    monkeypatch.setattr(jobs, "_backoff", lambda attempts: 0)
+    for _ in range(settings.jobs_max_attempts):
+        asyncio.run(jobs.drain_jobs_async())
+    assert storage.count_jobs() == {"dead": 1}
+    assert jobs.requeue_job(job["id"])
+    assert storage.count_jobs() == {"queued": 1}
+
+
+def test_expired_lease_passes_the_job_to_another_worker(storage):
+    asyncio.run(jobs.enqueue_async("test", {}))
+    now = jobs._now()
+    first = storage.lease_jobs("a", jobs._iso(now), jobs._iso(now + timedelta(seconds=1)), 10)
+    assert storage.lease_jobs("b", jobs._iso(now), jobs._iso(now + timedelta(seconds=60)), 10) == []
+    later = now + timedelta(seconds=2)
+    second = storage.lease_jobs("b", jobs._iso(later), jobs._iso(later + timedelta(seconds=60)), 10)
+    assert [job["id"] for job in second] == [first[0]["id"]]
+    assert second[0]["attempts"] == 2
+    # The first worker lost its lease, so its late result is ignored
+    assert not storage.finish_job(first[0]["id"], "a", "done")
+    assert storage.finish_job(first[0]["id"], "b", "done")
+
+
+def test_backoff_doubles_with_jitter():
+    for attempts in (1, 2, 3):
+        ceiling = settings.jobs_backoff_seconds * 2 ** (attempts - 1)
+        assert ceiling / 2 <= jobs._backoff(attempts) <= ceiling
+    assert jobs._backoff(30) <= 3600
@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from app.leader import daily_run_key, run_once_async
+
+
+def _deliver(calls: list):
+    async def deliver():
+        calls.append(1)
+        return {"status": "success", "flashcard_id": len(calls)}
+    return deliver
+
+
+def test_run_key_runs_once(storage):
+    calls = []
+    key = daily_run_key()
+    assert asyncio.run(run_once_async(key, _deliver(calls)))["flashcard_id"] == 1
+    again = asyncio.run(run_once_async(key, _deliver(calls)))
+    assert again["status"] == "already_ran"
+    assert again["run"]["status"] == "done"
+    assert calls == [1]
+
+
+def test_failed_run_can_be_claimed_again(storage):
+    async def fail():
+        raise RuntimeError("telegram down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_once_async("daily:2026-10-17", fail))
+    calls = []
+    assert asyncio.run(run_once_async("daily:2026-10-17", _deliver(calls)))["status"] == "success"
+    assert calls == [1]
+
+
+def test_running_claim_blocks_until_stale(storage):
+    now, stale_before = "2026-10-17T09:00:00.000000+00:00", "2026-10-17T08:50:00.000000+00:00"
+    assert storage.claim_run("daily:x", "a", now, stale_before)
+    assert not storage.claim_run("daily:x", "b", "2026-10-17T09:01:00.000000+00:00", stale_before)
+    # Worker a went quiet: once its start is older than stale_before, b may take over
+    assert storage.claim_run("daily:x", "b", "2026-10-17T09:20:00.000000+00:00", "2026-10-17T09:10:00.000000+00:00")
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.quiz import QuizIngest
+
+
+def _press(update_id: int, card_id: int, chosen_id: int, message_id: int | None = None, chat_id: int = 7) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "message": {"message_id": message_id or update_id, "chat": {"id": chat_id}},
+            "data": f"quiz:{card_id}:{chosen_id}",
+        },
+    }
+
+
+@pytest.fixture
+def cards(make_card):
+    return [make_card("ciao", "hello"), make_card("grazie", "thank you")]
+
+
+def test_redelivered_updates_and_repeat_presses_are_dropped(storage, cards):
+    ingest = QuizIngest(dedup_window=100)
+    right, wrong = cards
+    assert ingest.submit(_press(1, right["id"], right["id"]))["text"].startswith("✅")
+    assert ingest.submit(_press(1, right["id"], right["id"])) is None
+    assert ingest.submit(_press(2, right["id"], wrong["id"], message_id=1))["text"] == "You already answered this one."
+    assert (ingest.stats["answers"], ingest.stats["duplicates"], ingest.stats["repeat_presses"]) == (1, 1, 1)
+
+    assert asyncio.run(ingest.flush()) == 1
+    results = storage.quiz_results("7")
+    assert (results["answered"], results["correct"]) == (1, 1)
+    assert storage.get_review("7", right["id"])["repetitions"] == 1
+
+
+def test_failed_flush_keeps_the_batch_for_the_next_one(storage, cards, monkeypatch):
+    ingest = QuizIngest(dedup_window=100)
+    right, wrong = cards
+    ingest.submit(_press(1, right["id"], wrong["id"]))
+    ingest.submit(_press(2, wrong["id"], wrong["id"]))
+
+    record, down = storage.record_quiz_answers, [True]
+
+    def record_unless_down(rows):
+        if down[0]:
+            raise ConnectionError("storage down")
+        return record(rows)
+
+    monkeypatch.setattr(storage, "record_quiz_answers", record_unless_down)
+    assert asyncio.run(ingest.flush()) == 0
+    assert ingest.snapshot()["pending"] == 2
+    assert ingest.stats["flush_errors"] == 1
+
+    down[0] = False
+    assert asyncio.run(ingest.flush()) == 2
+    assert ingest.snapshot()["pending"] == 0
+    assert storage.quiz_results("7")["answered"] == 2
+
+
+def test_answers_to_unknown_cards_are_dropped(storage, cards):
+    ingest = QuizIngest(dedup_window=100)
+    ingest.submit(_press(1, 999_999, cards[0]["id"]))
+    assert asyncio.run(ingest.flush()) == 0
+    assert ingest.snapshot()["pending"] == 0
+    assert storage.quiz_results("7")["answered"] == 0
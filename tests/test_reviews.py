@@ -0,0 +1,46 @@
+import pytest
+
+from app.reviews import DAY, DEFAULT_EASE, MIN_EASE, ReviewState, record_reviews, schedule
+
+
+def test_first_passes_use_fixed_intervals_then_grow_by_ease():
+    state = ReviewState("1", 1)
+    state = schedule(state, 4, now=0)
+    assert (state.repetitions, state.interval_days, state.due_at) == (1, 1, DAY)
+    state = schedule(state, 4, now=DAY)
+    assert (state.repetitions, state.interval_days) == (2, 6)
+    state = schedule(state, 4, now=7 * DAY)
+    assert state.interval_days == round(6 * DEFAULT_EASE / 1000)
+    assert state.due_at == 7 * DAY + state.interval_days * DAY
+
+
+def test_grade_changes_ease():
+    assert schedule(ReviewState("1", 1), 5, now=0).ease == DEFAULT_EASE + 100
+    assert schedule(ReviewState("1", 1), 4, now=0).ease == DEFAULT_EASE
+    assert schedule(ReviewState("1", 1), 3, now=0).ease == DEFAULT_EASE - 140
+
+
+def test_lapse_resets_repetitions_and_floors_ease():
+    state = ReviewState("1", 1, ease=MIN_EASE + 50, interval_days=30, repetitions=5)
+    lapsed = schedule(state, 0, now=0)
+    assert (lapsed.repetitions, lapsed.interval_days, lapsed.lapses) == (0, 1, 1)
+    assert lapsed.ease == MIN_EASE
+
+
+def test_schedule_keeps_introduced_at():
+    assert schedule(ReviewState("1", 1, introduced_at=123), 4, now=1000).introduced_at == 123
+
+
+@pytest.mark.parametrize("grade", [-1, 6])
+def test_grade_out_of_range(grade):
+    with pytest.raises(ValueError):
+        schedule(ReviewState("1", 1), grade)
+
+
+def test_only_due_leaves_early_passes_alone(storage, make_card):
+    card = make_card("ciao")
+    first = record_reviews([("7", card["id"], 4, 0)])[0]
+    early = record_reviews([("7", card["id"], 5, first["due_at"] - 10)], only_due=True)[0]
+    assert early == first
+    lapsed = record_reviews([("7", card["id"], 1, first["due_at"] - 10)], only_due=True)[0]
+    assert lapsed["lapses"] == 1
@@ -0,0 +1,41 @@
+import asyncio
+import dataclasses
+import io
+
+import pytest
+
+from app import flashcards, term_selector
+from app.flashcards import claim_next_terms, peek_next_terms
+from app.importer import import_terms_async
+
+
+@pytest.fixture
+def deck(storage):
+    asyncio.run(import_terms_async(io.StringIO('["uno", "due", "tre", "quattro"]'), fmt="json"))
+    return storage
+
+
+def _use(monkeypatch, selection: str) -> None:
+    monkeypatch.setattr(flashcards, "settings", dataclasses.replace(flashcards.settings, term_selection=selection))
+    monkeypatch.setattr(term_selector, "_indexes", {})
+
+
+@pytest.fixture(params=["sequential", "weighted"])
+def selection(request, monkeypatch):
+    _use(monkeypatch, request.param)
+    return request.param
+
+
+def test_peek_follows_the_claims_and_marks_nothing(deck, selection):
+    claimed = claim_next_terms(2)
+    peeked = peek_next_terms(2)
+    assert set(peeked) == {"uno", "due", "tre", "quattro"} - set(claimed)
+    if selection == "sequential":
+        assert peeked == ["tre", "quattro"]
+    assert sorted(claim_next_terms(2)) == sorted(peeked)
+
+
+def test_sequential_peek_continues_into_the_recycled_deck(deck, monkeypatch):
+    _use(monkeypatch, "sequential")
+    claim_next_terms(3)
+    assert peek_next_terms(3) == ["quattro", "uno", "due"]